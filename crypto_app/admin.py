@@ -1,10 +1,150 @@
+import math
+
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from . import ledger, profiling
 from .models import CryptoAnalysis
 from .models import CryptoAnalysisResult
+from .models import LedgerCall, LedgerRequest, PriceAlert, RequestProfile, TriggeredAlert
+
+# Maior janela aceita no relatório do ledger (?days=)
+REPORT_MAX_DAYS = 3650
+
 
 @admin.register(CryptoAnalysis)
 class CryptoAnalysisAdmin(admin.ModelAdmin):
     list_display = ('symbol', 'name', 'recommendation', 'risk_level', 'analysis_date')
     list_filter = ('recommendation', 'risk_level')
     search_fields = ('symbol', 'name')
-    readonly_fields = ('analysis_date',)
\ No newline at end of file
+    readonly_fields = ('analysis_date',)
+
+
+@admin.register(PriceAlert)
+class PriceAlertAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'kind', 'threshold', 'convert', 'user', 'active', 'last_triggered_at')
+    list_filter = ('kind', 'active', 'refresh_analysis')
+    search_fields = ('symbol', 'user__username')
+    raw_id_fields = ('user',)
+
+
+@admin.register(TriggeredAlert)
+class TriggeredAlertAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'value', 'triggered_at')
+    raw_id_fields = ('alert',)
+    readonly_fields = ('triggered_at',)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'samples', 'trigger', 'user')
+    list_filter = ('url_name', 'trigger', 'status_code')
+    search_fields = ('path',)
+    date_hierarchy = 'created_at'
+    exclude = ('stacks', 'timeline')
+    readonly_fields = (
+        'created_at', 'user', 'trigger', 'method', 'path', 'url_name', 'status_code',
+        'duration_ms', 'interval_ms', 'samples', 'flame_graph', 'upstream_timeline',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:profile_id>/folded/',
+                self.admin_site.admin_view(self.folded_view),
+                name='crypto_app_requestprofile_folded',
+            ),
+        ] + super().get_urls()
+
+    def folded_view(self, request, profile_id):
+        """Pilhas em texto para abrir no speedscope ou no flamegraph.pl"""
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        response = HttpResponse(profiling.folded(profile.stacks), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.folded"'
+        return response
+
+    @admin.display(description='Flame graph')
+    def flame_graph(self, obj):
+        url = reverse('admin:crypto_app_requestprofile_folded', args=[obj.id])
+        return format_html(
+            '<div style="overflow-x:auto">{}</div><a href="{}">Baixar pilhas (formato folded)</a>',
+            mark_safe(profiling.flame_svg(obj.stacks)),
+            url,
+        )
+
+    @admin.display(description='Linha do tempo')
+    def upstream_timeline(self, obj):
+        return format_html(
+            '<div style="overflow-x:auto">{}</div>',
+            mark_safe(profiling.timeline_svg(obj.timeline, obj.duration_ms)),
+        )
+
+
+class LedgerCallInline(admin.TabularInline):
+    model = LedgerCall
+    extra = 0
+    can_delete = False
+    fields = (
+        'service', 'method', 'path', 'status_code', 'start_ms', 'duration_ms', 'bytes_in',
+        'model', 'input_tokens', 'cached_tokens', 'output_tokens', 'cmc_credits', 'cost_usd',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerRequest)
+class LedgerRequestAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'route', 'symbol', 'query', 'status_code', 'duration_ms', 'upstream_calls',
+        'input_tokens', 'output_tokens', 'cmc_credits', 'cost_usd', 'user',
+    )
+    list_filter = ('route', 'status_code')
+    search_fields = ('symbol', 'query', 'path')
+    date_hierarchy = 'created_at'
+    inlines = (LedgerCallInline,)
+    change_list_template = 'admin/crypto_app/ledgerrequest/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                'report/',
+                self.admin_site.admin_view(self.report_view),
+                name='crypto_app_ledgerrequest_report',
+            ),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        """Consultas mais caras, custo por moeda e latência por rota e por serviço (?days=)"""
+        try:
+            days = float(request.GET.get('days', 7))
+        except ValueError:
+            days = 7
+        # nan/inf e janelas enormes estouram o timedelta do ledger.report
+        if not math.isfinite(days):
+            days = 7
+        days = min(max(days, 0), REPORT_MAX_DAYS)
+        return TemplateResponse(request, 'admin/crypto_app/ledger_report.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Custo e latência por requisição',
+            'report': ledger.report(days),
+        })
@@ -0,0 +1,139 @@
+"""Controle de admissão por processo: grupos de concorrência e token buckets por cliente.
+
+Cada rota pertence a um grupo (ADMISSION_ROUTES). Um grupo admite até
+`concurrency` requisições simultâneas e enfileira no máximo `queue` outras,
+cada uma esperando até `wait` segundos; além disso a requisição é descartada.
+Assim análises longas com LLM ("expensive") não ocupam os workers do índice e
+dos gráficos ("cheap").
+"""
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+# Limite de clientes acompanhados antes de descartar os buckets cheios
+MAX_CLIENTS = 10000
+
+
+class Pool:
+    def __init__(self, name: str, concurrency: int, queue: int, wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> Optional[str]:
+        """None quando admitida; senão o motivo do descarte ("queue_full" ou "timeout")"""
+        with self._cond:
+            if self.active < self.concurrency:
+                self.active += 1
+                return None
+            if self.waiting >= self.queue:
+                return "queue_full"
+            self.waiting += 1
+            deadline = time.monotonic() + self.wait
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return "timeout"
+                    self._cond.wait(remaining)
+                self.active += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class TokenBuckets:
+    """Um token bucket por cliente: `rate` requisições por segundo, rajadas de até `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """0 quando há token; senão os segundos até o próximo token"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > MAX_CLIENTS:
+                self._prune(now)
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now: float) -> None:
+        full = [
+            client
+            for client, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate >= self.burst
+        ]
+        for client in full:
+            del self._buckets[client]
+
+
+_pools: dict[str, Pool] = {}
+_buckets: dict[str, TokenBuckets] = {}
+_lock = threading.Lock()
+
+
+def get_pool(name: str) -> Pool:
+    if name not in _pools:
+        with _lock:
+            if name not in _pools:
+                _pools[name] = Pool(name, **settings.ADMISSION_POOLS[name])
+    return _pools[name]
+
+
+def get_buckets(name: str) -> TokenBuckets:
+    if name not in _buckets:
+        with _lock:
+            if name not in _buckets:
+                rate, burst = settings.ADMISSION_RATES[name]
+                _buckets[name] = TokenBuckets(rate, burst)
+    return _buckets[name]
+
+
+def client_key(request) -> str:
+    """Dono do token bucket: o usuário autenticado ou o endereço do cliente.
+
+    Atrás de proxy reverso, REMOTE_ADDR é o do proxy e todos os clientes
+    cairiam no mesmo bucket: o endereço vem então de ADMISSION_CLIENT_IP_HEADER
+    (ex.: HTTP_X_FORWARDED_FOR), contando ADMISSION_TRUSTED_PROXIES endereços
+    a partir da direita; os anteriores podem ter sido forjados pelo cliente.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    header = settings.ADMISSION_CLIENT_IP_HEADER
+    if header:
+        addresses = [a.strip() for a in request.META.get(header, "").split(",") if a.strip()]
+        if addresses:
+            return "ip:" + addresses[max(len(addresses) - settings.ADMISSION_TRUSTED_PROXIES, 0)]
+    return "ip:" + request.META.get("REMOTE_ADDR", "")
+
+
+def route_pool(url_name: Optional[str], method: str) -> Optional[str]:
+    routes = settings.ADMISSION_ROUTES
+    return routes.get(f"{url_name}:{method}") or routes.get(url_name)
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    return {
+        name: {"active": pool.active, "waiting": pool.waiting, "concurrency": pool.concurrency}
+        for name, pool in _pools.items()
+    }
@@ -1,15 +1,39 @@
+import hashlib
 import logging
 import json
-from typing import Iterable
+from typing import Iterable, Optional
 from abc import ABC, abstractmethod
-from openai import OpenAI
 from openai.types.responses import ResponseInputParam, ToolParam
 from openai.types import ResponsesModel
 
+from crypto_app import governor, metrics, profiling
+from crypto_app.agents.prompts import BLACKBOARD_PROMPT
+from crypto_app.clients import openai_client
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def prefix_key(name: str, system_prompt: str, tools) -> str:
+    """Identifica o prefixo fixo de uma chamada (prompt de sistema + ferramentas).
+
+    Enviado como prompt_cache_key para que requisições com o mesmo prefixo caiam
+    no mesmo cache de prompt do provedor.
+    """
+    blob = json.dumps([system_prompt, list(tools)], ensure_ascii=False, separators=(",", ":"))
+    return f"{name}:{hashlib.sha256(blob.encode()).hexdigest()[:16]}"
+
+
+def record_usage(label: str, response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    logger.info("openai-usage agent=%s input-tokens=%d cached-tokens=%d", label, usage.input_tokens, cached)
+    metrics.record_prompt_cache(label, usage.input_tokens, cached)
+
+
 class Agent(ABC):
     def __init__(
         self,
@@ -17,17 +41,34 @@ class Agent(ABC):
         model: ResponsesModel,
         tools: Iterable[ToolParam],
         system_prompt: str,
+        max_rounds: Optional[int] = None,
     ):
         self._openai_api_key = openai_api_key
         self._model = model
         self._system_prompt = system_prompt
-        self._tools = tools
-        self._client = OpenAI(api_key=self._openai_api_key)
+        # Lista fixa: a mesma ordem (e os mesmos bytes) em todas as chamadas
+        self._tools = list(tools)
+        self._prefix_key = prefix_key(type(self).__name__, system_prompt, self._tools)
+        self._max_rounds = max_rounds
+        self._client = openai_client(self._openai_api_key)
+        # Quadro da consulta orquestrada em andamento (crypto_app.agents.blackboard), se houver
+        self.blackboard = None
 
     @abstractmethod
     def _call_function(self, function_name: str, params): ...
 
-    def ask(self, prompt: str):
+    def _developer_context(self) -> list[str]:
+        """Mensagens de contexto da consulta inseridas logo após o prompt de sistema"""
+        context = self.blackboard.context() if self.blackboard is not None else None
+        return [BLACKBOARD_PROMPT.format(context=context)] if context else []
+
+    def ask(self, prompt: str, tools: Optional[Iterable[ToolParam]] = None):
+        # Ordem fixa para o cache de prompt: ferramentas e prompt de sistema
+        # (iguais em toda chamada) antes da pergunta e dos resultados das ferramentas
+        cache_key = self._prefix_key
+        if tools is not None:
+            tools = list(tools)
+            cache_key = prefix_key(type(self).__name__, self._system_prompt, tools)
         input: ResponseInputParam = [
             {
                 "type": "message",
@@ -40,15 +81,36 @@ class Agent(ABC):
                 "content": prompt,
             },
         ]
+        # Depois do prompt de sistema: o prefixo fixo continua igual para o cache
+        for i, context in enumerate(self._developer_context(), start=1):
+            input.insert(i, {"type": "message", "role": "developer", "content": context})
 
         has_function_call = True
+        rounds = 0
         while has_function_call:
+            rounds += 1
+            extra = {}
+            if self._max_rounds is not None and rounds > self._max_rounds:
+                # Limite de rodadas atingido: força a resposta final sem ferramentas
+                logger.info("max-rounds-reached rounds=%d", self._max_rounds)
+                extra["tool_choice"] = "none"
+
             logger.info("calling-openai-api reponse-create")
-            response = self._client.responses.create(
-                model=self._model,
-                tools=self._tools,
-                input=input,
-            )
+            round_tools = self._tools if tools is None else tools
+            with profiling.span(f"{type(self).__name__} round={rounds}"):
+                response = governor.governed(
+                    self._model,
+                    governor.estimate_tokens(input, round_tools),
+                    lambda: self._client.responses.create(
+                        model=self._model,
+                        tools=round_tools,
+                        input=input,
+                        extra_body={"prompt_cache_key": cache_key},
+                        **extra,
+                    ),
+                    type(self).__name__,
+                )
+            record_usage(type(self).__name__, response)
 
             has_function_call = False
             for output in response.output:
@@ -64,7 +126,7 @@ class Agent(ABC):
                         {
                             "type": "function_call_output",
                             "call_id": output.call_id,
-                            "output": json.dumps(result),
+                            "output": json.dumps(result, separators=(",", ":")),
                         }
                     )
                 elif output.type == "web_search_call":
@@ -72,4 +134,8 @@ class Agent(ABC):
                 elif output.type == "message":
                     input.append(output)
 
+        metrics.incr(f"agent.{type(self).__name__}.asks")
+        metrics.incr(f"agent.{type(self).__name__}.rounds", rounds)
+        if self.blackboard is not None:
+            self.blackboard.record_rounds(type(self).__name__, rounds)
         return input, response
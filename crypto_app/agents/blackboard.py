@@ -0,0 +1,80 @@
+"""Quadro compartilhado pelos agentes de uma mesma consulta orquestrada.
+
+O Orchestrator cria um Blackboard por consulta e o repassa aos sub-agentes.
+Cada resultado de ferramenta (cotações, metadados, buscas na web, respostas
+dos sub-agentes) é registrado com um resumo curto:
+
+- a mesma chamada feita de novo por qualquer agente da árvore é respondida
+  do quadro, sem API nem LLM;
+- os resumos entram na transcrição de cada sub-agente (depois do prompt de
+  sistema, preservando o prefixo em cache) para que ele não busque de novo o
+  que outro agente já trouxe.
+"""
+import json
+import logging
+import threading
+from typing import Any, Optional
+
+from crypto_app import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo dos resumos injetados na transcrição de um sub-agente
+MAX_CONTEXT_CHARS = 4000
+SUMMARY_CHARS = 600
+
+
+def truncate(text: str, limit: int = SUMMARY_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class Blackboard:
+    def __init__(self, max_context_chars: int = MAX_CONTEXT_CHARS):
+        self.max_context_chars = max_context_chars
+        # chave -> (valor, resumo), em ordem de chegada
+        self._entries: dict[str, tuple[Any, str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        # Chamadas (ask) e rodadas de LLM por agente em toda a consulta
+        self.asks: dict[str, int] = {}
+        self.rounds: dict[str, int] = {}
+
+    @staticmethod
+    def key(source: str, name: str, params: dict[str, Any]) -> str:
+        return f"{source}:{name}:" + json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    def get(self, source: str, name: str, params: dict[str, Any]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(self.key(source, name, params))
+            if entry is None:
+                return None
+            self.hits += 1
+        metrics.incr(f"blackboard.hit.{source}")
+        logger.info("blackboard hit source=%s name=%s", source, name)
+        return entry[0]
+
+    def put(self, source: str, name: str, params: dict[str, Any], value: Any, summary: str) -> None:
+        with self._lock:
+            self._entries[self.key(source, name, params)] = (value, truncate(summary))
+
+    def record_rounds(self, agent: str, rounds: int) -> None:
+        with self._lock:
+            self.asks[agent] = self.asks.get(agent, 0) + 1
+            self.rounds[agent] = self.rounds.get(agent, 0) + rounds
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def context(self) -> Optional[str]:
+        """Resumos dos resultados já obtidos, do mais recente ao mais antigo, até o limite"""
+        with self._lock:
+            summaries = [summary for _, summary in reversed(self._entries.values())]
+        lines, size = [], 0
+        for summary in summaries:
+            if size + len(summary) > self.max_context_chars:
+                break
+            lines.append(f"- {summary}")
+            size += len(summary) + 3
+        return "\n".join(lines) if lines else None
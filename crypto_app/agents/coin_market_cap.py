@@ -1,13 +1,20 @@
+import json
 import logging
-from typing import Optional, Literal, Any
+from typing import Optional, Any
 from collections.abc import Callable
 import httpx
+from django.conf import settings
 from openai.types.responses import FunctionToolParam
 from openai.types import ResponsesModel
-from pydantic import BaseModel, Field
 
 from crypto_app.agents.agent import Agent
+from crypto_app.agents.blackboard import truncate
 from crypto_app.agents.prompts import CMC_PROMPT_V3
+from crypto_app.agents.tools import load_tools
+from crypto_app.clients import http_client
+from crypto_app.coordination import single_flight
+from crypto_app.fx import BASE_CURRENCY, expand_quotes, local_rates
+from crypto_app.jsonstream import fields, parse, project
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,269 +30,81 @@ logger = logging.getLogger(__name__)
 COINMARKETCAP_API_URL = "https://pro-api.coinmarketcap.com"
 
 
-class CategoriesParams(BaseModel):
-    start: Optional[int] = Field(
-        description="""Integer >= 1; Default: 1; Optionally offset the start (1-based index) of the paginated list of items to return.""",
-    )
-    limit: Optional[int] = Field(
-        description="""Integer [ 1 .. 5000 ]; Optionally specify the number of results to return. Use this parameter and the "start" parameter to determine your own pagination size.""",
-    )
-    symbol: str = Field(
-        description="""Filter categories one or more comma-separated cryptocurrency symbols. Example: "BTC,ETH".""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-class CategoryParams(BaseModel):
-    id: str = Field(
-        description="""The Category ID. This can be found using the Categories API.""",
-    )
-    start: Optional[int] = Field(
-        description="""Intger >= 1; Default: 1; Optionally offset the start (1-based index) of the paginated list of coins to return.""",
-    )
-    limit: Optional[int] = Field(
-        description="""Integer [ 1 .. 1000]; Default: 100; Optionally specify the number of coins to return. Use this parameter and the "start" parameter to determine your own pagination size.""",
-    )
-    convert: Optional[str] = Field(
-        description="""Optionally calculate market quotes in up to 120 currencies at once by passing a comma-separated list of cryptocurrency or fiat currency symbols. Each additional convert option beyond the first requires an additional call credit. Each conversion is returned in its own "quote" object.""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-class CoinMarketCapIDMapParams(BaseModel):
-    listing_status: Optional[str] = Field(
-        description="""Deafult: "active"; Only active cryptocurrencies are returned by default. Pass inactive to get a list of cryptocurrencies that are no longer active. Pass untracked to get a list of cryptocurrencies that are listed but do not yet meet methodology requirements to have tracked markets available. You may pass one or more comma-separated values.""",
-    )
-    start: Optional[int] = Field(
-        description="""Integer >= 1; Default: 1; Optionally offset the start (1-based index) of the paginated list of items to return.""",
-    )
-    limit: Optional[int] = Field(
-        description="""Integer [ 1 .. 5000 ]; Optionally specify the number of results to return. Use this parameter and the "start" parameter to determine your own pagination size.""",
-    )
-    sort: Optional[Literal["cmc_rank", "id"]] = Field(
-        description="""Default: "id"; What field to sort the list of cryptocurrencies by.""",
-    )
-    symbol: Optional[str] = Field(
-        description="""Optionally pass a comma-separated list of cryptocurrency symbols to return CoinMarketCap IDs for. If this option is passed, other options will be ignored.""",
-    )
-    aux: Optional[str] = Field(
-        description="""Default: "platform,first_historical_data,last_historical_data,is_active"; Optionally specify a comma-separated list of supplemental data fields to return. Pass platform,first_historical_data,last_historical_data,is_active,status to include all auxiliary fields.""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-class MetadataParams(BaseModel):
-    symbol: str = Field(
-        description="""Pass one or more comma-separated cryptocurrency symbols. Example: "BTC,ETH". At least one "id" or "slug" or "symbol" is required for this request. Please note that starting in the v2 endpoint, due to the fact that a symbol is not unique, if you request by symbol each data response will contain an array of objects containing all of the coins that use each requested symbol. The v1 endpoint will still return a single object, the highest ranked coin using that symbol.""",
-    )
-
-    skip_invalid: Optional[bool] = Field(
-        description="""Default: false; Pass true to relax request validation rules. When requesting records on multiple cryptocurrencies an error is returned if any invalid cryptocurrencies are requested or a cryptocurrency does not have matching records in the requested timeframe. If set to true, invalid lookups will be skipped allowing valid cryptocurrencies to still be returned.""",
-    )
-    aux: Optional[str] = Field(
-        description="""Default: "urls,logo,description,tags,platform,date_added,notice"; Optionally specify a comma-separated list of supplemental data fields to return. Pass urls,logo,description,tags,platform,date_added,notice,status to include all auxiliary fields.""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-class ListingsLatest(BaseModel):
-    start: Optional[int] = Field(
-        description="""Integer >= 1; Default: 1; Optionally offset the start (1-based index) of the paginated list of items to return.""",
-    )
-    limit: Optional[int] = Field(
-        description="""Integer [ 1 .. 5000 ]; Default: 100; Optionally specify the number of results to return. Use this parameter and the "start" parameter to determine your own pagination size.""",
-    )
-    price_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum USD price to filter results by.""",
-    )
-    price_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum USD price to filter results by.""",
-    )
-    market_cap_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum market cap to filter results by.""",
-    )
-    market_cap_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum market cap to filter results by.""",
-    )
-    volume_24h_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum 24 hour USD volume to filter results by.""",
-    )
-    volume_24h_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum 24 hour USD volume to filter results by.""",
-    )
-    circulating_supply_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum circulating supply to filter results by.""",
-    )
-    circulating_supply_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum circulating supply to filter results by.""",
-    )
-    percent_change_24h_min: Optional[float] = Field(
-        description="""Number >= -100; Optionally specify a threshold of minimum 24 hour percent change to filter results by.""",
-    )
-    percent_change_24h_max: Optional[float] = Field(
-        description="""Number >= -100; Optionally specify a threshold of maximum 24 hour percent change to filter results by.""",
-    )
-    self_reported_circulating_supply_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum self reported circulating supply to filter results by.""",
-    )
-    self_reported_circulating_supply_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum self reported circulating supply to filter results by.""",
-    )
-    self_reported_market_cap_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum self reported market cap to filter results by.""",
-    )
-    self_reported_market_cap_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum self reported market cap to filter results by.""",
-    )
-    unlocked_market_cap_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum unlocked market cap to filter results by.""",
-    )
-    unlocked_market_cap_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum unlocked market cap to filter results by.""",
-    )
-    unlocked_circulating_supply_min: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of minimum unlocked circulating supply to filter results by.""",
-    )
-    unlocked_circulating_supply_max: Optional[float] = Field(
-        description="""Number [ 0 .. 100000000000000000 ]; Optionally specify a threshold of maximum unlocked circulating supply to filter results by.""",
-    )
-    convert: Optional[str] = Field(
-        description="""Optionally calculate market quotes in up to 120 currencies at once by passing a comma-separated list of cryptocurrency or fiat currency symbols. Each additional convert option beyond the first requires an additional call credit. Each conversion is returned in its own "quote" object.""",
-    )
-    sort: Optional[
-        Literal[
-            "name",
-            "symbol",
-            "date_added",
-            "market_cap",
-            "market_cap_strict",
+FUNCTIONS: list[FunctionToolParam] = load_tools("coin_market_cap")
+
+# Respostas grandes (até 5000 itens) lidas em streaming: cada item de "data" é
+# reduzido a estes campos antes de ir para a transcrição do agente
+PROJECTIONS = {
+    "listings_latest": fields(
+        "id",
+        "name",
+        "symbol",
+        "slug",
+        "cmc_rank",
+        "num_market_pairs",
+        "circulating_supply",
+        "total_supply",
+        "max_supply",
+        "infinite_supply",
+        "date_added",
+        "last_updated",
+        quote={"*": fields(
             "price",
-            "circulating_supply",
-            "total_supply",
-            "max_supply",
-            "num_market_pairs",
             "volume_24h",
+            "volume_change_24h",
             "percent_change_1h",
             "percent_change_24h",
             "percent_change_7d",
-            "market_cap_by_total_supply_strict",
-            "volume_7d",
-            "volume_30d",
-        ]
-    ] = Field(
-        description="""Default: "market_cap"; What field to sort the list of cryptocurrencies by.""",
-    )
-    sort_dir: Optional[Literal["asc", "desc"]] = Field(
-        description="""The direction in which to order cryptocurrencies against the specified sort.""",
-    )
-    cryptocurrency_type: Optional[Literal["all", "coins", "tokens"]] = Field(
-        description="""Default: "all"; The type of cryptocurrency to include.""",
-    )
-    tag: Optional[Literal["all", "defi", "filesharing"]] = Field(
-        description="""Default: "all"; The tag of cryptocurrency to include.""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-class QuotesLatestParams(BaseModel):
-    symbol: str = Field(
-        description="""Pass one or more comma-separated cryptocurrency symbols. Example: "BTC,ETH". At least one "id" or "slug" or "symbol" is required for this request.""",
-    )
-    convert: Optional[str] = Field(
-        description="""Optionally calculate market quotes in up to 120 currencies at once by passing a comma-separated list of cryptocurrency or fiat currency symbols. Each additional convert option beyond the first requires an additional call credit. A list of supported fiat options can be found here. Each conversion is returned in its own "quote" object.""",
-    )
-    skip_invalid: Optional[bool] = Field(
-        description="""Default: true; Pass true to relax request validation rules. When requesting records on multiple cryptocurrencies an error is returned if no match is found for 1 or more requested cryptocurrencies. If set to true, invalid lookups will be skipped allowing valid cryptocurrencies to still be returned.""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
-
-
-FUNCTIONS: list[FunctionToolParam] = [
-    {
-        "type": "function",
-        "name": "categories",
-        "strict": True,
-        "parameters": CategoriesParams.model_json_schema(),
-        "description": """Returns information about all coin categories available on CoinMarketCap. Includes a paginated list of cryptocurrency quotes and metadata from each category.""",
-    },
-    {
-        "type": "function",
-        "name": "category",
-        "strict": True,
-        "parameters": CategoryParams.model_json_schema(),
-        "description": """Returns information about a single coin category available on CoinMarketCap. Includes a paginated list of the cryptocurrency quotes and metadata for the category.""",
-    },
-    {
-        "type": "function",
-        "name": "coinmarketcap_id_map",
-        "strict": True,
-        "parameters": CoinMarketCapIDMapParams.model_json_schema(),
-        "description": """
-Returns a mapping of all cryptocurrencies to unique CoinMarketCap ids. Per our Best Practices we recommend utilizing CMC ID instead of cryptocurrency symbols to securely identify cryptocurrencies with our other endpoints and in your own application logic. Each cryptocurrency returned includes typical identifiers such as name, symbol, and token_address for flexible mapping to id.
-By default this endpoint returns cryptocurrencies that have actively tracked markets on supported exchanges. You may receive a map of all inactive cryptocurrencies by passing listing_status=inactive. You may also receive a map of registered cryptocurrency projects that are listed but do not yet meet methodology requirements to have tracked markets via listing_status=untracked. Please review our methodology documentation for additional details on listing states.
-Cryptocurrencies returned include first_historical_data and last_historical_data timestamps to conveniently reference historical date ranges available to query with historical time-series data endpoints. You may also use the aux parameter to only include properties you require to slim down the payload if calling this endpoint frequently.
-""",
-    },
-    {
-        "type": "function",
-        "name": "metadata",
-        "strict": True,
-        "parameters": MetadataParams.model_json_schema(),
-        "description": """Returns all static metadata available for one or more cryptocurrencies. This information includes details like logo, description, official website URL, social links, and links to a cryptocurrency's technical documentation.""",
-    },
-    {
-        "type": "function",
-        "name": "listings_latest",
-        "strict": True,
-        "parameters": ListingsLatest.model_json_schema(),
-        "description": """
-Returns a paginated list of all active cryptocurrencies with latest market data. The default "market_cap" sort returns cryptocurrency in order of CoinMarketCap's market cap rank (as outlined in our methodology) but you may configure this call to order by another market ranking field. Use the "convert" option to return market values in multiple fiat and cryptocurrency conversions in the same call.
-You may sort against any of the following:
-market_cap: CoinMarketCap's market cap rank as outlined in our methodology.
-market_cap_strict: A strict market cap sort (latest trade price x circulating supply).
-name: The cryptocurrency name.
-symbol: The cryptocurrency symbol.
-date_added: Date cryptocurrency was added to the system.
-price: latest average trade price across markets.
-circulating_supply: approximate number of coins currently in circulation.
-total_supply: approximate total amount of coins in existence right now (minus any coins that have been verifiably burned).
-max_supply: our best approximation of the maximum amount of coins that will ever exist in the lifetime of the currency.
-num_market_pairs: number of market pairs across all exchanges trading each currency.
-market_cap_by_total_supply_strict: market cap by total supply.
-volume_24h: rolling 24 hour adjusted trading volume.
-volume_7d: rolling 24 hour adjusted trading volume.
-volume_30d: rolling 24 hour adjusted trading volume.
-percent_change_1h: 1 hour trading price percentage change for each currency.
-percent_change_24h: 24 hour trading price percentage change for each currency.
-percent_change_7d: 7 day trading price percentage change for each currency.
-""",
-    },
-    {
-        "type": "function",
-        "name": "quotes_latest",
-        "strict": True,
-        "parameters": QuotesLatestParams.model_json_schema(),
-        "description": """Returns the latest market quote for 1 or more cryptocurrencies. Use the "convert" option to return market values in multiple fiat and cryptocurrency conversions in the same call.""",
-    },
-]
+            "percent_change_30d",
+            "market_cap",
+            "market_cap_dominance",
+            "fully_diluted_market_cap",
+            "last_updated",
+        )},
+    ),
+    "coinmarketcap_id_map": fields("id", "rank", "name", "symbol", "slug", "is_active"),
+}
+
+
+def _coins(data) -> list[dict]:
+    """Moedas da resposta: lista (listings) ou dicionário símbolo/id -> moeda ou lista de moedas"""
+    if isinstance(data, list):
+        return [c for c in data if isinstance(c, dict)]
+    if not isinstance(data, dict):
+        return []
+    coins = []
+    for value in data.values():
+        coins.extend(_coins(value) if isinstance(value, list) else [value] if isinstance(value, dict) else [])
+    return coins
+
+
+def _coin_line(coin: dict) -> str:
+    parts = [f"{coin.get('name', '?')} ({coin.get('symbol', '?')})"]
+    for convert, quote in (coin.get("quote") or {}).items():
+        if isinstance(quote, dict) and quote.get("price") is not None:
+            line = f"{quote['price']:.6g} {convert}"
+            if quote.get("percent_change_24h") is not None:
+                line += f" 24h {quote['percent_change_24h']:+.2f}%"
+            if quote.get("market_cap"):
+                line += f" mcap {quote['market_cap']:.4g}"
+            parts.append(line)
+    if coin.get("category"):
+        parts.append(str(coin["category"]))
+    if coin.get("description"):
+        parts.append(truncate(str(coin["description"]), 160))
+    return " ".join(parts)
+
+
+def summarize(function_name: str, params: dict[str, Any], data) -> str:
+    """Resumo curto de uma resposta do CoinMarketCap para o quadro da consulta"""
+    args = ", ".join(f"{k}={v}" for k, v in sorted(params.items()))
+    head = f"coinmarketcap {function_name}({args}):"
+    coins = _coins(data.get("data")) if isinstance(data, dict) else []
+    if function_name in ("quotes_latest", "listings_latest", "metadata", "coinmarketcap_id_map") and coins:
+        shown = coins[:10]
+        more = f" (+{len(coins) - len(shown)} moedas)" if len(coins) > len(shown) else ""
+        return f"{head} " + "; ".join(_coin_line(c) for c in shown) + more
+    return f"{head} " + json.dumps(data, ensure_ascii=False, separators=(",", ":"))
 
 
 class CoinMarketAgent(Agent):
@@ -294,14 +113,22 @@ class CoinMarketAgent(Agent):
         openai_api_key: str,
         coimarketcap_api_key: str,
         model: ResponsesModel = "gpt-4o-mini",
+        max_rounds: Optional[int] = None,
+        snapshot: Optional[Callable[[], Any]] = None,
     ):
         super().__init__(
-            openai_api_key, model=model, tools=FUNCTIONS, system_prompt=CMC_PROMPT_V3
+            openai_api_key,
+            model=model,
+            tools=FUNCTIONS,
+            system_prompt=CMC_PROMPT_V3,
+            max_rounds=max_rounds,
         )
         self._coimarketcap_api_key = coimarketcap_api_key
+        # Fornece o MarketSnapshot local (crypto_app.market.get_snapshot), se houver
+        self._snapshot = snapshot
 
     def _categories(self, params):
-        return httpx.get(
+        return http_client().get(
             f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/categories",
             headers={
                 "X-CMC_PRO_API_KEY": self._coimarketcap_api_key,
@@ -310,7 +137,7 @@ class CoinMarketAgent(Agent):
         )
 
     def _category(self, params):
-        return httpx.get(
+        return http_client().get(
             f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/category",
             headers={
                 "X-CMC_PRO_API_KEY": self._coimarketcap_api_key,
@@ -318,17 +145,35 @@ class CoinMarketAgent(Agent):
             params=params,
         )
 
-    def _coinmarketcap_id_map(self, params):
-        return httpx.get(
-            f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/map",
+    def _stream(self, function_name, path, params):
+        """GET lido em streaming, com os itens de "data" reduzidos a PROJECTIONS[function_name]"""
+        with http_client().stream(
+            "GET",
+            f"{COINMARKETCAP_API_URL}{path}",
             headers={
                 "X-CMC_PRO_API_KEY": self._coimarketcap_api_key,
             },
             params=params,
+        ) as response:
+            if response.status_code != 200:
+                self._request_failed(function_name, response.status_code, params)
+            return parse(response.iter_bytes(), PROJECTIONS[function_name])
+
+    def _request_failed(self, function_name, status_code, params):
+        logger.error(
+            "copinmarketcap-request function-name=%s status-code=%d",
+            function_name,
+            status_code,
+        )
+        raise Exception(
+            f"Request to '{function_name}' failed with params '{params}'"
         )
 
+    def _coinmarketcap_id_map(self, params):
+        return self._stream("coinmarketcap_id_map", "/v1/cryptocurrency/map", params)
+
     def _metadata(self, params):
-        return httpx.get(
+        return http_client().get(
             f"{COINMARKETCAP_API_URL}/v2/cryptocurrency/info",
             headers={
                 "X-CMC_PRO_API_KEY": self._coimarketcap_api_key,
@@ -337,16 +182,10 @@ class CoinMarketAgent(Agent):
         )
 
     def _listings_latest(self, params):
-        return httpx.get(
-            f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/listings/latest",
-            headers={
-                "X-CMC_PRO_API_KEY": self._coimarketcap_api_key,
-            },
-            params=params,
-        )
+        return self._stream("listings_latest", "/v1/cryptocurrency/listings/latest", params)
 
     def _quotes_latest(self, params):
-        return httpx.get(
+        return http_client().get(
             f"{COINMARKETCAP_API_URL}/v2/cryptocurrency/quotes/latest",
             headers={ 
                 'Accepts': 'application/json',
@@ -355,8 +194,29 @@ class CoinMarketAgent(Agent):
             params=params,
         )
 
+    def _local_response(self, function_name, params):
+        if self._snapshot is None or function_name not in ("listings_latest", "quotes_latest"):
+            return None
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return None
+
+        converts = [c.strip().upper() for c in params.get("convert", "USD").split(",")]
+        if function_name == "listings_latest":
+            if not snapshot.can_serve(converts, params):
+                return None
+            listings = snapshot.listings(params)
+            # Mesmos campos da resposta lida em streaming
+            listings["data"] = [project(item, PROJECTIONS[function_name]) for item in listings["data"]]
+            return listings
+
+        symbols = [s.strip().upper() for s in params["symbol"].split(",")]
+        if not snapshot.can_serve(converts) or any(snapshot.row(s) is None for s in symbols):
+            return None
+        return snapshot.quotes_latest(symbols, converts)
+
     def _call_function(self, function_name, params):
-        functions: dict[str, Callable[[Any], httpx.Response]] = {
+        functions: dict[str, Callable[[Any], httpx.Response | dict]] = {
             "categories": self._categories ,
             "category": self._category,
             "coinmarketcap_id_map": self._coinmarketcap_id_map,
@@ -368,14 +228,43 @@ class CoinMarketAgent(Agent):
             logger.error("function-not-found=%s", function_name)
             raise Exception(f"Function '{function_name}' does not exist")
         params = { k: v for k, v in params.items() if v is not None }
-        response = functions[function_name](params)
-        if response.status_code != 200:
-            logger.error(
-                "copinmarketcap-request function-name=%s status-code=%d",
-                function_name,
-                response.status_code,
-            )
-            raise Exception(
-                f"Request to '{function_name}' failed with params '{params}'"
-            )
-        return response.json()
+        if self.blackboard is not None:
+            known = self.blackboard.get("coinmarketcap", function_name, params)
+            if known is not None:
+                return known
+        data = self._fetch(function_name, functions[function_name], params)
+        if self.blackboard is not None:
+            self.blackboard.put("coinmarketcap", function_name, params, data, summarize(function_name, params, data))
+        return data
+
+    def _fetch(self, function_name, function, params):
+        local = self._local_response(function_name, params)
+        if local is not None:
+            logger.info("coinmarketcap-local function-name=%s", function_name)
+            return local
+
+        # Várias moedas de conversão: busca só em USD e converte aqui (o custo da
+        # chamada, 1 crédito a cada 200 moedas na listagem, não se multiplica por moeda)
+        rates = None
+        converts = [c.strip().upper() for c in params.get("convert", "").split(",") if c.strip()]
+        if function_name in ("listings_latest", "quotes_latest") and len(converts) > 1:
+            snapshot = self._snapshot() if self._snapshot is not None else None
+            rates = local_rates(converts, snapshot)
+            if rates is not None:
+                params = {**params, "convert": BASE_CURRENCY}
+
+        def fetch():
+            response = function(params)
+            if isinstance(response, dict):
+                # Já lida em streaming e projetada (_stream)
+                return response
+            if response.status_code != 200:
+                self._request_failed(function_name, response.status_code, params)
+            return response.json()
+
+        # Uma chamada por (função, parâmetros) a cada CMC_SHARED_TTL entre todos os nós
+        key = "cmc:" + function_name + ":" + json.dumps(params, sort_keys=True, separators=(",", ":"))
+        data = single_flight(key, fetch, ttl=settings.CMC_SHARED_TTL.get(function_name, 60))
+        if rates is not None:
+            return expand_quotes(data, rates)
+        return data
@@ -0,0 +1,130 @@
+import logging
+import re
+from collections.abc import Container
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IntentKind = Literal["quote", "listing", "metadata"]
+
+# Nomes mais comuns digitados por extenso e seus símbolos
+COIN_NAMES = {
+    "bitcoin": "BTC",
+    "ethereum": "ETH",
+    "tether": "USDT",
+    "ripple": "XRP",
+    "solana": "SOL",
+    "cardano": "ADA",
+    "dogecoin": "DOGE",
+    "polkadot": "DOT",
+    "litecoin": "LTC",
+    "chainlink": "LINK",
+    "tron": "TRX",
+    "avalanche": "AVAX",
+    "binance coin": "BNB",
+}
+
+PRICE_WORDS = re.compile(
+    r"\b(pre[çc]o|cota[çc][ãa]o|valor|vale|custa|price|quote|quanto)\b", re.IGNORECASE
+)
+RESEARCH_WORDS = re.compile(
+    r"\b(por ?que|porqu[eê]|an[áa]lise|analis\w*|not[íi]cias?|previs[ãa]o|prever|"
+    r"tend[êe]ncias?|compar\w*|futuro|investir|vale a pena|riscos?|why|news|forecast|compare)\b",
+    re.IGNORECASE,
+)
+SYMBOL_TOKEN = re.compile(r"\b[A-Z][A-Z0-9]{1,5}\b")
+# Siglas em maiúsculas que aparecem nas perguntas e não são moedas
+NON_SYMBOLS = {"BRL", "USD", "EUR", "API", "CMC", "HTML"}
+
+
+CONVERT_WORDS = {
+    "BRL": re.compile(r"\b(brl|reais|real)\b", re.IGNORECASE),
+    "USD": re.compile(r"\b(usd|d[óo]lar(es)?)\b", re.IGNORECASE),
+    "EUR": re.compile(r"\b(eur|euros?)\b", re.IGNORECASE),
+}
+METADATA_WORDS = re.compile(
+    r"\b(site|website|descri[çc][ãa]o|o que [ée]|whitepaper|redes sociais|twitter|"
+    r"reddit|criad[oa]|lan[çc]ad[oa]|detalhes|informa[çc][õo]es sobre)\b",
+    re.IGNORECASE,
+)
+LISTING_WORDS = re.compile(
+    r"\b(top|ranking|maiores|principais|mais negociad[oa]s|subiram mais|ca[íi]ram mais)\b",
+    re.IGNORECASE,
+)
+LISTING_SIZE = re.compile(r"\b(?:top|as|os)\s+(\d{1,3})\b", re.IGNORECASE)
+
+# Ordenação do listings_latest inferida a partir da pergunta
+LISTING_SORTS = [
+    (re.compile(r"\bmais negociad[oa]s\b|\bvolume\b", re.IGNORECASE), "volume_24h", "desc"),
+    (re.compile(r"\b(maiores )?quedas?\b|\bca[íi]ram\b", re.IGNORECASE), "percent_change_24h", "asc"),
+    (re.compile(r"\b(maiores )?altas?\b|\bsubiram\b|\bvaloriza", re.IGNORECASE), "percent_change_24h", "desc"),
+]
+
+
+class Intent(BaseModel):
+    kind: IntentKind
+    symbols: tuple[str, ...] = ()
+    convert: str = "BRL"
+    limit: int = 10
+    sort: str = "market_cap"
+    sort_dir: Literal["asc", "desc"] = "desc"
+
+
+def find_symbols(query: str) -> list[str]:
+    symbols = []
+    lowered = query.lower()
+    for name, symbol in COIN_NAMES.items():
+        if re.search(rf"\b{name}\b", lowered):
+            symbols.append(symbol)
+    for token in SYMBOL_TOKEN.findall(query):
+        if token not in NON_SYMBOLS:
+            symbols.append(token)
+    return list(dict.fromkeys(symbols))
+
+
+def _convert(query: str) -> str:
+    for currency, pattern in CONVERT_WORDS.items():
+        if pattern.search(query):
+            return currency
+    return "BRL"
+
+
+def parse_intent(query: str, known_symbols: Optional[Container[str]] = None) -> Optional[Intent]:
+    """Reconhece consultas diretas (cotação, listagem, metadados) que dispensam o agente.
+
+    Retorna None quando a pergunta precisa de interpretação e deve seguir para o
+    orquestrador.
+    """
+    if RESEARCH_WORDS.search(query):
+        return None
+
+    symbols = find_symbols(query)
+    if known_symbols is not None:
+        symbols = [s for s in symbols if s in known_symbols]
+    convert = _convert(query)
+
+    if symbols and METADATA_WORDS.search(query) and not PRICE_WORDS.search(query):
+        intent = Intent(kind="metadata", symbols=tuple(symbols), convert=convert)
+    elif symbols and PRICE_WORDS.search(query):
+        intent = Intent(kind="quote", symbols=tuple(symbols), convert=convert)
+    elif not symbols and LISTING_WORDS.search(query):
+        size = LISTING_SIZE.search(query)
+        sort, sort_dir = "market_cap", "desc"
+        for pattern, field, direction in LISTING_SORTS:
+            if pattern.search(query):
+                sort, sort_dir = field, direction
+                break
+        intent = Intent(
+            kind="listing",
+            convert=convert,
+            limit=min(int(size.group(1)), 100) if size else 10,
+            sort=sort,
+            sort_dir=sort_dir,
+        )
+    else:
+        return None
+
+    logger.info("intent kind=%s symbols=%s", intent.kind, ",".join(intent.symbols))
+    return intent
@@ -1,73 +1,107 @@
 import logging
-from typing import Any
+import json
+from datetime import datetime
+from typing import Any, Iterable, Optional
 from collections.abc import Callable
-from openai.types.responses import FunctionToolParam, Response
+from openai.types.responses import FunctionToolParam
 from openai.types import ResponsesModel
-from pydantic import BaseModel, Field
- 
+
 from crypto_app.agents.agent import Agent
+from crypto_app.agents.blackboard import Blackboard
 from crypto_app.agents.coin_market_cap import CoinMarketAgent
 from crypto_app.agents.web_search import WebSearchAgent
-from crypto_app.agents.prompts import O_PROMPT
+from crypto_app.agents.prompts import HISTORY_PROMPT, O_PROMPT
+from crypto_app.agents.tools import load_tools
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class CoinMarketCapAgentParams(BaseModel):
-    query: str = Field(
-        description="""Prompt de consulta para o agente LLm que tem acesso a API do CoinMarketCap""",
-    )
-
-    model_config = {
-        "extra": "forbid",
-    }
+FUNCTIONS: list[FunctionToolParam] = load_tools("orchestrator")
 
-class WebSeatchAgentParams(BaseModel):
-    query: str = Field(
-        description="""Prompt de consulta para o agente LLm que pode fazer pesquisas web sobre criptomoedas""",
-    )
 
-    model_config = {
-        "extra": "forbid",
-    }
+class Orchestrator(Agent):
+    def __init__(
+        self,
+        openai_api_key: str,
+        coimarketcap_api_key: str,
+        model: ResponsesModel = "gpt-4o-mini",
+        tools: Optional[Iterable[str]] = None,
+        max_rounds: Optional[int] = None,
+        sub_agent_model: Optional[ResponsesModel] = None,
+        snapshot: Optional[Callable[[], Any]] = None,
+        cache: Optional[Any] = None,
+        news_search: Optional[Callable[..., list]] = None,
+        recall: Optional[Callable[[str], list]] = None,
+    ):
+        functions = FUNCTIONS
+        if tools is not None:
+            functions = [f for f in FUNCTIONS if f["name"] in tools]
+        if news_search is None:
+            functions = [f for f in functions if f["name"] != "news_search"]
+        self._news_search_index = news_search
+        # Busca nas análises anteriores (crypto_app.history.recall_analyses), se houver
+        self._recall = recall
+        self._recalled: list = []
+        super().__init__(openai_api_key, model, functions, O_PROMPT, max_rounds)
+        sub_agent_model = sub_agent_model or model
+        self._coin_market_cap = CoinMarketAgent(
+            openai_api_key, coimarketcap_api_key, sub_agent_model, max_rounds, snapshot
+        )
+        self._web_search = WebSearchAgent(openai_api_key, sub_agent_model, max_rounds, cache)
 
+    def ask(self, prompt, tools=None):
+        from crypto_app import history
 
-FUNCTIONS: list[FunctionToolParam] = [
-    {
-        "type": "function",
-        "name": "coin_market_cap_agent",
-        "strict": True,
-        "parameters": CoinMarketCapAgentParams.model_json_schema(),
-        "description": """Retorna informações sobre criptomeodas coletadas pelo agente LLM a partir da API do CoinMArketCap como cotações e listagens""",
-    },
-    {
-        "type": "function",
-        "name": "web_search_agent",
-        "strict": True,
-        "parameters": WebSeatchAgentParams.model_json_schema(),
-        "description": """Retorna informações sobre cripotmoedas coletadas pelo agente LLM a partir de suas pesquisas web realizadas""",
-    },
-]
+        # Um quadro por consulta: o que um sub-agente busca fica visível para os outros
+        self.blackboard = Blackboard()
+        self._coin_market_cap.blackboard = self.blackboard
+        self._web_search.blackboard = self.blackboard
+        self._recalled = self._recall(prompt) if self._recall is not None else []
+        try:
+            result = super().ask(prompt, tools)
+        finally:
+            logger.info("blackboard entries=%d hits=%d", len(self.blackboard), self.blackboard.hits)
+        rounds = sum(self.blackboard.rounds.values())
+        web_searches = self.blackboard.asks.get(type(self._web_search).__name__, 0)
+        history.record_query(bool(self._recalled), rounds, web_searches)
+        logger.info(
+            "orchestrator recalled=%d rounds=%d web-searches=%d", len(self._recalled), rounds, web_searches
+        )
+        return result
 
+    def _developer_context(self) -> list[str]:
+        context = super()._developer_context()
+        if not self._recalled:
+            return context
+        lines = [
+            f"- {datetime.fromtimestamp(a['created_ts']).strftime('%d/%m/%Y %H:%M')} "
+            f"{a['name']} ({a['symbol']}), recomendação {a['recommendation'] or '-'}: {a['excerpt']}"
+            for a in self._recalled
+        ]
+        return [HISTORY_PROMPT.format(context="\n".join(lines))] + context
 
-class Orchestrator(Agent):
-    def __init__(self, openai_api_key: str, coimarketcap_api_key: str, model: ResponsesModel = "gpt-4o-mini"):
-        super().__init__(openai_api_key, model, FUNCTIONS, O_PROMPT)
-        self._coin_market_cap = CoinMarketAgent(openai_api_key, coimarketcap_api_key, model)
-        self._web_search = WebSearchAgent(openai_api_key, model)
-
-    def _coin_market_cap_agent(self, query: str):
+    def _coin_market_cap_agent(self, query: str) -> str:
         _, r = self._coin_market_cap.ask(query)
-        return r
+        return r.output_text
 
-    def _web_search_agent(self, query: str):
-        _, r = self._coin_market_cap.ask(query)
-        return r
+    def _web_search_agent(self, query: str) -> str:
+        result = self._web_search.search(query)
+        if not result["sources"]:
+            return result["text"]
+        sources = "\n".join(f"- {s['title']}: {s['url']}" for s in result["sources"])
+        return f"{result['text']}\n\nFontes:\n{sources}"
+
+    def _news_search(self, query: str, symbol: Optional[str] = None, days: Optional[float] = None) -> str:
+        articles = self._news_search_index(query=query, symbol=symbol, days=days)
+        if not articles:
+            return "Nenhuma notícia encontrada no índice local; use o web_search_agent se necessário."
+        return json.dumps(articles, ensure_ascii=False)
 
     def _call_function(self, function_name, params):
-        functions: dict[str, Callable[[Any], Response]] = {
+        functions: dict[str, Callable[..., str]] = {
             "coin_market_cap_agent": self._coin_market_cap_agent,
             "web_search_agent": self._web_search_agent,
+            "news_search": self._news_search,
         }
         if function_name not in functions:
             logger.error("function-not-found=%s", function_name)
@@ -76,7 +110,11 @@ class Orchestrator(Agent):
             logger.error("params-query-error")
             raise Exception("Params are missing the query")
 
-        query = params["query"]
-        response = functions[function_name](query)
-        return response.output_text
+        # A mesma delegação repetida na consulta é respondida pelo quadro, sem novo sub-agente
+        known = self.blackboard.get("agent", function_name, params)
+        if known is not None:
+            return known
+        result = functions[function_name](**params)
+        self.blackboard.put("agent", function_name, params, result, f"{function_name} \"{params['query']}\": {result}")
+        return result
     
\ No newline at end of file
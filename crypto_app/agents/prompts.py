@@ -1,21 +1,82 @@
 from typing import Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class PricePrediction(BaseModel):
-    three_months: float
-    six_months: float
-    one_year: float
+    three_months: float = Field(description="Variação percentual esperada em 3 meses (ex.: 12.5 para +12,5%)")
+    six_months: float = Field(description="Variação percentual esperada em 6 meses")
+    one_year: float = Field(description="Variação percentual esperada em 1 ano")
 
+    model_config = {
+        "extra": "forbid",
+    }
 
-class QuotesLatestResult(BaseModel):
+    def as_percentages(self) -> dict[str, str]:
+        # Formato usado pelo CryptoAnalysis.price_prediction e pelos templates
+        return {
+            "3_months": f"{self.three_months:g}%",
+            "6_months": f"{self.six_months:g}%",
+            "1_year": f"{self.one_year:g}%",
+        }
+
+
+class AnalysisFields(BaseModel):
     risk_level: Literal["baixo", "médio", "alto"]
-    recomendation: Literal["comprar", "segurar", "vender"]
+    recommendation: Literal["comprar", "segurar", "vender"]
     confidence: float = Field(description="Esse número deve estar entre 0.0 e 1.0")
     price_prediction: PricePrediction
+
+    model_config = {
+        "extra": "forbid",
+    }
+
+    @field_validator("confidence")
+    @classmethod
+    def _confidence_range(cls, value: float) -> float:
+        if not 0.0 <= value <= 1.0:
+            raise ValueError("confidence deve estar entre 0.0 e 1.0")
+        return value
+
+
+class QuotesLatestResult(AnalysisFields):
     analysis_summary: str
 
 
+class ReportResult(AnalysisFields):
+    symbol: str = Field(description="Símbolo da criptomoeda principal do relatório (ex.: BTC)")
+    name: str = Field(description="Nome da criptomoeda principal do relatório (ex.: Bitcoin)")
+
+
+ANALYSIS_PROMPT = """
+Você é um analista financeiro especializado em criptomoedas. Analise os dados recebidos da API do CoinMarketCap e preencha todos os campos do esquema:
+- **risk_level**: baixo, médio ou alto.
+- **recommendation**: comprar, segurar ou vender.
+- **confidence**: grau de confiança entre 0.0 e 1.0.
+- **price_prediction**: variação percentual esperada em 3 meses, 6 meses e 1 ano.
+- **analysis_summary**: análise detalhada em português.
+"""
+
+REPORT_PROMPT = """
+Você recebe um relatório em HTML sobre criptomoedas produzido por outro agente. Extraia dele, para a criptomoeda principal do relatório, o nível de risco, a recomendação, o grau de confiança (0.0 a 1.0) e a previsão de variação percentual em 3 meses, 6 meses e 1 ano. Quando o relatório não trouxer algum desses pontos, use a estimativa mais conservadora compatível com o texto.
+"""
+
+REPAIR_PROMPT = """
+A resposta anterior não passou na validação do esquema:
+{errors}
+Corrija apenas os campos inválidos e retorne o JSON completo novamente.
+"""
+
+HISTORY_PROMPT = """
+Trechos de análises anteriores desta plataforma relevantes para a pergunta (com data). Use-os como ponto de partida e busque de novo só o que pode ter mudado desde então (preços, notícias recentes):
+{context}
+"""
+
+BLACKBOARD_PROMPT = """
+Dados já obtidos por outros agentes nesta mesma consulta. Use-os diretamente e só chame ferramentas para o que ainda faltar:
+{context}
+"""
+
+
 CMC_PROMPT = """
 Você é um assistente especializado em análise de criptomoedas. Ao receber o nome ou símbolo de uma criptomoeda, forneça um relatório detalhado com os seguintes pontos:
 1. **Resumo da Criptomoeda**: breve descrição do projeto, utilidade, histórico e relevância atual.
@@ -121,6 +182,7 @@ Você é um agente LLM inteligente que responde perguntas sobre criptomoedas uti
 
 - **coin_market_cap_agent**: acessa a API do CoinMarketCap para obter dados confiáveis e atualizados sobre cotações, listagens e métricas de mercado.
 - **web_search_agent**: realiza buscas na web para encontrar informações mais amplas e contextuais sobre criptomoedas, incluindo notícias, tendências e análises.
+- **news_search** (quando disponível): busca notícias recentes em um índice local; consulte-o antes do web_search_agent em perguntas sobre notícias e eventos recentes.
 
 Quando receber uma pergunta do usuário, siga os seguintes passos:
 
@@ -0,0 +1,74 @@
+import logging
+from collections.abc import Container
+from typing import Iterable, Literal, Optional
+from pydantic import BaseModel
+
+from crypto_app.agents.intents import RESEARCH_WORDS, Intent, find_symbols, parse_intent
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QueryClass = Literal["lookup", "market", "research"]
+
+
+class Route(BaseModel):
+    query_class: QueryClass
+    model: Optional[str]
+    tools: tuple[str, ...]
+    max_rounds: int
+    symbols: tuple[str, ...] = ()
+    intent: Optional[Intent] = None
+
+
+def classify(
+    query: str, known_symbols: Optional[Container[str]] = None
+) -> tuple[QueryClass, list[str], Optional[Intent]]:
+    intent = parse_intent(query, known_symbols)
+    if intent is not None:
+        return "lookup", list(intent.symbols), intent
+    symbols = find_symbols(query)
+    if known_symbols is not None:
+        # Como em parse_intent: em texto em maiúsculas, DIGA, SE, VALE... não são moedas
+        symbols = [s for s in symbols if s in known_symbols]
+    if RESEARCH_WORDS.search(query) or len(symbols) > 1:
+        return "research", symbols, None
+    return "market", symbols, None
+
+
+# Modelo ("cheap"/"strong"), ferramentas do orquestrador e limite de rodadas por classe
+ROUTES: dict[QueryClass, tuple[Optional[str], tuple[str, ...], int]] = {
+    # Respondida por template a partir dos dados do CoinMarketCap (ver intents.py), sem LLM
+    "lookup": (None, (), 0),
+    "market": ("cheap", ("coin_market_cap_agent",), 4),
+    "research": ("strong", ("coin_market_cap_agent", "news_search", "web_search_agent"), 8),
+}
+
+
+def route_for(
+    query_class: QueryClass,
+    symbols: Iterable[str] = (),
+    cheap_model: str = "gpt-4o-mini",
+    strong_model: str = "gpt-4o",
+    intent: Optional[Intent] = None,
+) -> Route:
+    tier, tools, max_rounds = ROUTES[query_class]
+    models = {"cheap": cheap_model, "strong": strong_model}
+    return Route(
+        query_class=query_class,
+        model=models.get(tier),
+        tools=tools,
+        max_rounds=max_rounds,
+        symbols=tuple(symbols),
+        intent=intent,
+    )
+
+
+def route_query(
+    query: str,
+    cheap_model: str = "gpt-4o-mini",
+    strong_model: str = "gpt-4o",
+    known_symbols: Optional[Container[str]] = None,
+) -> Route:
+    query_class, symbols, intent = classify(query, known_symbols)
+    logger.info("router query-class=%s symbols=%s", query_class, ",".join(symbols))
+    return route_for(query_class, symbols, cheap_model, strong_model, intent)
@@ -0,0 +1,37 @@
+import json
+import logging
+from functools import cache
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOOL_SCHEMAS_PATH = Path(__file__).with_name("tool_schemas.json")
+
+
+@cache
+def _load_artifact() -> dict:
+    try:
+        with open(TOOL_SCHEMAS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Sem o artefato gera os esquemas a partir dos modelos pydantic (mais lento)
+        logger.warning("tool-schemas artifact-missing path=%s", TOOL_SCHEMAS_PATH)
+        from crypto_app.agents.schemas import build_tool_schemas
+
+        return build_tool_schemas()
+
+
+def load_tools(group: str) -> list[dict]:
+    """Esquemas de ferramentas pré-computados em tool_schemas.json"""
+    return _load_artifact()[group]
+
+
+def write_tool_schemas() -> Path:
+    from crypto_app.agents.schemas import build_tool_schemas
+
+    with open(TOOL_SCHEMAS_PATH, "w", encoding="utf-8") as f:
+        json.dump(build_tool_schemas(), f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    _load_artifact.cache_clear()
+    return TOOL_SCHEMAS_PATH
@@ -1,8 +1,16 @@
+import hashlib
 import logging
+import re
+import unicodedata
+from typing import Any, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from openai.types.responses import WebSearchToolParam
 from openai.types import ResponsesModel
 
+from crypto_app import metrics
 from crypto_app.agents.agent import Agent
+from crypto_app.agents.blackboard import SUMMARY_CHARS, truncate
+from crypto_app.agents.intents import PRICE_WORDS, RESEARCH_WORDS
 from crypto_app.agents.prompts import WS_PROMPT
 
 logging.basicConfig(level=logging.INFO)
@@ -15,14 +23,107 @@ WEB_SEARCH: list[WebSearchToolParam] = [
     }
 ]
 
+NEWS_WORDS = re.compile(r"\b(hoje|agora|[úu]ltim[oa]s?|recentes?|not[íi]cias?|latest|today|news)\b", re.IGNORECASE)
+
+# Validade do resultado em cache: notícias envelhecem mais rápido
+CACHE_TTL = {"news": 10 * 60, "default": 60 * 60}
+
+
+def normalize_query(query: str) -> str:
+    query = unicodedata.normalize("NFKD", query.lower())
+    query = "".join(c for c in query if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", query).split())
+
+
+def context_size_for(query: str) -> str:
+    """search_context_size conforme a classe da pergunta"""
+    if NEWS_WORDS.search(query):
+        return "medium"
+    if RESEARCH_WORDS.search(query):
+        return "high"
+    if PRICE_WORDS.search(query):
+        return "low"
+    return "medium"
+
+
+def source_key(url: str) -> str:
+    # Ignora fragmento e parâmetros de rastreamento ao comparar fontes
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")])
+    normalized = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip("/"), query, ""))
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def cited_sources(response) -> list[dict[str, str]]:
+    sources: dict[str, dict[str, str]] = {}
+    for output in response.output:
+        if output.type != "message":
+            continue
+        for content in output.content:
+            for annotation in getattr(content, "annotations", None) or []:
+                if annotation.type == "url_citation":
+                    sources.setdefault(
+                        source_key(annotation.url),
+                        {"url": annotation.url, "title": annotation.title},
+                    )
+    return list(sources.values())
+
 
 class WebSearchAgent(Agent):
     def __init__(
-        self, openai_api_key: str, model: ResponsesModel = "gpt-4o-mini"
+        self,
+        openai_api_key: str,
+        model: ResponsesModel = "gpt-4o-mini",
+        max_rounds: Optional[int] = None,
+        cache: Optional[Any] = None,
     ):
         super().__init__(
-            openai_api_key, model=model, tools=WEB_SEARCH, system_prompt=WS_PROMPT
+            openai_api_key,
+            model=model,
+            tools=WEB_SEARCH,
+            system_prompt=WS_PROMPT,
+            max_rounds=max_rounds,
         )
+        # Qualquer objeto com get/set(key, value, timeout), ex.: django.core.cache.cache
+        self._cache = cache
+
+    def search(self, query: str) -> dict[str, Any]:
+        """Pesquisa com cache por pergunta normalizada; fontes citadas sem duplicatas"""
+        normalized = normalize_query(query)
+        if self.blackboard is not None:
+            known = self.blackboard.get("web_search", "search", {"query": normalized})
+            if known is not None:
+                return known
+        key = "web-search:" + hashlib.sha1(f"{self._model}:{normalized}".encode()).hexdigest()
+        if self._cache is not None:
+            cached = self._cache.get(key)
+            if cached is not None:
+                metrics.incr("web_search.cache_hit")
+                logger.info("web-search cache-hit hit-ratio=%.2f", metrics.ratio("web_search.cache_hit", "web_search.cache_miss"))
+                self._remember(normalized, cached)
+                return cached
+            metrics.incr("web_search.cache_miss")
+
+        context_size = context_size_for(query)
+        metrics.incr(f"web_search.context_size.{context_size}")
+        tools = [{**WEB_SEARCH[0], "search_context_size": context_size}]
+        _, response = self.ask(query, tools=tools)
+
+        result = {"text": response.output_text, "sources": cited_sources(response)}
+        if self._cache is not None:
+            ttl = CACHE_TTL["news"] if NEWS_WORDS.search(query) else CACHE_TTL["default"]
+            self._cache.set(key, result, ttl)
+        self._remember(normalized, result)
+        return result
+
+    def _remember(self, normalized: str, result: dict[str, Any]) -> None:
+        if self.blackboard is None:
+            return
+        sources = ", ".join(s["url"] for s in result["sources"][:3])
+        summary = f"web_search \"{normalized}\": {result['text']}"
+        if sources:
+            summary = f"{truncate(summary, SUMMARY_CHARS - len(sources) - 10)} Fontes: {sources}"
+        self.blackboard.put("web_search", "search", {"query": normalized}, result, summary)
 
     def _call_function(self, function_name, params):
         logger.error("function-call impossible")
@@ -0,0 +1,251 @@
+"""Alertas de preço, variação e risco avaliados a cada novo snapshot do mercado.
+
+Os alertas ativos ficam em um índice por tipo, ordenado por (moeda, limiar):
+para cada moeda os alertas disparados formam um intervalo contíguo do índice
+(limiares <= valor nos tipos "acima", >= valor nos tipos "abaixo"), achado
+com um único np.searchsorted para todas as moedas de uma vez. Centenas de
+milhares de alertas são avaliados em milissegundos.
+"""
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tipo do alerta -> (valor observado, direção do disparo)
+KINDS = {
+    "price_above": ("price", "above"),
+    "price_below": ("price", "below"),
+    "change_above": ("change", "above"),
+    "change_below": ("change", "below"),
+    "risk_above": ("risk", "above"),
+}
+KEY = np.dtype([("segment", "<i8"), ("threshold", "<f8")])
+
+
+def risk_scores(snapshot) -> np.ndarray:
+    """Risco 0-1 de cada moeda pela volatilidade recente (|24h|/10% ou |7d|/25%)"""
+    usd = snapshot.quotes["USD"]
+    return np.clip(
+        np.fmax(np.abs(usd["percent_change_24h"]) / 10, np.abs(usd["percent_change_7d"]) / 25), 0, 1
+    )
+
+
+def _keys(segments: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    keys = np.empty(len(segments), dtype=KEY)
+    keys["segment"] = segments
+    keys["threshold"] = thresholds
+    return keys
+
+
+def _expand(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Concatena os intervalos [lo, hi) em um só array de posições"""
+    lengths = np.maximum(hi - lo, 0)
+    total = int(lengths.sum())
+    starts = np.repeat(lo, lengths)
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return starts + offsets
+
+
+class AlertIndex:
+    """Alertas ativos agrupados por tipo e ordenados por (moeda/convert, limiar)"""
+
+    def __init__(self, ids, kinds, converts, symbols, thresholds, refresh):
+        ids = np.asarray(ids, dtype=np.int64)
+        kinds = np.asarray(kinds, dtype=object)
+        # Cada segmento é um par (convert, símbolo); os valores do snapshot são lidos por segmento
+        codes: dict[tuple[str, str], int] = {}
+        segments = np.fromiter(
+            (codes.setdefault(pair, len(codes)) for pair in zip(converts, symbols)),
+            dtype=np.int64,
+            count=len(ids),
+        )
+        self.vocab = list(codes)
+        self.refresh = dict(zip(ids.tolist(), np.asarray(refresh, dtype=bool).tolist()))
+        self.symbols = dict(zip(ids.tolist(), symbols))
+        self.groups = {}
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        all_segments = np.arange(len(self.vocab))
+        for kind in KINDS:
+            mask = kinds == kind
+            if not mask.any():
+                continue
+            order = np.lexsort((thresholds[mask], segments[mask]))
+            keys = _keys(segments[mask][order], thresholds[mask][order])
+            self.groups[kind] = (
+                keys,
+                ids[mask][order],
+                np.searchsorted(keys, _keys(all_segments, np.full(len(all_segments), -np.inf)), side="left"),
+                np.searchsorted(keys, _keys(all_segments, np.full(len(all_segments), np.inf)), side="right"),
+            )
+
+    def __len__(self) -> int:
+        return len(self.refresh)
+
+    def triggered(self, values: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """(ids, valores observados) dos alertas que disparam com os valores por segmento"""
+        all_ids, all_values = [], []
+        for kind, (keys, ids, seg_start, seg_end) in self.groups.items():
+            source, direction = KINDS[kind]
+            observed = values[source]
+            known = np.flatnonzero(~np.isnan(observed))
+            query = _keys(known, observed[known])
+            if direction == "above":
+                lo, hi = seg_start[known], np.searchsorted(keys, query, side="right")
+            else:
+                lo, hi = np.searchsorted(keys, query, side="left"), seg_end[known]
+            positions = _expand(lo, hi)
+            all_ids.append(ids[positions])
+            all_values.append(np.repeat(observed[known], np.maximum(hi - lo, 0)))
+        if not all_ids:
+            return np.array([], dtype=np.int64), np.array([])
+        return np.concatenate(all_ids), np.concatenate(all_values)
+
+
+_index: Optional[AlertIndex] = None
+_index_version: Optional[tuple] = None
+_lock = threading.Lock()
+
+
+def get_index() -> AlertIndex:
+    """Índice dos alertas ativos, reconstruído só quando o conjunto muda"""
+    global _index, _index_version
+    from crypto_app.models import PriceAlert
+
+    active = PriceAlert.objects.filter(active=True)
+    version = tuple(active.aggregate(n=Count("id"), last=Max("updated_at")).values())
+    with _lock:
+        if _index is None or version != _index_version:
+            rows = list(active.values_list("id", "kind", "convert", "symbol", "threshold", "refresh_analysis"))
+            ids, kinds, converts, symbols, thresholds, refresh = zip(*rows) if rows else ([],) * 6
+            thresholds = [
+                settings.RISK_THRESHOLD if t is None and k == "risk_above" else t
+                for k, t in zip(kinds, thresholds)
+            ]
+            started = time.perf_counter()
+            _index = AlertIndex(ids, kinds, converts, symbols, np.array(thresholds, dtype=np.float64), refresh)
+            _index_version = version
+            logger.info("alerts index-built alerts=%d ms=%.1f", len(_index), (time.perf_counter() - started) * 1000)
+        return _index
+
+
+def observed_values(index: AlertIndex, snapshot) -> dict[str, np.ndarray]:
+    """Preço, variação 24h e risco de cada segmento (convert, símbolo) do índice"""
+    n = len(index.vocab)
+    values = {source: np.full(n, np.nan) for source in ("price", "change", "risk")}
+    if not n or "USD" not in snapshot.quotes:
+        return values
+    rows = np.array([snapshot.row(symbol) if snapshot.row(symbol) is not None else -1 for _, symbol in index.vocab])
+    found = rows >= 0
+    converts = np.array([convert for convert, _ in index.vocab], dtype=object)
+    for convert in set(converts.tolist()):
+        mask = found & (converts == convert)
+        if mask.any() and snapshot.ensure_converts([convert]):
+            values["price"][mask] = snapshot.quotes[convert]["price"][rows[mask]]
+    values["change"][found] = snapshot.quotes["USD"]["percent_change_24h"][rows[found]]
+    values["risk"][found] = risk_scores(snapshot)[rows[found]]
+    return values
+
+
+class _ClaimConflict(Exception):
+    pass
+
+
+def _claim(values: dict[int, float], now, timestamp: int) -> list[int]:
+    """Desativa os alertas ainda ativos e grava os disparos, numa transação só.
+
+    Cada processo que atualiza o snapshot avalia os alertas (sem COORDINATION_URL
+    todos se consideram líderes). SELECT ... FOR UPDATE SKIP LOCKED deixa de fora
+    os alertas travados por outro avaliador; no SQLite, sem travas por linha, o
+    UPDATE concorrente falha com "database is locked". Se o UPDATE (só de alertas
+    ativos) não alterar todas as linhas lidas, a transação é desfeita.
+    """
+    from crypto_app.models import PriceAlert, TriggeredAlert
+
+    with transaction.atomic():
+        claimed = list(
+            PriceAlert.objects.select_for_update(skip_locked=True)
+            .filter(id__in=list(values), active=True)
+            .values_list("id", flat=True)
+        )
+        updated = PriceAlert.objects.filter(id__in=claimed, active=True).update(
+            active=False, last_triggered_at=now
+        )
+        if updated != len(claimed):
+            raise _ClaimConflict(f"{len(claimed) - updated} alertas já disparados")
+        TriggeredAlert.objects.bulk_create([
+            TriggeredAlert(alert_id=alert_id, value=values[alert_id], snapshot_timestamp=timestamp)
+            for alert_id in claimed
+        ], batch_size=1000)
+    return claimed
+
+
+def evaluate(snapshot) -> list[dict[str, Any]]:
+    """Dispara os alertas atingidos pelo snapshot: grava TriggeredAlert e desativa o alerta"""
+    global _index
+
+    index = get_index()
+    if not len(index):
+        return []
+    started = time.perf_counter()
+    ids, values = index.triggered(observed_values(index, snapshot))
+    logger.info(
+        "alerts evaluated alerts=%d triggered=%d ms=%.2f",
+        len(index), len(ids), (time.perf_counter() - started) * 1000,
+    )
+    if not len(ids):
+        return []
+
+    now = timezone.now()
+    timestamp = int(snapshot.fetched_at)
+    triggered = []
+    for start in range(0, len(ids), 5000):
+        chunk = dict(zip(ids[start:start + 5000].tolist(), values[start:start + 5000].tolist()))
+        try:
+            claimed = _claim(chunk, now, timestamp)
+        except (_ClaimConflict, OperationalError) as e:
+            # Outro processo disparou parte destes alertas agora: os que sobrarem ativos
+            # são avaliados de novo no próximo snapshot
+            logger.warning("alerts claim-conflict alerts=%d error=%r", len(chunk), e)
+            continue
+        triggered += [
+            {"alert": alert_id, "symbol": index.symbols[alert_id], "value": chunk[alert_id],
+             "refresh": index.refresh[alert_id]}
+            for alert_id in claimed
+        ]
+    with _lock:
+        _index = None
+    return triggered
+
+
+def refresh_analyses(symbols: list[str]) -> int:
+    """Refaz a análise (analyze_with_llm) só das moedas com alertas disparados"""
+    from crypto_app.governor import priority
+    from crypto_app.utils import create_analysis, get_crypto_data
+
+    saved = 0
+    # Em segundo plano: cede o orçamento da OpenAI às requisições dos usuários
+    with priority("batch"):
+        for symbol in symbols[:settings.ALERT_REFRESH_LIMIT]:
+            crypto_data = get_crypto_data(symbol)
+            if crypto_data and create_analysis(symbol, crypto_data) is not None:
+                saved += 1
+    logger.info("alerts analyses-refreshed symbols=%d", saved)
+    return saved
+
+
+def evaluate_snapshot(snapshot, refresh: bool = True) -> list[dict[str, Any]]:
+    """Avalia os alertas e, em segundo plano, refaz as análises das moedas afetadas"""
+    triggered = evaluate(snapshot)
+    symbols = list(dict.fromkeys(t["symbol"] for t in triggered if t["refresh"]))
+    if refresh and symbols:
+        threading.Thread(target=refresh_analyses, args=(symbols,), daemon=True).start()
+    return triggered
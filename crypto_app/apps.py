@@ -1,6 +1,26 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CryptoAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crypto_app'
+
+    def ready(self):
+        # Registra os receptores de post_save/post_delete das análises: invalidação
+        # dos fragmentos HTML e atualização do índice de análises anteriores
+        from crypto_app import fragments, history  # noqa: F401
+
+        if not settings.CRYPTO_WARMUP:
+            return
+        # No runserver com autoreload só o processo filho atende requisições
+        if "runserver" in sys.argv and os.environ.get("RUN_MAIN") != "true":
+            return
+
+        from crypto_app.warmup import warmup
+
+        threading.Thread(target=warmup, name="crypto-warmup", daemon=True).start()
@@ -0,0 +1,184 @@
+"""Backtest das recomendações gravadas em CryptoAnalysis contra o histórico de preços.
+
+Cada análise é associada (pandas.merge_asof, por símbolo) ao preço no momento
+da análise e ao preço `horizon` dias depois no PriceSample. Todo o cálculo
+(acertos, calibração da confiança, erro das previsões) é feito em colunas,
+sem laços por linha, para reavaliar milhões de análises após cada mudança de
+prompt.
+"""
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+DAY = 86400
+# Horizonte de cada previsão de price_prediction, em dias
+HORIZONS = {"3_months": 90, "6_months": 180, "1_year": 365}
+DIRECTIONS = {"comprar": 1, "buy": 1, "segurar": 0, "hold": 0, "vender": -1, "sell": -1}
+# Distância máxima entre a análise (ou o alvo) e a amostra de preço usada
+ENTRY_TOLERANCE = DAY
+EXIT_TOLERANCE = 3 * DAY
+
+
+def _percent(values: pd.Series) -> pd.Series:
+    """'12.5%' / 12.5 / None -> 12.5 / NaN"""
+    return pd.to_numeric(values.astype("string").str.rstrip("%").str.strip(), errors="coerce")
+
+
+def load_analyses() -> pd.DataFrame:
+    from crypto_app.models import CryptoAnalysis
+
+    rows = CryptoAnalysis.objects.values_list(
+        "symbol", "analysis_date", "recommendation", "confidence", "price_prediction"
+    )
+    df = pd.DataFrame.from_records(
+        rows, columns=["symbol", "analysis_date", "recommendation", "confidence", "price_prediction"]
+    )
+    df["ts"] = pd.to_datetime(df.pop("analysis_date"), utc=True).astype("int64") // 10**9
+    predictions = pd.json_normalize(df.pop("price_prediction").where(lambda s: s.notna(), {}).tolist())
+    for name in HORIZONS:
+        df[name] = _percent(predictions[name]) if name in predictions else np.nan
+    df["symbol"] = df["symbol"].str.upper()
+    return df
+
+
+def load_prices(convert: str, symbols: Optional[list[str]] = None) -> pd.DataFrame:
+    from crypto_app.models import PriceSample
+
+    samples = PriceSample.objects.filter(convert=convert)
+    if symbols is not None:
+        samples = samples.filter(symbol__in=symbols)
+    rows = samples.values_list("symbol", "timestamp", "price")
+    return pd.DataFrame.from_records(rows, columns=["symbol", "ts", "price"])
+
+
+def synthetic(analyses: int, symbols: int = 200, days: int = 3 * 365, seed: int = 0):
+    """Análises e preços aleatórios (passeio aleatório diário) para medir o desempenho"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"S{i:04d}" for i in range(symbols)])
+    start = 1_600_000_000
+    ts = start + np.arange(days) * DAY
+    log_returns = rng.normal(0, 0.04, size=(symbols, days))
+    prices = pd.DataFrame({
+        "symbol": np.repeat(names, days),
+        "ts": np.tile(ts, symbols),
+        "price": (100 * np.exp(np.cumsum(log_returns, axis=1))).ravel(),
+    })
+    df = pd.DataFrame({
+        "symbol": names[rng.integers(0, symbols, analyses)],
+        "recommendation": np.array(["comprar", "segurar", "vender"])[rng.integers(0, 3, analyses)],
+        "confidence": rng.uniform(0, 1, analyses),
+        "ts": start + rng.integers(0, (days - 30) * DAY, analyses),
+    })
+    for name in HORIZONS:
+        df[name] = rng.normal(0, 30, analyses)
+    return df, prices
+
+
+def _price_at(df: pd.DataFrame, prices: pd.DataFrame, ts: np.ndarray, direction: str, tolerance: int) -> np.ndarray:
+    """Preço de cada linha de `df` no instante `ts` (NaN se não houver amostra próxima).
+
+    `df` já vem ordenado por ts; os alvos (ts + constante) mantêm a mesma
+    ordem, e só as colunas da junção passam pelo merge_asof.
+    """
+    left = pd.DataFrame({"sid": df["sid"].to_numpy(), "ts": ts})
+    merged = pd.merge_asof(left, prices, on="ts", by="sid", direction=direction, tolerance=tolerance)
+    return merged["price"].to_numpy()
+
+
+def _directions(recommendation: pd.Series) -> np.ndarray:
+    # Poucos valores distintos: mapeia os únicos e expande pelos códigos
+    codes, uniques = pd.factorize(recommendation)
+    lookup = np.array([DIRECTIONS.get(str(u).lower(), np.nan) for u in uniques] + [np.nan])
+    return lookup[codes]
+
+
+def score(
+    analyses: pd.DataFrame,
+    prices: pd.DataFrame,
+    horizon_days: int = 30,
+    hold_band: float = 0.05,
+    bins: int = 10,
+) -> dict[str, Any]:
+    """Acertos, calibração e erro de previsão das análises.
+
+    Uma recomendação acerta quando o retorno em `horizon_days` confirma a
+    direção: comprar > +hold_band, vender < -hold_band, segurar dentro da faixa.
+    """
+    # Símbolos como inteiros: o merge_asof agrupa bem mais rápido que por texto
+    codes, _ = pd.factorize(pd.concat([analyses["symbol"], prices["symbol"]], ignore_index=True))
+    prices = pd.DataFrame({
+        "sid": codes[len(analyses):],
+        "ts": prices["ts"].to_numpy(dtype=np.int64),
+        "price": prices["price"].to_numpy(dtype=np.float64),
+    }).sort_values("ts", kind="stable")
+    df = analyses.assign(sid=codes[:len(analyses)], ts=analyses["ts"].astype("int64"))
+    df = df.sort_values("ts", kind="stable", ignore_index=True)
+    ts = df["ts"].to_numpy()
+    entry = _price_at(df, prices, ts, "backward", ENTRY_TOLERANCE)
+    exit_ = _price_at(df, prices, ts + horizon_days * DAY, "forward", EXIT_TOLERANCE)
+
+    direction = _directions(df["recommendation"])
+    ret = exit_ / entry - 1
+    valid = ~np.isnan(ret) & ~np.isnan(direction)
+    hit = np.select(
+        [direction == 1, direction == -1, direction == 0],
+        [ret > hold_band, ret < -hold_band, np.abs(ret) <= hold_band],
+        default=False,
+    )
+
+    v_hit = hit[valid].astype(np.float64)
+    v_dir = direction[valid].astype(np.int64)
+    confidence = np.clip(df["confidence"].to_numpy(dtype=np.float64)[valid], 0, 1)
+    n = int(valid.sum())
+
+    by_direction = {}
+    counts = np.bincount(v_dir + 1, minlength=3)
+    hits = np.bincount(v_dir + 1, weights=v_hit, minlength=3)
+    for label, index in (("vender", 0), ("segurar", 1), ("comprar", 2)):
+        by_direction[label] = {
+            "n": int(counts[index]),
+            "hit_rate": float(hits[index] / counts[index]) if counts[index] else None,
+        }
+
+    # Calibração: confiança média x taxa de acerto por faixa de confiança
+    bucket = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    bucket_n = np.bincount(bucket, minlength=bins)
+    bucket_conf = np.bincount(bucket, weights=confidence, minlength=bins)
+    bucket_hits = np.bincount(bucket, weights=v_hit, minlength=bins)
+    nonzero = bucket_n > 0
+    mean_conf = np.divide(bucket_conf, bucket_n, out=np.zeros(bins), where=nonzero)
+    hit_rate = np.divide(bucket_hits, bucket_n, out=np.zeros(bins), where=nonzero)
+    calibration = [
+        {"bin": f"{i / bins:.1f}-{(i + 1) / bins:.1f}", "n": int(bucket_n[i]),
+         "confidence": float(mean_conf[i]), "hit_rate": float(hit_rate[i])}
+        for i in np.flatnonzero(nonzero)
+    ]
+
+    predictions = {}
+    for name, days in HORIZONS.items():
+        realized = (_price_at(df, prices, ts + days * DAY, "forward", EXIT_TOLERANCE) / entry - 1) * 100
+        predicted = df[name].to_numpy(dtype=np.float64)
+        ok = ~np.isnan(realized) & ~np.isnan(predicted)
+        error = predicted[ok] - realized[ok]
+        predictions[name] = {
+            "n": int(ok.sum()),
+            "mae": float(np.abs(error).mean()) if ok.any() else None,
+            "rmse": float(np.sqrt((error ** 2).mean())) if ok.any() else None,
+            "bias": float(error.mean()) if ok.any() else None,
+            "direction_accuracy": (
+                float((np.sign(predicted[ok]) == np.sign(realized[ok])).mean()) if ok.any() else None
+            ),
+        }
+
+    return {
+        "analyses": len(df),
+        "scored": n,
+        "horizon_days": horizon_days,
+        "hit_rate": float(v_hit.mean()) if n else None,
+        "by_recommendation": by_direction,
+        "brier": float(((confidence - v_hit) ** 2).mean()) if n else None,
+        "ece": float((bucket_n[nonzero] / n * np.abs(mean_conf - hit_rate)[nonzero]).sum()) if n else None,
+        "calibration": calibration,
+        "predictions": predictions,
+    }
@@ -0,0 +1,124 @@
+import random
+import time
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+
+# Janela de cada range e resolução padrão (tamanho do bucket em segundos)
+RANGES = {
+    "1d": (timedelta(days=1), 300),
+    "7d": (timedelta(days=7), 3600),
+    "30d": (timedelta(days=30), 86400),
+    "1y": (timedelta(days=365), 86400),
+    "all": (None, 86400),
+}
+RESOLUTIONS = {"5m": 300, "1h": 3600, "1d": 86400}
+DEFAULT_POINTS = 200
+MAX_POINTS = 1000
+
+
+def lttb(t: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: índices dos pontos que preservam a forma da série"""
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Média do próximo bucket como terceiro vértice do triângulo
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_t = t[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        bucket_t, bucket_y = t[start:end], y[start:end]
+        area = np.abs(
+            (t[a] - avg_t) * (bucket_y - y[a]) - (t[a] - bucket_t) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def bucketize(t: np.ndarray, y: np.ndarray, resolution: int) -> tuple[np.ndarray, np.ndarray]:
+    """Último preço de cada bucket de `resolution` segundos (t em ordem crescente)"""
+    if len(t) == 0:
+        return t, y
+    buckets = t // resolution
+    last = np.flatnonzero(np.append(buckets[1:] != buckets[:-1], True))
+    return buckets[last] * resolution, y[last]
+
+
+def stored_series(symbol: str, convert: str, since: Optional[float]) -> tuple[np.ndarray, np.ndarray]:
+    from crypto_app.models import PriceSample
+
+    samples = PriceSample.objects.filter(symbol=symbol, convert=convert)
+    if since is not None:
+        samples = samples.filter(timestamp__gte=since)
+    rows = list(samples.order_by("timestamp").values_list("timestamp", "price"))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+def simulated_series(symbol: str, price: float, window: timedelta, resolution: int):
+    """Série simulada (±5% por dia) ancorada no preço atual, usada enquanto não há histórico.
+
+    A semente depende do símbolo e do dia, então a série é estável entre
+    requisições e o ETag continua válido até a virada do dia.
+    """
+    now = int(time.time()) // resolution * resolution
+    steps = max(int(window.total_seconds()) // resolution, 2)
+    rng = random.Random(f"{symbol}:{now // 86400}:{resolution}")
+    scale = 0.05 * (resolution / 86400) ** 0.5
+    prices = [price]
+    for _ in range(steps - 1):
+        prices.append(round(prices[-1] * (1 + rng.uniform(-scale, scale)), 2))
+    t = np.arange(now - (steps - 1) * resolution, now + 1, resolution, dtype=np.int64)
+    return t, np.array(prices[::-1])
+
+
+def build_series(symbol: str, current_price: Optional[float], convert: str, range_: str,
+                 resolution: int, points: int) -> dict:
+    window, _ = RANGES[range_]
+    since = time.time() - window.total_seconds() if window is not None else None
+    t, y = stored_series(symbol, convert, since)
+    t, y = bucketize(t, y, resolution)
+    simulated = len(t) < 2
+    if simulated:
+        if current_price is None:
+            return {"t": [], "p": [], "simulated": True}
+        t, y = simulated_series(symbol, current_price, window or timedelta(days=365), resolution)
+    keep = lttb(t.astype(np.float64), y, points)
+    return {
+        "t": t[keep].tolist(),
+        "p": np.round(y[keep], 8).tolist(),
+        "simulated": simulated,
+    }
+
+
+def record_samples(snapshot, limit: int) -> int:
+    """Grava o preço atual das `limit` primeiras moedas do snapshot no histórico local"""
+    from crypto_app.models import PriceSample
+
+    rows = snapshot.select({"limit": limit})
+    timestamp = int(snapshot.fetched_at)
+    samples = [
+        PriceSample(
+            symbol=snapshot.meta[row]["symbol"],
+            convert=convert,
+            timestamp=timestamp,
+            price=float(snapshot.quotes[convert]["price"][row]),
+        )
+        for convert in snapshot.converts
+        for row in rows
+        if not np.isnan(snapshot.quotes[convert]["price"][row])
+    ]
+    PriceSample.objects.bulk_create(samples)
+    return len(samples)
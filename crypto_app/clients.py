@@ -0,0 +1,115 @@
+"""Clientes HTTP e OpenAI compartilhados pelo processo.
+
+Os módulos pesados (httpx, openai) só são importados no primeiro uso, e as
+conexões ficam em pool entre as requisições em vez de abertas a cada chamada.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from crypto_app import ledger
+
+_lock = threading.Lock()
+_http_client = None
+_openai_clients = {}
+# Transporte alternativo (ex.: httpx.MockTransport no replay de tráfego)
+_transport = None
+
+# Chamadas externas feitas durante a requisição atual, por host
+_upstream_calls: ContextVar[Optional[Counter]] = ContextVar("upstream_calls", default=None)
+# Linha do tempo das chamadas externas (perfil da requisição), se ativa
+_upstream_timeline: ContextVar[Optional[list]] = ContextVar("upstream_timeline", default=None)
+
+
+def _record_upstream_call(request) -> None:
+    calls = _upstream_calls.get()
+    if calls is not None:
+        calls[request.url.host] += 1
+    if _upstream_timeline.get() is not None:
+        request.extensions["crypto_started"] = time.perf_counter()
+    ledger.on_request(request)
+
+
+def _record_upstream_response(response) -> None:
+    ledger.on_response(response)
+    timeline = _upstream_timeline.get()
+    started = response.request.extensions.get("crypto_started")
+    if timeline is None or started is None:
+        return
+    # Até os cabeçalhos: o corpo das respostas lidas em streaming fica no perfil
+    timeline.append({
+        "host": response.request.url.host,
+        "method": response.request.method,
+        "path": response.request.url.path,
+        "status": response.status_code,
+        "start": started,
+        "end": time.perf_counter(),
+    })
+
+
+@contextmanager
+def count_upstream_calls():
+    """Conta as chamadas aos serviços externos feitas dentro do bloco"""
+    calls = Counter()
+    token = _upstream_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _upstream_calls.reset(token)
+
+
+@contextmanager
+def record_upstream_calls():
+    """Registra início, fim e status de cada chamada externa feita dentro do bloco"""
+    timeline = []
+    token = _upstream_timeline.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _upstream_timeline.reset(token)
+
+
+def use_transport(transport) -> None:
+    """Troca o transporte de todos os clientes (os já criados são descartados)"""
+    global _http_client, _transport
+    with _lock:
+        _transport = transport
+        _http_client = None
+        _openai_clients.clear()
+
+
+def http_client():
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                import httpx
+
+                _http_client = httpx.Client(
+                    timeout=30.0,
+                    transport=_transport,
+                    event_hooks={"request": [_record_upstream_call], "response": [_record_upstream_response]},
+                )
+    return _http_client
+
+
+def openai_client(api_key: str):
+    client = _openai_clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                from openai import DefaultHttpxClient, OpenAI
+
+                client = OpenAI(
+                    api_key=api_key,
+                    http_client=DefaultHttpxClient(
+                        transport=_transport,
+                        event_hooks={"request": [_record_upstream_call], "response": [_record_upstream_response]},
+                    ),
+                )
+                _openai_clients[api_key] = client
+    return client
@@ -0,0 +1,498 @@
+"""Coordenação entre nós: cache compartilhado, locks distribuídos e eleição de líder.
+
+COORDINATION_URL (redis://[:senha@]host:porta/db) aponta para qualquer servidor
+que fale o protocolo do Redis (Redis, Valkey, KeyDB...); o cliente abaixo usa
+só GET/SET/DEL/EVAL e não depende de biblioteca externa. Sem URL, o
+LocalBackend cumpre o mesmo contrato em memória: um nó só, ou testes.
+
+Se o servidor ficar indisponível, as operações voltam ao comportamento de um
+nó isolado (calcula localmente, segue sem lock, assume a liderança) e o erro
+é registrado, em vez de derrubar as requisições.
+"""
+import json
+import logging
+import os
+import pickle
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from crypto_app import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Apaga / renova a chave só se ela ainda guarda o valor (dono) informado
+DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+EXPIRE_IF = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+# Depois de uma falha de conexão, segundos até tentar o servidor de novo
+RETRY_SECONDS = 5
+# Intervalo entre as varreduras das chaves vencidas do LocalBackend
+PURGE_SECONDS = 60
+
+# Token buckets (ver take): consome de todos os baldes ou de nenhum; devolve a
+# espera em segundos até haver saldo. Estado "saldo:instante", no relógio do servidor.
+TAKE = """
+local t = redis.call('time')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local force = ARGV[1] == '1'
+local balance, wait = {}, 0
+for i = 1, #KEYS do
+  local need, cap, rate, reserve = tonumber(ARGV[i*4-2]), tonumber(ARGV[i*4-1]), tonumber(ARGV[i*4]), tonumber(ARGV[i*4+1])
+  local tokens = cap
+  local v = redis.call('get', KEYS[i])
+  if v then
+    local sep = string.find(v, ':', 1, true)
+    tokens = math.min(cap, tonumber(string.sub(v, 1, sep - 1)) + (now - tonumber(string.sub(v, sep + 1))) * rate)
+  end
+  balance[i] = tokens - need
+  if need + reserve > tokens then wait = math.max(wait, (need + reserve - tokens) / rate) end
+end
+if wait == 0 or force then
+  for i = 1, #KEYS do
+    local cap, rate = tonumber(ARGV[i*4-1]), tonumber(ARGV[i*4])
+    redis.call('set', KEYS[i], balance[i] .. ':' .. now, 'PX', math.ceil(cap / rate * 1000) + 1000)
+  end
+  wait = 0
+end
+return tostring(wait)
+"""
+
+
+class CoordinationError(Exception):
+    pass
+
+
+def node_id() -> str:
+    # Calculado a cada uso: workers criados por fork têm pids diferentes
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalBackend:
+    """Mesmo contrato do RedisBackend, em memória e restrito ao processo"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.monotonic() + PURGE_SECONDS
+
+    def _purge(self, now: float) -> None:
+        # Chaves como analysis:question:<sha1> raramente são lidas de novo: sem a
+        # varredura, as vencidas (listagens de vários MB) ficariam na memória
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_SECONDS
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        if expired:
+            logger.info("coordination local-purge expired=%d keys=%d", len(expired), len(self._data))
+
+    def _get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, only_if_missing: bool = False) -> bool:
+        with self._lock:
+            self._purge(time.monotonic())
+            if only_if_missing and self._get(key) is not None:
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        with self._lock:
+            if self._get(key) != value:
+                return False
+            del self._data[key]
+            return True
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def expire_if(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._get(key) != value:
+                return False
+            self._data[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def take(self, buckets: list[tuple[str, float, float, float, float]], force: bool = False) -> float:
+        with self._lock:
+            now = time.monotonic()
+            balance, wait = [], 0.0
+            for key, need, capacity, rate, reserve in buckets:
+                raw = self._get(key)
+                tokens = capacity
+                if raw is not None:
+                    saved, at = raw.split(b":")
+                    tokens = min(capacity, float(saved) + (now - float(at)) * rate)
+                balance.append(tokens - need)
+                if need + reserve > tokens:
+                    wait = max(wait, (need + reserve - tokens) / rate)
+            if wait and not force:
+                return wait
+            for (key, _, capacity, rate, _), tokens in zip(buckets, balance):
+                self._data[key] = (f"{tokens}:{now}".encode(), now + capacity / rate + 1)
+            return 0.0
+
+
+class RedisBackend:
+    """Cliente mínimo do protocolo RESP, uma conexão por thread"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.password = unquote(parts.password) if parts.password else None
+        self.timeout = timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.file = sock, sock.makefile("rb")
+        if self.password:
+            self._command("AUTH", self.password)
+        if self.db:
+            self._command("SELECT", self.db)
+
+    def _read(self):
+        line = self._local.file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("conexão encerrada pelo servidor")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise CoordinationError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self._local.file.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"resposta inválida: {line[:20]!r}")
+
+    def _command(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts += [f"${len(data)}\r\n".encode(), data, b"\r\n"]
+        self._local.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def execute(self, *args):
+        if time.monotonic() < self._down_until:
+            # Falhou há pouco: não paga o timeout de conexão em toda operação
+            raise CoordinationError(f"{self.host}:{self.port}: indisponível")
+        try:
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            return self._command(*args)
+        except (OSError, ValueError) as e:
+            self.close()
+            self._down_until = time.monotonic() + RETRY_SECONDS
+            raise CoordinationError(f"{self.host}:{self.port}: {e}") from e
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = self._local.file = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, only_if_missing: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl is not None:
+            args += ["PX", max(int(ttl * 1000), 1)]
+        if only_if_missing:
+            args.append("NX")
+        return self.execute(*args) is not None
+
+    def delete(self, key: str) -> bool:
+        return self.execute("DEL", key) > 0
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        return self.execute("EVAL", DELETE_IF, 1, key, value) > 0
+
+    def delete_prefix(self, prefix: str) -> int:
+        # SCAN em lotes em vez de KEYS: não trava o servidor com muitas chaves
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", prefix) + "*"
+        deleted, cursor = 0, b"0"
+        while True:
+            cursor, keys = self.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 1000)
+            if keys:
+                deleted += self.execute("DEL", *keys)
+            if cursor == b"0":
+                return deleted
+
+    def expire_if(self, key: str, value: bytes, ttl: float) -> bool:
+        return self.execute("EVAL", EXPIRE_IF, 1, key, value, max(int(ttl * 1000), 1)) > 0
+
+    def take(self, buckets: list[tuple[str, float, float, float, float]], force: bool = False) -> float:
+        keys = [bucket[0] for bucket in buckets]
+        args = [value for bucket in buckets for value in bucket[1:]]
+        return float(self.execute("EVAL", TAKE, len(keys), *keys, "1" if force else "0", *args))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = settings.COORDINATION_URL
+                _backend = RedisBackend(url) if url else LocalBackend()
+    return _backend
+
+
+def _key(name: str) -> str:
+    return f"{settings.COORDINATION_PREFIX}:{name}"
+
+
+class Lock:
+    """Lock distribuído com prazo: expira sozinho se o dono morrer no meio"""
+
+    def __init__(self, name: str, ttl: float = 60):
+        self.key = _key(f"lock:{name}")
+        self.ttl = ttl
+        self.token = f"{node_id()}:{threading.get_ident()}:{time.time_ns()}".encode()
+        self.acquired = False
+
+    def acquire(self, timeout: float = 0) -> bool:
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                self.acquired = get_backend().set(self.key, self.token, self.ttl, only_if_missing=True)
+            except CoordinationError as e:
+                logger.error("coordination lock-failed key=%s error=%s", self.key, e)
+                self.acquired = True
+            if self.acquired or time.monotonic() >= deadline:
+                return self.acquired
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 0.5)
+
+    def release(self) -> None:
+        if not self.acquired:
+            return
+        self.acquired = False
+        try:
+            get_backend().delete_if(self.key, self.token)
+        except CoordinationError as e:
+            logger.error("coordination unlock-failed key=%s error=%s", self.key, e)
+
+    def renew(self) -> bool:
+        """Estende o prazo por mais `ttl`; False se o lock já expirou (e pode ter outro dono)"""
+        try:
+            return get_backend().expire_if(self.key, self.token, self.ttl)
+        except CoordinationError as e:
+            logger.error("coordination renew-failed key=%s error=%s", self.key, e)
+            return True
+
+    @contextmanager
+    def renewing(self):
+        """Renova o prazo a cada ttl/3 enquanto o bloco roda, para trabalhos mais longos que o prazo"""
+        done = threading.Event()
+
+        def run():
+            while not done.wait(self.ttl / 3):
+                if not self.renew():
+                    logger.warning("coordination lock-lost key=%s", self.key)
+                    return
+
+        renewer = threading.Thread(target=run, name="crypto-lock-renew", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            done.set()
+            renewer.join()
+
+    def __enter__(self):
+        self.acquire(self.ttl)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _get_json(key: str) -> tuple[bool, Any]:
+    try:
+        raw = get_backend().get(key)
+    except CoordinationError as e:
+        logger.error("coordination get-failed key=%s error=%s", key, e)
+        return False, None
+    return (False, None) if raw is None else (True, json.loads(raw))
+
+
+def _set_json(key: str, value: Any, ttl: float) -> None:
+    try:
+        get_backend().set(key, json.dumps(value, separators=(",", ":")).encode(), ttl)
+    except CoordinationError as e:
+        logger.error("coordination set-failed key=%s error=%s", key, e)
+
+
+def single_flight(
+    name: str, compute: Callable[[], Any], ttl: float, wait: float = 60, lease: float = 60
+) -> Any:
+    """Resultado de `compute` compartilhado por todos os nós durante `ttl` segundos.
+
+    Só um nó (e uma thread) calcula por vez; os demais esperam até `wait`
+    segundos pelo resultado gravado. O lock de quem calcula dura `lease`
+    segundos e é renovado enquanto `compute` roda: se o nó morrer, outro
+    assume depois de no máximo `lease`. Resultados None e exceções não ficam
+    em cache. O valor precisa ser serializável em JSON.
+    """
+    key = _key(f"cache:{name}")
+    found, value = _get_json(key)
+    if found:
+        metrics.incr("coordination.cache_hit")
+        return value
+
+    started = time.monotonic()
+    delay = 0.05
+    while True:
+        lock = Lock(f"cache:{name}", ttl=lease)
+        if lock.acquire():
+            try:
+                # Outro nó pode ter terminado entre a leitura e o lock
+                found, value = _get_json(key)
+                if found:
+                    metrics.incr("coordination.cache_hit")
+                    return value
+                metrics.incr("coordination.cache_miss")
+                with lock.renewing():
+                    value = compute()
+                if value is not None:
+                    _set_json(key, value, ttl)
+                return value
+            finally:
+                lock.release()
+
+        if time.monotonic() - started >= wait:
+            logger.warning("coordination single-flight-timeout name=%s", name)
+            metrics.incr("coordination.cache_miss")
+            return compute()
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        found, value = _get_json(key)
+        if found:
+            metrics.incr("coordination.cache_shared")
+            metrics.incr("coordination.wait_seconds", time.monotonic() - started)
+            return value
+
+
+def take(buckets: list[tuple[str, float, float, float, float]], force: bool = False) -> float:
+    """Consome `need` de cada token bucket (nome, need, capacidade, taxa/s, reserva).
+
+    Consome de todos ou de nenhum: devolve 0 quando consumiu, senão os segundos
+    até que todos tenham saldo para `need` mantendo `reserva` livre. Com
+    `force`, consome mesmo sem saldo (o saldo fica negativo; `need` negativo
+    devolve tokens).
+    """
+    buckets = [(_key(f"bucket:{name}"), *rest) for name, *rest in buckets]
+    return get_backend().take(buckets, force)
+
+
+def is_leader(name: str, ttl: float) -> bool:
+    """Assume ou renova a liderança de `name` por `ttl` segundos.
+
+    Quem chama deve repetir a chamada antes de `ttl` vencer; se o líder parar,
+    outro nó assume na primeira chamada após o prazo.
+    """
+    key = _key(f"leader:{name}")
+    me = node_id().encode()
+    try:
+        backend = get_backend()
+        if backend.set(key, me, ttl, only_if_missing=True):
+            logger.info("coordination leader-acquired name=%s node=%s", name, me.decode())
+            return True
+        return backend.expire_if(key, me, ttl)
+    except CoordinationError as e:
+        logger.error("coordination leader-failed name=%s error=%s", name, e)
+        return True
+
+
+class CoordinationCache(BaseCache):
+    """Cache do Django sobre o backend de coordenação (CACHES quando há COORDINATION_URL)"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+
+    def _ttl(self, timeout) -> Optional[float]:
+        # get_backend_timeout devolve o instante de expiração; o backend quer a duração
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(timeout, 0.001)
+
+    def _call(self, method: str, *args, default=None):
+        try:
+            return getattr(get_backend(), method)(*args)
+        except CoordinationError as e:
+            logger.error("coordination cache-%s-failed error=%s", method, e)
+            return default
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._call("set", key, pickle.dumps(value), self._ttl(timeout), True, default=False)
+
+    def get(self, key, default=None, version=None):
+        raw = self._call("get", self.make_and_validate_key(key, version=version))
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._call("set", key, pickle.dumps(value), self._ttl(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw = self._call("get", key)
+        return raw is not None and bool(self._call("set", key, raw, self._ttl(timeout)))
+
+    def delete(self, key, version=None):
+        return bool(self._call("delete", self.make_and_validate_key(key, version=version), default=False))
+
+    def clear(self):
+        """Apaga tudo sob COORDINATION_PREFIX: o cache e também locks, baldes e liderança"""
+        deleted = self._call("delete_prefix", _key(""), default=0)
+        logger.info("coordination cache-cleared keys=%d", deleted)
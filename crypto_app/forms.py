@@ -1,7 +1,31 @@
 from django import forms
 
+from .models import PriceAlert
+
 class CryptoAnalysisForm(forms.Form):
     symbol = forms.CharField(
         max_length=256,
         widget=forms.TextInput(attrs={'class': 'prompt-box'})
-    )
\ No newline at end of file
+    )
+
+
+class PriceAlertForm(forms.ModelForm):
+    class Meta:
+        model = PriceAlert
+        fields = ['symbol', 'convert', 'kind', 'threshold', 'refresh_analysis']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['convert'].required = False
+
+    def clean_symbol(self):
+        return self.cleaned_data['symbol'].strip().upper()
+
+    def clean_convert(self):
+        return (self.cleaned_data.get('convert') or 'BRL').strip().upper()
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('threshold') is None and cleaned.get('kind') != 'risk_above':
+            self.add_error('threshold', 'Informe o limiar do alerta.')
+        return cleaned
@@ -0,0 +1,161 @@
+"""Cache dos fragmentos HTML renderizados das análises.
+
+O analysis_summary vem do LLM (dezenas de KB de HTML) e antes era
+re-renderizado a cada visualização, com |safe. Aqui ele é sanitizado uma vez
+(lista de tags e atributos permitidos, sem scripts nem estilos), comprimido
+com gzip e guardado no cache; a página do link permanente
+(/analysis/<id>/) também, junto com o ETag.
+
+A página mostra se há uma análise mais nova da mesma moeda, então depende de
+todas as análises do símbolo: as chaves levam uma versão por símbolo, trocada
+quando uma análise do símbolo é gravada ou apagada (post_save/post_delete).
+"""
+import gzip
+import hashlib
+import time
+from html import escape
+from html.parser import HTMLParser
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from crypto_app import metrics
+
+ALLOWED_TAGS = {
+    "a", "b", "blockquote", "br", "code", "em", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i",
+    "li", "ol", "p", "pre", "small", "span", "strong", "sub", "sup", "table", "tbody", "td",
+    "th", "thead", "tr", "u", "ul",
+}
+ALLOWED_ATTRS = {
+    "a": {"href", "title"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan", "scope"},
+}
+# Removidas junto com o conteúdo
+DROP_CONTENT = {"script", "style", "iframe", "object", "embed", "template", "noscript", "svg", "math"}
+VOID_TAGS = {"br", "hr"}
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: list[str] = []
+        self.open: list[str] = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT:
+            self.skip += 1
+            return
+        if self.skip or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if value is None or name not in ALLOWED_ATTRS.get(tag, ()):
+                continue
+            if name == "href" and not value.strip().lower().startswith(("http://", "https://")):
+                continue
+            kept.append(f' {name}="{escape(value)}"')
+        if tag == "a":
+            kept.append(' rel="noopener nofollow" target="_blank"')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <p/>...: abre e fecha em seguida
+        if self.skip or tag not in ALLOWED_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT:
+            self.skip = max(self.skip - 1, 0)
+            return
+        if self.skip or tag not in self.open:
+            return
+        # Fecha também o que o LLM deixou aberto dentro da tag
+        while self.open:
+            opened = self.open.pop()
+            self.out.append(f"</{opened}>")
+            if opened == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.out.append(escape(data, quote=False))
+
+    def result(self) -> str:
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self.open))
+
+
+def sanitize(html: str) -> str:
+    """HTML do LLM reduzido às tags e atributos permitidos"""
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html or "")
+    return sanitizer.result()
+
+
+def _version(symbol: str) -> int:
+    return cache.get_or_set(f"fragment:version:{symbol}", time.time_ns, None)
+
+
+def summary_html(analysis) -> str:
+    """analysis_summary sanitizado, do cache quando possível"""
+    key = f"fragment:summary:{analysis.id}"
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr("fragment.summary.hit")
+        return gzip.decompress(cached).decode()
+    metrics.incr("fragment.summary.miss")
+    html = sanitize(analysis.analysis_summary)
+    cache.set(key, gzip.compress(html.encode()), settings.FRAGMENT_CACHE_SECONDS)
+    return html
+
+
+def page(analysis_id: int) -> Optional[tuple[str, bytes]]:
+    """(ETag, HTML com gzip) do link permanente da análise, ou None se ela não existir"""
+    from django.template.loader import render_to_string
+    from crypto_app.models import CryptoAnalysis
+
+    key = f"fragment:page:{analysis_id}"
+    cached = cache.get(key)
+    if cached is not None:
+        symbol, version, etag, body = cached
+        if _version(symbol) == version:
+            metrics.incr("fragment.page.hit")
+            return etag, body
+    metrics.incr("fragment.page.miss")
+
+    analysis = CryptoAnalysis.objects.filter(id=analysis_id).first()
+    if analysis is None:
+        return None
+    # Versão lida antes de renderizar: uma análise gravada no meio invalida esta página
+    version = _version(analysis.symbol)
+    newer = (
+        CryptoAnalysis.objects.filter(symbol=analysis.symbol, id__gt=analysis.id)
+        .order_by("-id").values_list("id", flat=True).first()
+    )
+    html = render_to_string("crypto_app/analysis_detail.html", {
+        "analysis": analysis,
+        "summary": summary_html(analysis),
+        "newer_id": newer,
+    })
+    etag = 'W/"%s"' % hashlib.sha1(html.encode()).hexdigest()[:20]
+    body = gzip.compress(html.encode())
+    cache.set(key, (analysis.symbol, version, etag, body), settings.FRAGMENT_CACHE_SECONDS)
+    return etag, body
+
+
+@receiver(post_save, sender="crypto_app.CryptoAnalysis")
+@receiver(post_delete, sender="crypto_app.CryptoAnalysis")
+def invalidate(sender, instance, **kwargs):
+    """Nova versão das páginas do símbolo; o resumo da própria análise é refeito"""
+    cache.set(f"fragment:version:{instance.symbol}", time.time_ns(), None)
+    cache.delete(f"fragment:summary:{instance.id}")
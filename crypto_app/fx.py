@@ -0,0 +1,184 @@
+"""Conversão local de cotações entre moedas.
+
+Cada moeda extra no `convert` do CoinMarketCap custa outra vez o preço da
+chamada (na listagem, 1 crédito a cada 200 moedas, por moeda). As cotações
+são buscadas só na moeda base (USD) e as demais são calculadas aqui: moedas
+fiat pela tabela de câmbio (FX_RATES_URL, atualizada a cada FX_RATES_TTL
+segundos) e criptomoedas pelo próprio preço em USD do snapshot.
+
+Os campos monetários são multiplicados pela taxa e a dominância é mantida.
+Nas criptomoedas, as variações percentuais descontam a variação da própria
+moeda de conversão no mesmo período, como na API; nas moedas fiat elas são
+mantidas como na base (a variação do câmbio no período não é considerada).
+"""
+import logging
+import math
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+
+from crypto_app.clients import http_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = "USD"
+MONETARY_FIELDS = frozenset({
+    "price",
+    "volume_24h",
+    "volume_7d",
+    "volume_30d",
+    "market_cap",
+    "fully_diluted_market_cap",
+})
+# Variação percentual -> variação em USD da moeda de conversão no mesmo período
+PERCENT_FIELDS = {
+    "percent_change_1h": "percent_change_1h",
+    "percent_change_24h": "percent_change_24h",
+    "percent_change_7d": "percent_change_7d",
+    "percent_change_30d": "percent_change_30d",
+    "percent_change_60d": "percent_change_60d",
+    "percent_change_90d": "percent_change_90d",
+    "volume_change_24h": "percent_change_24h",
+}
+# Espera mínima entre tentativas quando a tabela de câmbio não pôde ser baixada
+RETRY_SECONDS = 60
+
+_rates: dict[str, float] = {}
+_rates_at = 0.0
+_last_attempt = 0.0
+_lock = threading.Lock()
+
+
+def refresh_rates() -> dict[str, float]:
+    global _rates, _rates_at, _last_attempt
+    import httpx
+
+    _last_attempt = time.time()
+    try:
+        response = http_client().get(settings.FX_RATES_URL)
+        response.raise_for_status()
+        payload = response.json()
+        rates = payload.get("rates") or payload.get("conversion_rates") or {}
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error("fx refresh-failed error=%s", e)
+        return _rates
+    _rates = {currency.upper(): float(rate) for currency, rate in rates.items() if rate}
+    _rates_at = _last_attempt
+    logger.info("fx refreshed currencies=%d", len(_rates))
+    return _rates
+
+
+def fiat_rates() -> dict[str, float]:
+    """Unidades de cada moeda fiat por 1 USD (tabela em memória, atualizada quando vence)"""
+    now = time.time()
+    if now - _rates_at < settings.FX_RATES_TTL:
+        return _rates
+    if now - _last_attempt < (settings.FX_RATES_TTL if _rates else RETRY_SECONDS):
+        return _rates
+    with _lock:
+        if time.time() - _last_attempt < RETRY_SECONDS:
+            return _rates
+        return refresh_rates()
+
+
+def usd_rate(currency: str, snapshot=None) -> Optional[float]:
+    """Quantas unidades de `currency` valem 1 USD, ou None se a taxa não for conhecida"""
+    currency = currency.upper()
+    if currency == BASE_CURRENCY:
+        return 1.0
+    rates = fiat_rates()
+    if currency in rates:
+        return rates[currency]
+    if snapshot is not None and BASE_CURRENCY in snapshot.quotes:
+        row = snapshot.row(currency)
+        if row is not None:
+            price = float(snapshot.quotes[BASE_CURRENCY]["price"][row])
+            if price > 0:
+                return 1 / price
+    return None
+
+
+def usd_changes(currency: str, snapshot=None) -> Optional[dict[str, float]]:
+    """Variações em USD de uma criptomoeda de conversão (None para USD e moedas fiat)"""
+    currency = currency.upper()
+    if currency == BASE_CURRENCY or currency in fiat_rates():
+        return None
+    if snapshot is None or BASE_CURRENCY not in snapshot.quotes:
+        return None
+    row = snapshot.row(currency)
+    if row is None:
+        return None
+    quote = snapshot.quotes[BASE_CURRENCY]
+    return {field: float(quote[field][row]) for field in set(PERCENT_FIELDS.values()) if field in quote}
+
+
+def _relative_change(change, base_change):
+    return ((1 + change / 100) / (1 + base_change / 100) - 1) * 100
+
+
+def convert_columns(
+    columns: dict[str, Any], rate: float, changes: Optional[dict[str, float]] = None
+) -> dict[str, Any]:
+    """Colunas NumPy de cotação na moeda base -> mesmas colunas em outra moeda"""
+    converted = {}
+    for field, column in columns.items():
+        if field in MONETARY_FIELDS:
+            converted[field] = column * rate
+        elif changes is not None and field in PERCENT_FIELDS:
+            # Variação ausente da moeda de conversão vira NaN (null na resposta)
+            converted[field] = _relative_change(column, changes.get(PERCENT_FIELDS[field], math.nan))
+        else:
+            converted[field] = column
+    return converted
+
+
+def convert_quote(
+    quote: dict[str, Any], rate: float, changes: Optional[dict[str, float]] = None
+) -> dict[str, Any]:
+    converted = {}
+    for field, value in quote.items():
+        if value is None:
+            converted[field] = None
+        elif field in MONETARY_FIELDS:
+            converted[field] = value * rate
+        elif changes is not None and field in PERCENT_FIELDS:
+            change = _relative_change(value, changes.get(PERCENT_FIELDS[field], math.nan))
+            converted[field] = None if math.isnan(change) else change
+        else:
+            converted[field] = value
+    return converted
+
+
+def local_rates(converts: Iterable[str], snapshot=None) -> Optional[dict[str, tuple]]:
+    """(taxa, variações) de todas as moedas pedidas, ou None se alguma não puder ser calculada"""
+    rates = {}
+    for convert in converts:
+        rate = usd_rate(convert, snapshot)
+        if rate is None:
+            return None
+        rates[convert.upper()] = (rate, usd_changes(convert, snapshot))
+    return rates
+
+
+def expand_quotes(payload: dict[str, Any], rates: dict[str, tuple]) -> dict[str, Any]:
+    """Completa os objetos "quote" de uma resposta buscada só em USD com as demais moedas.
+
+    Aceita o formato do listings_latest (lista) e do quotes_latest (v1: símbolo
+    -> item; v2: símbolo -> lista de itens). A resposta é alterada no lugar.
+    """
+    data = payload.get("data")
+    if isinstance(data, dict):
+        items = [i for entry in data.values() for i in (entry if isinstance(entry, list) else [entry])]
+    else:
+        items = data or []
+    for item in items:
+        base = (item.get("quote") or {}).get(BASE_CURRENCY)
+        if base is None:
+            continue
+        item["quote"] = {
+            currency: convert_quote(base, rate, changes) for currency, (rate, changes) in rates.items()
+        }
+    return payload
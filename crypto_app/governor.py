@@ -0,0 +1,239 @@
+"""Orçamento global de chamadas à OpenAI (requisições e tokens por minuto).
+
+Antes de cada responses.create / chat.completions.create a chamada estima
+seus tokens pela transcrição e consome dos token buckets do modelo (RPM e
+TPM, em OPENAI_LIMITS), compartilhados por todos os processos e nós via
+coordination.take. Sem saldo, a chamada espera na fila em vez de falhar.
+
+Prioridades: chamadas "batch" (alertas, prefetch, tarefas agendadas) só
+consomem enquanto sobra a fração OPENAI_BATCH_RESERVE do orçamento, que fica
+para as "interactive" (usuário esperando). Depois da resposta o consumo
+estimado é acertado pelos tokens reais; um 429 pausa o modelo em todos os nós
+pelo Retry-After; quem não pode esperar a pausa terminar recebe Paused.
+
+Chamadas especulativas (prefetch) podem ser abandonadas: dentro de
+cancel_when(check), `check()` verdadeiro antes da chamada ou durante a espera
+na fila levanta Cancelled, sem consumir o orçamento.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+from crypto_app import coordination, ledger, metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+# Aproximação para texto misto (português, inglês, JSON)
+CHARS_PER_TOKEN = 4
+# Saída prevista quando a chamada não limita max_output_tokens
+DEFAULT_OUTPUT_TOKENS = 1000
+MAX_RATE_LIMIT_RETRIES = 3
+# Releitura do saldo durante a espera: tokens devolvidos no acerto são notados logo
+POLL_SECONDS = 1.0
+
+_priority: ContextVar[str] = ContextVar("openai_priority", default="interactive")
+_cancelled: ContextVar[Optional[Callable[[], bool]]] = ContextVar("openai_cancelled", default=None)
+
+
+class Cancelled(Exception):
+    """A chamada foi abandonada antes de ir para a OpenAI"""
+
+
+class Paused(Exception):
+    """O modelo está pausado (429) por mais tempo que a espera máxima da prioridade"""
+
+
+@contextmanager
+def priority(name: str):
+    """Prioridade das chamadas à OpenAI feitas dentro do bloco"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Prioridade desconhecida: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def cancel_when(check: Callable[[], bool]):
+    """Abandona as chamadas à OpenAI feitas dentro do bloco quando `check()` for verdadeiro"""
+    token = _cancelled.set(check)
+    try:
+        yield
+    finally:
+        _cancelled.reset(token)
+
+
+def _raise_if_cancelled(model: str) -> None:
+    check = _cancelled.get()
+    if check is not None and check():
+        metrics.incr(f"governor.{current_priority()}.cancelled")
+        logger.info("openai-governor cancelled model=%s priority=%s", model, current_priority())
+        raise Cancelled(f"chamada abandonada model={model}")
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def estimate_tokens(*parts: Any, output: int = DEFAULT_OUTPUT_TOKENS) -> int:
+    """Tokens de entrada (texto/JSON das partes) mais a saída prevista"""
+    chars = 0
+    for part in parts:
+        if part is None:
+            continue
+        if not isinstance(part, str):
+            part = json.dumps(part, default=_jsonable, ensure_ascii=False, separators=(",", ":"))
+        chars += len(part)
+    return chars // CHARS_PER_TOKEN + output
+
+
+def limits(model: str) -> dict[str, float]:
+    return settings.OPENAI_LIMITS.get(model, settings.OPENAI_LIMITS_DEFAULT)
+
+
+def _buckets(model: str, tokens: float, requests: float, reserve: float):
+    limit = limits(model)
+    return [
+        (f"openai:{model}:rpm", requests, limit["rpm"], limit["rpm"] / 60, reserve * limit["rpm"]),
+        (f"openai:{model}:tpm", tokens, limit["tpm"], limit["tpm"] / 60, reserve * limit["tpm"]),
+    ]
+
+
+def _cooldown_key(model: str) -> str:
+    return f"{settings.COORDINATION_PREFIX}:openai-cooldown:{model}"
+
+
+def _cooldown_remaining(model: str) -> float:
+    raw = coordination.get_backend().get(_cooldown_key(model))
+    return max(float(raw) - time.time(), 0) if raw else 0.0
+
+
+def acquire(model: str, tokens: int) -> float:
+    """Espera até haver orçamento para a chamada e o consome; devolve a espera em segundos"""
+    priority_ = current_priority()
+    reserve = settings.OPENAI_BATCH_RESERVE if priority_ == "batch" else 0.0
+    max_wait = settings.OPENAI_MAX_WAIT[priority_]
+    started = time.monotonic()
+    try:
+        while True:
+            _raise_if_cancelled(model)
+            elapsed = time.monotonic() - started
+            cooldown = _cooldown_remaining(model)
+            if cooldown:
+                # Durante a pausa a API só devolveria outro 429: espera ou desiste, nunca força
+                if elapsed + cooldown > max_wait:
+                    metrics.incr(f"governor.{priority_}.paused")
+                    raise Paused(
+                        f"{model} pausado por mais {cooldown:.0f}s após 429; "
+                        f"espera máxima ({priority_}) de {max_wait}s"
+                    )
+                time.sleep(min(cooldown, POLL_SECONDS) + random.uniform(0, 0.05))
+                continue
+            wait = coordination.take(_buckets(model, tokens, 1, reserve))
+            if not wait:
+                break
+            if elapsed + wait > max_wait:
+                # Espera máxima da prioridade: segue e deixa a API decidir
+                logger.warning(
+                    "openai-governor max-wait model=%s priority=%s waited=%.1f", model, priority_, elapsed
+                )
+                coordination.take(_buckets(model, tokens, 1, 0.0), force=True)
+                break
+            # Um pouco de folga aleatória para os processos na fila não acordarem juntos
+            time.sleep(min(wait, POLL_SECONDS) + random.uniform(0, 0.05))
+    except coordination.CoordinationError as e:
+        logger.error("openai-governor budget-unavailable model=%s error=%s", model, e)
+    return time.monotonic() - started
+
+
+def settle(model: str, estimated: int, used: Optional[int]) -> None:
+    """Acerta o balde de tokens pela diferença entre o consumo real e o estimado"""
+    if used is None or used == estimated:
+        return
+    try:
+        coordination.take(_buckets(model, used - estimated, 0, 0.0), force=True)
+    except coordination.CoordinationError as e:
+        logger.error("openai-governor settle-failed model=%s error=%s", model, e)
+
+
+def pause(model: str, seconds: float) -> None:
+    """Suspende as chamadas ao modelo em todos os nós (depois de um 429)"""
+    try:
+        coordination.get_backend().set(_cooldown_key(model), str(time.time() + seconds).encode(), seconds)
+    except coordination.CoordinationError as e:
+        logger.error("openai-governor pause-failed model=%s error=%s", model, e)
+
+
+def _retry_after(error, attempt: int) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    try:
+        return float(headers["retry-after"])
+    except (KeyError, TypeError, ValueError):
+        return min(2 ** attempt, 30)
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def governed(model: str, tokens: int, call: Callable[[], Any], label: str) -> Any:
+    """Executa `call` (uma chamada à OpenAI) dentro do orçamento do modelo"""
+    from openai import RateLimitError
+
+    priority_ = current_priority()
+    # Uma chamada maior que o balde nunca teria saldo: limita ao que qualquer prioridade alcança
+    tokens = min(tokens, int(limits(model)["tpm"] * (1 - settings.OPENAI_BATCH_RESERVE)))
+    for attempt in range(1, MAX_RATE_LIMIT_RETRIES + 2):
+        waited = acquire(model, tokens)
+        metrics.incr(f"governor.{priority_}.calls")
+        metrics.incr(f"governor.{priority_}.wait_seconds", waited)
+        logger.info(
+            "openai-governor agent=%s model=%s priority=%s estimated-tokens=%d wait-ms=%.0f",
+            label, model, priority_, tokens, waited * 1000,
+        )
+        try:
+            response = call()
+        except RateLimitError as e:
+            metrics.incr(f"governor.{priority_}.rate_limited")
+            if attempt > MAX_RATE_LIMIT_RETRIES:
+                raise
+            seconds = _retry_after(e, attempt)
+            logger.warning("openai-governor rate-limited model=%s pause=%.1f attempt=%d", model, seconds, attempt)
+            pause(model, seconds)
+            continue
+        settle(model, tokens, _used_tokens(response))
+        ledger.record_usage(model, response)
+        return response
+
+
+def stats() -> dict[str, dict[str, float]]:
+    result = {}
+    for priority_ in PRIORITIES:
+        calls = metrics.get(f"governor.{priority_}.calls")
+        wait = metrics.get(f"governor.{priority_}.wait_seconds")
+        result[priority_] = {
+            "calls": calls,
+            "avg_wait_ms": wait / calls * 1000 if calls else 0.0,
+            "rate_limited": metrics.get(f"governor.{priority_}.rate_limited"),
+            "cancelled": metrics.get(f"governor.{priority_}.cancelled"),
+        }
+    return result
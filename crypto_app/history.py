@@ -0,0 +1,250 @@
+"""Busca nas análises anteriores para encurtar as consultas do orquestrador.
+
+As análises gravadas (CryptoAnalysis.analysis_summary, em texto puro) ficam
+em um índice SQLite FTS5 local, como o de notícias, atualizado a cada
+post_save/post_delete; `manage.py index_analyses` reconstrói o índice a
+partir do banco. O índice acompanha o banco ativo: bancos de teste ou
+descartáveis (replay_traffic) ganham um índice temporário próprio, porque os
+ids das linhas deles coincidem com os do banco real.
+
+Antes de delegar, o Orchestrator consulta o índice (ranking BM25, só
+análises dos últimos ANALYSIS_RECALL_DAYS e das moedas citadas na pergunta)
+e recebe os trechos mais relevantes como contexto. As métricas comparam as
+rodadas (de todos os agentes da consulta) e as buscas na web das consultas
+com e sem esse contexto.
+"""
+import atexit
+import hashlib
+import logging
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from crypto_app import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    name TEXT,
+    recommendation TEXT,
+    created_ts INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_created_ts ON analyses (created_ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5 (
+    symbol, name, body,
+    content='analyses', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN
+    INSERT INTO analyses_fts (rowid, symbol, name, body) VALUES (new.id, new.symbol, new.name, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, symbol, name, body)
+    VALUES ('delete', old.id, old.symbol, old.name, old.body);
+END;
+"""
+
+# Palavras do trecho devolvido por análise (função snippet do FTS5)
+SNIPPET_TOKENS = 60
+
+
+def _match_expression(query: str) -> str:
+    # Cada palavra entre aspas evita que a sintaxe do FTS5 vaze da pergunta
+    words = re.findall(r"\w+", query)
+    return " OR ".join(f'"{w}"' for w in words)
+
+
+def _row(analysis) -> tuple:
+    body = " ".join(strip_tags(analysis.analysis_summary or "").split())
+    return (
+        analysis.id,
+        analysis.symbol.upper(),
+        analysis.name,
+        analysis.recommendation,
+        int(analysis.analysis_date.timestamp()),
+        body,
+    )
+
+
+class AnalysisIndex:
+    """Índice local das análises gravadas em SQLite FTS5"""
+
+    def __init__(self, path):
+        self._path = str(path)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, analyses: Iterable[Any]) -> int:
+        """Indexa (ou reindexa) as análises"""
+        rows = [_row(a) for a in analyses]
+        with self._connection() as conn:
+            # O DELETE passa pelo gatilho e tira a versão antiga do índice FTS
+            conn.executemany("DELETE FROM analyses WHERE id = ?", [(row[0],) for row in rows])
+            conn.executemany(
+                "INSERT INTO analyses (id, symbol, name, recommendation, created_ts, body) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def remove(self, analysis_id: int) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+
+    def search(
+        self,
+        query: str,
+        symbols: Optional[list[str]] = None,
+        since: Optional[float] = None,
+        limit: int = 3,
+    ) -> list[dict[str, Any]]:
+        """Análises mais relevantes (BM25) para a pergunta, com um trecho de cada"""
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        terms = [f"({expression})"]
+        if symbols:
+            terms.append("symbol : (" + " OR ".join(f'"{s.upper()}"' for s in symbols) + ")")
+        where, params = "", [" AND ".join(terms)]
+        if since is not None:
+            where = "AND a.created_ts >= ?"
+            params.append(int(since))
+        rows = self._connection().execute(
+            f"""SELECT a.id, a.symbol, a.name, a.recommendation, a.created_ts,
+                snippet(analyses_fts, 2, '', '', '…', {SNIPPET_TOKENS}) AS excerpt
+            FROM analyses_fts JOIN analyses a ON a.id = analyses_fts.rowid
+            WHERE analyses_fts MATCH ? {where}
+            ORDER BY bm25(analyses_fts), a.created_ts DESC LIMIT ?""",
+            [*params, limit],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM analyses")
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+
+_indexes: dict[str, AnalysisIndex] = {}
+_index_lock = threading.Lock()
+# Banco configurado quando o app carrega, antes de o test runner trocar o NAME
+_configured_database = str(settings.DATABASES["default"]["NAME"])
+_scratch_dir: Optional[str] = None
+
+
+def index_path() -> str:
+    """Arquivo do índice do banco ativo"""
+    global _scratch_dir
+    database = str(connection.settings_dict["NAME"])
+    if database == _configured_database:
+        return str(settings.ANALYSIS_INDEX_PATH)
+    if _scratch_dir is None:
+        _scratch_dir = tempfile.mkdtemp(prefix="analysis-index-")
+        atexit.register(shutil.rmtree, _scratch_dir, True)
+    return f"{_scratch_dir}/{hashlib.sha1(database.encode()).hexdigest()[:12]}.sqlite3"
+
+
+def get_index() -> AnalysisIndex:
+    path = index_path()
+    index = _indexes.get(path)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = _indexes[path] = AnalysisIndex(path)
+    return index
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """Reindexa todas as análises do banco"""
+    from crypto_app.models import CryptoAnalysis
+
+    index = get_index()
+    index.clear()
+    indexed, batch = 0, []
+    for analysis in CryptoAnalysis.objects.order_by("id").iterator(chunk_size=batch_size):
+        batch.append(analysis)
+        if len(batch) >= batch_size:
+            indexed += index.add(batch)
+            batch = []
+    indexed += index.add(batch)
+    return indexed
+
+
+@receiver(post_save, sender="crypto_app.CryptoAnalysis")
+def index_on_save(sender, instance, **kwargs):
+    try:
+        get_index().add([instance])
+    except sqlite3.Error as e:
+        logger.error("analysis-index add-failed id=%s error=%s", instance.id, e)
+
+
+@receiver(post_delete, sender="crypto_app.CryptoAnalysis")
+def remove_on_delete(sender, instance, **kwargs):
+    try:
+        get_index().remove(instance.id)
+    except sqlite3.Error as e:
+        logger.error("analysis-index remove-failed id=%s error=%s", instance.id, e)
+
+
+def recall_analyses(query: str, limit: Optional[int] = None) -> list[dict[str, Any]]:
+    """Análises recentes das moedas citadas na pergunta, mais relevantes primeiro"""
+    from crypto_app.agents.intents import find_symbols
+
+    since = time.time() - settings.ANALYSIS_RECALL_DAYS * 86400
+    try:
+        return get_index().search(query, find_symbols(query), since, limit or settings.ANALYSIS_RECALL_LIMIT)
+    except sqlite3.Error as e:
+        logger.error("analysis-index search-failed error=%s", e)
+        return []
+
+
+def record_query(recalled: bool, rounds: int, web_searches: int) -> None:
+    """Rodadas e buscas na web de uma consulta orquestrada, com ou sem análises anteriores"""
+    group = "recall" if recalled else "cold"
+    metrics.incr(f"retrieval.{group}.queries")
+    metrics.incr(f"retrieval.{group}.rounds", rounds)
+    metrics.incr(f"retrieval.{group}.web_searches", web_searches)
+
+
+def stats() -> dict[str, float]:
+    result = {}
+    for group in ("recall", "cold"):
+        queries = metrics.get(f"retrieval.{group}.queries")
+        result[f"{group}_queries"] = queries
+        result[f"{group}_avg_rounds"] = metrics.get(f"retrieval.{group}.rounds") / queries if queries else 0.0
+        result[f"{group}_avg_web_searches"] = (
+            metrics.get(f"retrieval.{group}.web_searches") / queries if queries else 0.0
+        )
+    both = result["recall_queries"] and result["cold_queries"]
+    result["rounds_saved_per_query"] = result["cold_avg_rounds"] - result["recall_avg_rounds"] if both else 0.0
+    result["web_searches_saved_per_query"] = (
+        result["cold_avg_web_searches"] - result["recall_avg_web_searches"] if both else 0.0
+    )
+    return result
@@ -0,0 +1,140 @@
+"""Leitura incremental das respostas JSON grandes do CoinMarketCap.
+
+Uma listagem de 5000 moedas ou o id map completo têm vários MB; com
+response.json() o corpo inteiro, o texto decodificado e a árvore de objetos
+ficam na memória ao mesmo tempo. Aqui o corpo é lido em pedaços
+(response.iter_bytes) e cada item da lista "data" é decodificado sozinho com
+json.JSONDecoder.raw_decode (em C), projetado só nos campos usados e
+descartado. Na memória fica o pedaço atual, um item e os registros compactos.
+"""
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, Optional
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+# Depois de um número, só um pedaço ainda não lido continuaria com estes ("1." + "5")
+_number_chars = frozenset("0123456789.eE+-")
+
+
+def _may_continue(value: Any, next_char: str) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and next_char in _number_chars
+
+
+class _Reader:
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Acrescenta o próximo pedaço ao buffer, descartando o que já foi lido"""
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self._utf8.decode(b"", final=True)
+        else:
+            text = self._utf8.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: esperado {char!r}, encontrado {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # Um número no fim do buffer, ou cortado depois do "." ou do "e",
+                # pode continuar no próximo pedaço
+                if self.eof or (end < len(self.buffer) and not _may_continue(value, self.buffer[end])):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_data(chunks: Iterable[bytes], rest: Optional[dict] = None, key: str = "data") -> Iterator[Any]:
+    """Itens da lista `key` do objeto JSON, um de cada vez.
+
+    As demais chaves do objeto (ex.: "status") são guardadas em `rest`. Se
+    `key` não for uma lista, o valor inteiro vai para `rest`.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.pos += 1
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    separator = reader.peek()
+                    reader.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"JSON inválido: separador {separator!r} na lista {key!r}")
+        else:
+            value = reader.value()
+            if rest is not None:
+                rest[name] = value
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"JSON inválido: separador {separator!r}")
+
+
+def fields(*names: str, **nested: Any) -> dict[str, Any]:
+    """Projeção: campos mantidos como vieram e campos com sub-projeção.
+
+    Em um objeto, a chave "*" aplica a sub-projeção a todos os valores (ex.: as
+    moedas de conversão dentro de "quote").
+    """
+    return {**dict.fromkeys(names), **nested}
+
+
+def project(value: Any, projection: Optional[dict[str, Any]]) -> Any:
+    if projection is None or not isinstance(value, dict):
+        return value
+    if "*" in projection:
+        return {k: project(v, projection["*"]) for k, v in value.items()}
+    # Mantém a ordem dos campos da resposta
+    return {k: project(v, projection[k]) for k, v in value.items() if k in projection}
+
+
+def parse(chunks: Iterable[bytes], projection: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """Resposta com a lista "data" projetada item a item"""
+    rest: dict[str, Any] = {}
+    data = [project(item, projection) for item in iter_data(chunks, rest)]
+    if "data" in rest:
+        # "data" não era uma lista (ex.: quotes por símbolo): volta como veio
+        return rest
+    return {**rest, "data": data}
@@ -0,0 +1,327 @@
+"""Livro-razão de custo e latência por requisição.
+
+Cada requisição das views em LEDGER_VIEWS abre uma entrada (LedgerMiddleware)
+e toda chamada externa feita nela é registrada pelos event hooks dos
+clientes HTTP compartilhados (clients.py):
+
+- duração até o fim da leitura do corpo e bytes recebidos (contados no
+  stream da resposta, também nas lidas em streaming);
+- créditos do CoinMarketCap, lidos do "status.credit_count" no início do
+  corpo (descomprimido à parte, sem parsear o JSON);
+- tokens da OpenAI (entrada, em cache e saída), registrados por
+  governor.governed com o usage da resposta.
+
+O custo estimado usa OPENAI_PRICES e CMC_CREDIT_USD. Ao fim da requisição a
+entrada vira um LedgerRequest com os totais e um LedgerCall por chamada.
+Trabalho em threads de segundo plano (especulação da pré-busca, atualização
+do snapshot) não é atribuído à requisição que o disparou.
+"""
+import logging
+import re
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SERVICES = {
+    "api.openai.com": "openai",
+    "pro-api.coinmarketcap.com": "coinmarketcap",
+    "newsapi.org": "newsapi",
+}
+CREDIT_COUNT = re.compile(rb'"credit_count"\s*:\s*(\d+)')
+# O "status" vem no início do corpo do CoinMarketCap: não procura além disso
+CREDIT_SCAN_BYTES = 16384
+
+
+class Entry:
+    """Chamadas externas e atribuição (símbolo) da requisição em andamento"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls: list[dict[str, Any]] = []
+        self.symbol = ""
+
+    def last_call(self, service: str) -> Optional[dict[str, Any]]:
+        for call in reversed(self.calls):
+            if call["service"] == service:
+                return call
+        return None
+
+
+_entry: ContextVar[Optional[Entry]] = ContextVar("ledger_entry", default=None)
+
+
+@contextmanager
+def recording():
+    """Registra as chamadas externas feitas dentro do bloco"""
+    entry = Entry()
+    token = _entry.set(entry)
+    try:
+        yield entry
+    finally:
+        _entry.reset(token)
+
+
+def tag(symbol: str) -> None:
+    """Atribui a requisição atual a um símbolo (custo por moeda)"""
+    entry = _entry.get()
+    if entry is not None and symbol:
+        entry.symbol = symbol.upper()[:50]
+
+
+def service_for(host: str) -> str:
+    if host == urlsplit(settings.FX_RATES_URL).hostname:
+        return "fx"
+    return SERVICES.get(host, "other")
+
+
+class _CreditScanner:
+    """Procura o credit_count nos primeiros bytes (descomprimidos) do corpo"""
+
+    def __init__(self, encoding: str):
+        if encoding in ("gzip", "x-gzip"):
+            self._decompress = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+        elif encoding == "deflate":
+            self._decompress = zlib.decompressobj().decompress
+        elif encoding in ("", "identity"):
+            self._decompress = bytes
+        else:
+            self._decompress = None
+        self._head = b""
+        self.done = self._decompress is None
+
+    def feed(self, chunk: bytes) -> Optional[int]:
+        try:
+            self._head += self._decompress(chunk)
+        except zlib.error:
+            self.done = True
+            return None
+        match = CREDIT_COUNT.search(self._head)
+        if match or len(self._head) >= CREDIT_SCAN_BYTES:
+            self.done = True
+        return int(match.group(1)) if match else None
+
+
+_stream_class = None
+
+
+def _counting_stream(stream, call: dict[str, Any], scanner: Optional[_CreditScanner]):
+    """Stream da resposta que conta bytes, lê os créditos e marca o fim da leitura"""
+    global _stream_class
+    if _stream_class is None:
+        import httpx
+
+        class CountingStream(httpx.SyncByteStream):
+            def __init__(self, stream, call, scanner):
+                self._stream = stream
+                self._call = call
+                self._scanner = scanner
+
+            def __iter__(self):
+                for chunk in self._stream:
+                    self._call["bytes_in"] += len(chunk)
+                    if self._scanner is not None and not self._scanner.done:
+                        credits = self._scanner.feed(chunk)
+                        if credits is not None:
+                            self._call["cmc_credits"] = credits
+                    yield chunk
+
+            def close(self):
+                self._call["end"] = time.perf_counter()
+                self._stream.close()
+
+        _stream_class = CountingStream
+    return _stream_class(stream, call, scanner)
+
+
+def on_request(request) -> None:
+    if _entry.get() is not None:
+        request.extensions["ledger_started"] = time.perf_counter()
+
+
+def on_response(response) -> None:
+    entry = _entry.get()
+    started = response.request.extensions.get("ledger_started")
+    if entry is None or started is None:
+        return
+    host = response.request.url.host
+    call = {
+        "service": service_for(host),
+        "host": host,
+        "method": response.request.method,
+        "path": response.request.url.path[:200],
+        "status_code": response.status_code,
+        "start": started,
+        "end": None,
+        "bytes_in": 0,
+        "model": "",
+        "input_tokens": 0,
+        "cached_tokens": 0,
+        "output_tokens": 0,
+        "cmc_credits": 0,
+    }
+    entry.calls.append(call)
+    scanner = None
+    if call["service"] == "coinmarketcap":
+        scanner = _CreditScanner(response.headers.get("content-encoding", "").lower())
+    response.stream = _counting_stream(response.stream, call, scanner)
+
+
+def record_usage(model: str, response) -> None:
+    """Tokens da resposta da OpenAI, na última chamada à OpenAI da requisição"""
+    entry = _entry.get()
+    usage = getattr(response, "usage", None)
+    if entry is None or usage is None:
+        return
+    call = entry.last_call("openai")
+    if call is None:
+        return
+    # Responses API (input/output_tokens) ou Chat Completions (prompt/completion_tokens)
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is not None:
+        details = getattr(usage, "input_tokens_details", None)
+        output_tokens = usage.output_tokens
+    else:
+        input_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        output_tokens = getattr(usage, "completion_tokens", 0) or 0
+    call["model"] = model
+    call["input_tokens"] += input_tokens or 0
+    call["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+    call["output_tokens"] += output_tokens or 0
+
+
+def call_cost(call: dict[str, Any]) -> float:
+    """Custo estimado em USD de uma chamada"""
+    if call["service"] == "coinmarketcap":
+        return call["cmc_credits"] * settings.CMC_CREDIT_USD
+    if call["service"] != "openai" or not call["model"]:
+        return 0.0
+    prices = settings.OPENAI_PRICES.get(call["model"], settings.OPENAI_PRICES_DEFAULT)
+    uncached = max(call["input_tokens"] - call["cached_tokens"], 0)
+    return (
+        uncached * prices["input"]
+        + call["cached_tokens"] * prices["cached_input"]
+        + call["output_tokens"] * prices["output"]
+    ) / 1_000_000
+
+
+def save(entry: Entry, request, response, duration_ms: float):
+    """Grava a requisição (totais) e as suas chamadas externas"""
+    from crypto_app.models import LedgerCall, LedgerRequest
+
+    now = time.perf_counter()
+    calls = []
+    for call in entry.calls:
+        end = call["end"] or now
+        calls.append(LedgerCall(
+            service=call["service"],
+            host=call["host"],
+            method=call["method"],
+            path=call["path"],
+            status_code=call["status_code"],
+            start_ms=(call["start"] - entry.started) * 1000,
+            duration_ms=(end - call["start"]) * 1000,
+            bytes_in=call["bytes_in"],
+            model=call["model"],
+            input_tokens=call["input_tokens"],
+            cached_tokens=call["cached_tokens"],
+            output_tokens=call["output_tokens"],
+            cmc_credits=call["cmc_credits"],
+            cost_usd=call_cost(call),
+        ))
+
+    match = request.resolver_match
+    query = request.POST.get("symbol") or request.GET.get("symbols") or request.GET.get("symbol") or request.GET.get("q") or ""
+    user = getattr(request, "user", None)
+    record = LedgerRequest.objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        route=(match.url_name or "") if match is not None else "",
+        method=request.method,
+        path=request.path[:500],
+        status_code=response.status_code,
+        query=" ".join(query.split())[:255],
+        symbol=entry.symbol,
+        duration_ms=duration_ms,
+        upstream_calls=len(calls),
+        upstream_ms=sum(c.duration_ms for c in calls),
+        bytes_in=sum(c.bytes_in for c in calls),
+        input_tokens=sum(c.input_tokens for c in calls),
+        cached_tokens=sum(c.cached_tokens for c in calls),
+        output_tokens=sum(c.output_tokens for c in calls),
+        cmc_credits=sum(c.cmc_credits for c in calls),
+        cost_usd=sum(c.cost_usd for c in calls),
+    )
+    for call in calls:
+        call.request = record
+    LedgerCall.objects.bulk_create(calls)
+    return record
+
+
+def prune() -> int:
+    """Apaga as entradas mais antigas que LEDGER_RETENTION_DAYS"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from crypto_app.models import LedgerRequest
+
+    cutoff = timezone.now() - timedelta(days=settings.LEDGER_RETENTION_DAYS)
+    deleted, _ = LedgerRequest.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def report(days: float = 7, top: int = 20) -> dict[str, Any]:
+    """Consultas mais caras, custo por moeda, latência por rota e por serviço externo"""
+    from datetime import timedelta
+    import numpy as np
+    from django.db.models import Avg, Count, Sum
+    from django.utils import timezone
+    from crypto_app.models import LedgerCall, LedgerRequest
+
+    since = timezone.now() - timedelta(days=days)
+    requests = LedgerRequest.objects.filter(created_at__gte=since)
+
+    durations: dict[str, list[float]] = {}
+    for route, duration in requests.values_list("route", "duration_ms").iterator():
+        durations.setdefault(route, []).append(duration)
+    routes = []
+    for route, values in sorted(durations.items()):
+        p50, p95 = np.percentile(values, [50, 95])
+        routes.append({"route": route, "requests": len(values), "p50_ms": p50, "p95_ms": p95})
+
+    return {
+        "days": days,
+        "top_requests": list(requests.order_by("-cost_usd", "-duration_ms")[:top]),
+        "by_symbol": list(
+            requests.exclude(symbol="").values("symbol").annotate(
+                requests=Count("id"),
+                cost_usd=Sum("cost_usd"),
+                input_tokens=Sum("input_tokens"),
+                output_tokens=Sum("output_tokens"),
+                cmc_credits=Sum("cmc_credits"),
+                avg_ms=Avg("duration_ms"),
+            ).order_by("-cost_usd")[:top]
+        ),
+        "by_route": routes,
+        "by_service": list(
+            LedgerCall.objects.filter(request__created_at__gte=since).values("service").annotate(
+                calls=Count("id"),
+                cost_usd=Sum("cost_usd"),
+                avg_ms=Avg("duration_ms"),
+                bytes_in=Sum("bytes_in"),
+                input_tokens=Sum("input_tokens"),
+                cached_tokens=Sum("cached_tokens"),
+                cmc_credits=Sum("cmc_credits"),
+            ).order_by("-cost_usd")
+        ),
+        "totals": requests.aggregate(
+            requests=Count("id"), cost_usd=Sum("cost_usd"), cmc_credits=Sum("cmc_credits"),
+            input_tokens=Sum("input_tokens"), output_tokens=Sum("output_tokens"),
+        ),
+    }
@@ -0,0 +1,56 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from crypto_app import backtest
+
+
+def _fmt(value, pattern="{:.3f}"):
+    return "-" if value is None else pattern.format(value)
+
+
+class Command(BaseCommand):
+    help = "Avalia as recomendações gravadas (acerto, calibração da confiança, erro das previsões) contra o PriceSample"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horizon-days", type=int, default=30, help="Janela para avaliar a recomendação")
+        parser.add_argument("--hold-band", type=float, default=0.05, help="Faixa de retorno considerada 'segurar'")
+        parser.add_argument("--convert", default="BRL")
+        parser.add_argument("--bins", type=int, default=10, help="Faixas de confiança na calibração")
+        parser.add_argument("--synthetic", type=int, default=0, help="Usa N análises aleatórias (medir desempenho)")
+        parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["synthetic"]:
+            analyses, prices = backtest.synthetic(options["synthetic"])
+        else:
+            analyses = backtest.load_analyses()
+            prices = backtest.load_prices(options["convert"], analyses["symbol"].unique().tolist())
+        loaded = time.perf_counter()
+        result = backtest.score(analyses, prices, options["horizon_days"], options["hold_band"], options["bins"])
+        scored = time.perf_counter()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(
+            f"{result['analyses']} análises, {result['scored']} avaliadas em {result['horizon_days']} dias "
+            f"(carga {loaded - started:.2f}s, cálculo {scored - loaded:.2f}s, {len(prices)} preços)"
+        )
+        self.stdout.write(f"acerto       {_fmt(result['hit_rate'])}")
+        for label, stats in result["by_recommendation"].items():
+            self.stdout.write(f"  {label:<10} n={stats['n']:<8} acerto={_fmt(stats['hit_rate'])}")
+        self.stdout.write(f"brier        {_fmt(result['brier'])}   ece={_fmt(result['ece'])}")
+        for row in result["calibration"]:
+            self.stdout.write(
+                f"  conf {row['bin']}  n={row['n']:<8} confiança={row['confidence']:.3f} acerto={row['hit_rate']:.3f}"
+            )
+        for name, stats in result["predictions"].items():
+            self.stdout.write(
+                f"previsão {name:<9} n={stats['n']:<8} mae={_fmt(stats['mae'], '{:.2f}')}pp "
+                f"rmse={_fmt(stats['rmse'], '{:.2f}')}pp viés={_fmt(stats['bias'], '{:+.2f}')}pp "
+                f"direção={_fmt(stats['direction_accuracy'])}"
+            )
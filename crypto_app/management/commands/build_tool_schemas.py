@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crypto_app.agents.tools import write_tool_schemas
+
+
+class Command(BaseCommand):
+    help = "Regenera crypto_app/agents/tool_schemas.json a partir dos modelos em agents/schemas.py"
+
+    def handle(self, *args, **options):
+        path = write_tool_schemas()
+        self.stdout.write(self.style.SUCCESS(f"Esquemas das ferramentas gravados em {path}"))
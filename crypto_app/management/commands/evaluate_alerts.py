@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crypto_app.alerts import evaluate_snapshot, refresh_analyses
+from crypto_app.coordination import is_leader
+from crypto_app.market import get_snapshot
+
+
+class Command(BaseCommand):
+    help = "Avalia os alertas de preço contra o snapshot atual (uma vez ou a cada --interval segundos)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="Repetir a cada N segundos")
+        parser.add_argument("--no-refresh", action="store_true", help="Não refaz as análises das moedas afetadas")
+
+    def handle(self, *args, **options):
+        while True:
+            # Em execução contínua em vários nós, só o líder avalia a cada rodada
+            lease = 2 * options["interval"] + 30
+            if options["interval"] and not is_leader("evaluate-alerts", lease):
+                self.stdout.write("Outro nó é o líder; aguardando")
+            elif (snapshot := get_snapshot()) is None:
+                self.stderr.write("Snapshot do mercado indisponível")
+            else:
+                triggered = evaluate_snapshot(snapshot, refresh=False)
+                self.stdout.write(f"{len(triggered)} alertas disparados")
+                symbols = list(dict.fromkeys(t["symbol"] for t in triggered if t["refresh"]))
+                if symbols and not options["no_refresh"]:
+                    refreshed = refresh_analyses(symbols)
+                    self.stdout.write(f"{refreshed} análises refeitas")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
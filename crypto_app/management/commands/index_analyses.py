@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crypto_app.history import get_index, rebuild
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice local das análises anteriores a partir do banco"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = rebuild(options["batch_size"])
+        self.stdout.write(f"{indexed} análises indexadas ({get_index().count()} no índice)")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crypto_app.news import ingest_news
+
+
+class Command(BaseCommand):
+    help = "Baixa notícias da NewsAPI para o índice local (uma vez ou a cada --interval segundos)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="Repetir a cada N segundos")
+        parser.add_argument("--pages", type=int, default=1)
+
+    def handle(self, *args, **options):
+        while True:
+            added = ingest_news(options["pages"])
+            self.stdout.write(f"{added} notícias novas no índice")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crypto_app import shared_snapshot
+from crypto_app.market import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Baixa a listagem do CoinMarketCap a cada MARKET_SNAPSHOT_TTL segundos e a publica "
+        "no arquivo compartilhado MARKET_SHARED_PATH, lido pelos workers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Publica uma vez e sai")
+
+    def handle(self, *args, **options):
+        path = settings.MARKET_SHARED_PATH
+        if not path:
+            raise CommandError("Defina MARKET_SHARED_PATH para publicar o snapshot compartilhado.")
+        while True:
+            started = time.time()
+            snapshot = refresh_snapshot()
+            if snapshot is not None and snapshot.fetched_at >= started:
+                generation = shared_snapshot.publish(snapshot, path)
+                self.stdout.write(f"geração {generation}: {len(snapshot)} moedas")
+            else:
+                self.stderr.write("Falha ao atualizar o snapshot; mantendo a versão publicada")
+            if options["once"]:
+                break
+            time.sleep(max(settings.MARKET_SNAPSHOT_TTL - (time.time() - started), 1))
@@ -0,0 +1,128 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from crypto_app import traffic
+
+# Cada medição roda em um processo novo: ru_maxrss é o pico do processo inteiro.
+# O corpo da resposta é lido do arquivo em pedaços de 64 KB, como viria da rede.
+PROBE = """
+import gc, json, os, resource, sys, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crypto_project.settings")
+import django
+django.setup()
+import httpx
+from crypto_app.clients import http_client, use_transport
+from crypto_app.jsonstream import iter_data, parse
+from crypto_app.market import MarketSnapshot, LISTINGS_URL
+from crypto_app.agents.coin_market_cap import PROJECTIONS
+
+workload, mode, path = sys.argv[1], sys.argv[2], sys.argv[3]
+
+class Chunks(httpx.SyncByteStream):
+    def __iter__(self):
+        with open(path, "rb") as f:
+            while chunk := f.read(65536):
+                yield chunk
+
+use_transport(httpx.MockTransport(lambda request: httpx.Response(200, stream=Chunks())))
+client = http_client()
+gc.collect()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+if workload == "snapshot":
+    if mode == "json":
+        result = MarketSnapshot.from_listings(client.get(LISTINGS_URL).json(), ["USD"])
+    else:
+        with client.stream("GET", LISTINGS_URL) as response:
+            result = MarketSnapshot.from_columns(MarketSnapshot.listing_columns(iter_data(response.iter_bytes()), ["USD"]))
+    size = len(result)
+else:
+    # Saída da ferramenta listings_latest como vai para a transcrição do agente
+    if mode == "json":
+        result = json.dumps(client.get(LISTINGS_URL).json())
+    else:
+        with client.stream("GET", LISTINGS_URL) as response:
+            result = json.dumps(parse(response.iter_bytes(), PROJECTIONS["listings_latest"]), separators=(",", ":"))
+    size = len(result)
+elapsed = time.perf_counter() - started
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"peak_kb": after - before, "seconds": elapsed, "size": size}))
+"""
+
+TAGS = [
+    "mineable", "pow", "sha-256", "store-of-value", "state-channel", "coinbase-ventures-portfolio",
+    "three-arrows-capital-portfolio", "polychain-capital-portfolio", "binance-labs-portfolio",
+    "blockchain-capital-portfolio", "boostvc-portfolio", "cms-holdings-portfolio", "dcg-portfolio",
+    "dragonfly-capital-portfolio", "electric-capital-portfolio", "fabric-ventures-portfolio",
+    "framework-ventures-portfolio", "galaxy-digital-portfolio", "huobi-capital-portfolio",
+    "alameda-research-portfolio", "a16z-portfolio", "1confirmation-portfolio", "winklevoss-capital-portfolio",
+    "usv-portfolio", "placeholder-ventures-portfolio", "pantera-capital-portfolio", "multicoin-capital-portfolio",
+    "paradigm-portfolio", "bitcoin-ecosystem", "layer-1",
+]
+
+
+def listing_item(rank: int) -> dict:
+    """Item no formato completo do listings_latest (tags, platform, campos self-reported)"""
+    item = traffic._stub_coin(rank, ["USD"])
+    rng = random.Random(rank)
+    item["tags"] = rng.sample(TAGS, rng.randint(3, len(TAGS)))
+    item["platform"] = None if rank % 4 else {
+        "id": 1027, "name": "Ethereum", "symbol": "ETH", "slug": "ethereum",
+        "token_address": "0x" + "%040x" % rng.getrandbits(160),
+    }
+    item.update({
+        "infinite_supply": False,
+        "self_reported_circulating_supply": None,
+        "self_reported_market_cap": None,
+        "tvl_ratio": None,
+    })
+    item["quote"]["USD"].update({"tvl": None, "percent_change_60d": 1.5, "percent_change_90d": -3.2})
+    return item
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o pico de memória (RSS) e o tempo de leitura de uma listagem grande "
+        "com response.json() e com a leitura em streaming (jsonstream)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coins", type=int, default=5000)
+        parser.add_argument("--runs", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            body = json.dumps({
+                "status": traffic._cmc_status(),
+                "data": [listing_item(rank) for rank in range(1, options["coins"] + 1)],
+            }).encode()
+            f.write(body)
+        self.stdout.write(f"listagem: {options['coins']} moedas, {len(body) / 2**20:.1f}MB")
+        try:
+            for workload in ("snapshot", "agent"):
+                for mode in ("json", "stream"):
+                    results = []
+                    for _ in range(options["runs"]):
+                        output = subprocess.run(
+                            [sys.executable, "-c", PROBE, workload, mode, f.name],
+                            capture_output=True,
+                            text=True,
+                            check=True,
+                            cwd=settings.BASE_DIR,
+                        ).stdout
+                        results.append(json.loads(output.strip().splitlines()[-1]))
+                    peak = min(r["peak_kb"] for r in results) / 1024
+                    seconds = min(r["seconds"] for r in results) * 1000
+                    self.stdout.write(
+                        f"{workload:<9} {mode:<7} peak-rss=+{peak:7.1f}MB time={seconds:7.1f}ms "
+                        f"result={results[-1]['size']}"
+                    )
+        finally:
+            os.unlink(f.name)
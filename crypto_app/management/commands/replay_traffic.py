@@ -0,0 +1,161 @@
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from crypto_app.clients import use_transport
+from crypto_app.traffic import load_capture, stub_transport
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def throwaway_state():
+    """Banco e coordenação descartáveis durante o replay.
+
+    As análises simuladas não podem chegar ao banco configurado: elas entram no
+    índice de recall, no backtest e nas versões dos fragmentos. O banco é
+    criado como o de testes (migrate) e apagado no fim, com um índice de
+    análises temporário (ver history.index_path); locks, cache e
+    resultados compartilhados ficam na memória do processo, mesmo com
+    COORDINATION_URL.
+    """
+    from crypto_app import coordination
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as tmp:
+        old_name = connection.settings_dict["NAME"]
+        old_test_name = connection.settings_dict["TEST"].get("NAME")
+        if connection.vendor == "sqlite":
+            # Em arquivo, não em memória: as threads do servidor escrevem ao mesmo tempo
+            connection.settings_dict["TEST"]["NAME"] = str(Path(tmp) / "replay.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        overrides = override_settings(COORDINATION_URL=None, TRAFFIC_CAPTURE_PATH=None)
+        coordination._backend = None
+        try:
+            with overrides:
+                yield
+        finally:
+            coordination._backend = None
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict["TEST"]["NAME"] = old_test_name
+
+
+def _percentiles(values) -> str:
+    if not values:
+        return "-"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50={p50:8.1f}ms p95={p95:8.1f}ms p99={p99:8.1f}ms"
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduz um arquivo de tráfego capturado (TRAFFIC_CAPTURE_PATH) contra um servidor local "
+        "com CoinMarketCap, NewsAPI e OpenAI simulados, e reporta vazão e percentis de latência. "
+        "O servidor usa um banco descartável: nada é gravado no banco configurado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("capture", help="Arquivo JSONL gravado pelo TrafficCaptureMiddleware")
+        parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador da taxa gravada (N×)")
+        parser.add_argument("--concurrency", type=int, default=32, help="Conexões simultâneas do cliente")
+        parser.add_argument("--port", type=int, default=0, help="Porta do servidor local (0 = livre)")
+        parser.add_argument("--openai-latency", type=float, default=0.8, help="Latência simulada da OpenAI (s)")
+        parser.add_argument("--upstream-latency", type=float, default=0.1, help="Latência simulada das demais APIs (s)")
+
+    def handle(self, *args, **options):
+        entries = sorted(load_capture(options["capture"]), key=lambda e: e["ts"])
+        if not entries:
+            raise CommandError("Arquivo de captura vazio.")
+        if options["speed"] <= 0:
+            raise CommandError("--speed deve ser positivo.")
+
+        with throwaway_state():
+            self.replay(entries, options)
+
+    def replay(self, entries, options):
+        # Nenhuma chamada sai da máquina: todos os clientes usam o transporte simulado
+        upstream_calls = Counter()
+        use_transport(stub_transport(
+            {"api.openai.com": options["openai_latency"]},
+            default_latency=options["upstream_latency"],
+            calls=upstream_calls,
+        ))
+        for key in ("OPENAI_API_KEY", "COINMARKETCAP_API_KEY", "NEWS_API_KEY"):
+            if not getattr(settings, key, None):
+                setattr(settings, key, "replay")
+
+        server = ThreadedWSGIServer(("127.0.0.1", options["port"]), QuietHandler)
+        server.set_app(get_internal_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        client = httpx.Client(base_url=base_url, timeout=120.0)
+        csrf_token = None
+        if any(e["method"] == "POST" for e in entries):
+            client.get("/dashboard/")
+            csrf_token = client.cookies.get("csrftoken")
+
+        latencies = defaultdict(list)
+        statuses = Counter()
+
+        def send(entry, scheduled):
+            try:
+                if entry["method"] == "POST":
+                    response = client.post(
+                        entry["path"],
+                        data={"symbol": entry.get("input", "")},
+                        headers={"X-CSRFToken": csrf_token or ""},
+                    )
+                else:
+                    response = client.get(entry["path"], params=entry.get("query") or {})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            # Medida a partir do horário agendado: a espera por uma conexão livre também conta
+            latencies[entry["view"]].append((time.perf_counter() - scheduled) * 1000)
+            statuses[status] += 1
+
+        first = entries[0]["ts"]
+        self.stdout.write(f"Reproduzindo {len(entries)} requisições a {options['speed']:g}× em {base_url}")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            for entry in entries:
+                scheduled = start + (entry["ts"] - first) / options["speed"]
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, entry, scheduled)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+        recorded_span = max(entries[-1]["ts"] - first, 1e-9)
+        all_latencies = [v for values in latencies.values() for v in values]
+        recorded = [e["duration_ms"] for e in entries]
+        self.stdout.write(
+            f"vazão        {len(entries) / elapsed:8.2f} req/s em {elapsed:.1f}s "
+            f"(gravado {len(entries) / recorded_span:.2f} req/s)"
+        )
+        self.stdout.write(f"latência     {_percentiles(all_latencies)}")
+        self.stdout.write(f"gravado      {_percentiles(recorded)}")
+        for view, values in sorted(latencies.items()):
+            self.stdout.write(f"  {view:<14} n={len(values):<5} {_percentiles(values)}")
+        self.stdout.write("status       " + " ".join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str)))
+        recorded_upstream = Counter()
+        for entry in entries:
+            recorded_upstream.update(entry.get("upstream", {}))
+        self.stdout.write("upstream     " + " ".join(f"{k}={v}" for k, v in sorted(upstream_calls.items())))
+        self.stdout.write("gravado      " + " ".join(f"{k}={v}" for k, v in sorted(recorded_upstream.items())))
@@ -0,0 +1,58 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Executado em um processo novo a cada rodada, para medir o início a frio
+PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crypto_project.settings")
+import django
+django.setup()
+t1 = time.perf_counter()
+import crypto_project.urls, crypto_app.views
+t2 = time.perf_counter()
+from django.test import Client
+response = Client().get(sys.argv[1], HTTP_HOST="localhost")
+t3 = time.perf_counter()
+heavy = [m for m in ("openai", "httpx", "pydantic", "numpy") if m in sys.modules]
+print(json.dumps({
+    "setup": t1 - t0,
+    "import_views": t2 - t1,
+    "first_request": t3 - t2,
+    "status": response.status_code,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Mede o tempo de inicialização a frio: django.setup, import das views e primeira requisição"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/admin/login/", help="URL da primeira requisição")
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = []
+        for _ in range(options["runs"]):
+            output = subprocess.run(
+                [sys.executable, "-c", PROBE, options["path"]],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+        for key in ("setup", "import_views", "first_request"):
+            values = [r[key] * 1000 for r in results]
+            self.stdout.write(
+                f"{key:<14} median={statistics.median(values):8.1f}ms "
+                f"min={min(values):8.1f}ms max={max(values):8.1f}ms"
+            )
+        self.stdout.write(f"status={results[-1]['status']} heavy-modules={','.join(results[-1]['heavy_modules']) or '-'}")
@@ -0,0 +1,455 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+
+import httpx
+import numpy as np
+from django.conf import settings
+
+from crypto_app.clients import http_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LISTINGS_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
+
+# Campos numéricos de cada moeda, guardados como colunas float64
+COIN_FIELDS = (
+    "id",
+    "cmc_rank",
+    "num_market_pairs",
+    "circulating_supply",
+    "total_supply",
+    "max_supply",
+    "self_reported_circulating_supply",
+    "self_reported_market_cap",
+    "unlocked_market_cap",
+    "unlocked_circulating_supply",
+)
+INT_FIELDS = ("id", "cmc_rank", "num_market_pairs")
+# Campos de cada objeto "quote", uma coluna por moeda de conversão
+QUOTE_FIELDS = (
+    "price",
+    "volume_24h",
+    "volume_change_24h",
+    "volume_7d",
+    "volume_30d",
+    "percent_change_1h",
+    "percent_change_24h",
+    "percent_change_7d",
+    "percent_change_30d",
+    "percent_change_60d",
+    "percent_change_90d",
+    "market_cap",
+    "market_cap_dominance",
+    "fully_diluted_market_cap",
+)
+
+# Parâmetros *_min/*_max do listings_latest -> (origem, coluna). Valores de
+# mercado são sempre comparados em USD, como na API.
+RANGE_FILTERS = {
+    "price": ("quote", "price"),
+    "market_cap": ("quote", "market_cap"),
+    "volume_24h": ("quote", "volume_24h"),
+    "percent_change_24h": ("quote", "percent_change_24h"),
+    "circulating_supply": ("coin", "circulating_supply"),
+    "self_reported_circulating_supply": ("coin", "self_reported_circulating_supply"),
+    "self_reported_market_cap": ("coin", "self_reported_market_cap"),
+    "unlocked_market_cap": ("coin", "unlocked_market_cap"),
+    "unlocked_circulating_supply": ("coin", "unlocked_circulating_supply"),
+}
+FILTER_CURRENCY = "USD"
+
+LISTINGS_PARAMS = {
+    "start",
+    "limit",
+    "convert",
+    "sort",
+    "sort_dir",
+    "cryptocurrency_type",
+    "tag",
+} | {f"{param}_{bound}" for param in RANGE_FILTERS for bound in ("min", "max")}
+
+
+def _column(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class MarketSnapshot:
+    """Universo acompanhado do CoinMarketCap em colunas NumPy.
+
+    Cada moeda ocupa uma linha; `index` mapeia símbolo -> linha (a de melhor
+    ranking quando o símbolo se repete). Filtros, ordenações e paginação do
+    listings_latest são avaliados de forma vetorizada e os itens são
+    reconstruídos no mesmo formato (e ordem de campos) da resposta da API.
+    """
+
+    def __init__(
+        self,
+        coins: dict[str, np.ndarray],
+        quotes: dict[str, dict[str, np.ndarray]],
+        meta: list[dict[str, Any]],
+        fetched_at: float,
+        item_keys: Optional[list[str]] = None,
+        quote_keys: Optional[list[str]] = None,
+    ):
+        self.coins = coins
+        self.quotes = quotes
+        self.meta = meta
+        self.fetched_at = fetched_at
+        self.item_keys = item_keys or (list(meta[0]) + list(coins) + ["quote"] if meta else [])
+        self.quote_keys = quote_keys or list(QUOTE_FIELDS) + ["last_updated"]
+        self.symbols = np.array([m["symbol"] for m in meta], dtype=object)
+        self.is_token = np.array([m.get("platform") is not None for m in meta], dtype=bool)
+        self._tag_masks: dict[str, np.ndarray] = {}
+        # Versão publicada no arquivo compartilhado (ver shared_snapshot.py)
+        self.generation = 0
+        self.index: dict[str, int] = {}
+        for row in np.argsort(coins["cmc_rank"], kind="stable"):
+            self.index.setdefault(meta[row]["symbol"], int(row))
+
+    @staticmethod
+    def listing_columns(items: Iterable[dict], converts: list[str]) -> dict[str, Any]:
+        """Colunas (listas) e metadados dos itens da listagem, em uma única passada.
+
+        Aceita um iterador (ex.: jsonstream.iter_data): cada item pode ser
+        descartado logo depois de lido. O resultado é serializável em JSON.
+        """
+        coins: dict[str, list] = {field: [] for field in COIN_FIELDS}
+        quotes: dict[str, dict[str, list]] = {
+            convert: {field: [] for field in QUOTE_FIELDS} for convert in converts
+        }
+        meta = []
+        item_keys = quote_keys = None
+        for item in items:
+            if item_keys is None:
+                item_keys = list(item)
+                if converts and converts[0] in item["quote"]:
+                    quote_keys = list(item["quote"][converts[0]])
+            for field, column in coins.items():
+                column.append(item.get(field))
+            for convert, columns in quotes.items():
+                quote = item["quote"].get(convert, {})
+                for field, column in columns.items():
+                    column.append(quote.get(field))
+            # Demais campos (nome, tags, platform, datas...) ficam como vieram da API
+            meta.append({k: v for k, v in item.items() if k not in COIN_FIELDS and k != "quote"})
+        return {"coins": coins, "quotes": quotes, "meta": meta, "item_keys": item_keys, "quote_keys": quote_keys}
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, Any]) -> "MarketSnapshot":
+        return cls(
+            {field: _column(values) for field, values in columns["coins"].items()},
+            {
+                convert: {field: _column(values) for field, values in quote.items()}
+                for convert, quote in columns["quotes"].items()
+            },
+            columns["meta"],
+            time.time(),
+            columns["item_keys"],
+            columns["quote_keys"],
+        )
+
+    @classmethod
+    def from_listings(cls, payload: dict, converts: list[str]) -> "MarketSnapshot":
+        return cls.from_columns(cls.listing_columns(payload.get("data", []), converts))
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    @property
+    def converts(self) -> list[str]:
+        return list(self.quotes)
+
+    def row(self, symbol: str) -> Optional[int]:
+        return self.index.get(symbol.upper())
+
+    def _filter_column(self, param: str) -> np.ndarray:
+        source, field = RANGE_FILTERS[param]
+        if source == "quote":
+            return self.quotes[FILTER_CURRENCY][field]
+        return self.coins[field]
+
+    def mask(self, params: dict) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for param in RANGE_FILTERS:
+            low, high = params.get(f"{param}_min"), params.get(f"{param}_max")
+            if low is None and high is None:
+                continue
+            column = self._filter_column(param)
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+
+        cryptocurrency_type = params.get("cryptocurrency_type") or "all"
+        if cryptocurrency_type == "coins":
+            mask &= ~self.is_token
+        elif cryptocurrency_type == "tokens":
+            mask &= self.is_token
+
+        tag = params.get("tag") or "all"
+        if tag != "all":
+            mask &= self.tag_mask(tag)
+        return mask
+
+    def tag_mask(self, tag: str) -> np.ndarray:
+        if tag not in self._tag_masks:
+            self._tag_masks[tag] = np.array(
+                [tag in (m.get("tags") or ()) for m in self.meta], dtype=bool
+            )
+        return self._tag_masks[tag]
+
+    def sort_key(self, sort: str) -> np.ndarray:
+        usd = self.quotes[FILTER_CURRENCY]
+        if sort == "market_cap":
+            # Ordem de ranking do CoinMarketCap
+            return -self.coins["cmc_rank"]
+        if sort == "market_cap_strict":
+            return usd["price"] * self.coins["circulating_supply"]
+        if sort == "market_cap_by_total_supply_strict":
+            return usd["price"] * self.coins["total_supply"]
+        if sort in usd:
+            return usd[sort]
+        if sort in self.coins:
+            return self.coins[sort]
+        return np.array([m.get(sort) or "" for m in self.meta], dtype=object)
+
+    def select(self, params: dict) -> np.ndarray:
+        """Linhas que atendem aos parâmetros do listings_latest, já ordenadas e paginadas"""
+        rows = np.flatnonzero(self.mask(params))
+        key = self.sort_key(params.get("sort") or "market_cap")[rows]
+        descending = (params.get("sort_dir") or "desc") == "desc"
+        if key.dtype == object:
+            order = np.argsort(key, kind="stable")
+            if descending:
+                order = order[::-1]
+        else:
+            # NaN sempre no fim, como na API
+            missing = np.isnan(key)
+            values = np.where(missing, 0, key)
+            order = np.lexsort((-values if descending else values, missing))
+        start = max(int(params.get("start") or 1), 1) - 1
+        limit = int(params.get("limit") or 100)
+        return rows[order][start:start + limit]
+
+    def record(self, row: int, converts: Optional[list[str]] = None) -> dict[str, Any]:
+        """Reconstrói o item no formato da API a partir das colunas"""
+        values = dict(self.meta[row])
+        for field, column in self.coins.items():
+            value = column[row]
+            if np.isnan(value):
+                values[field] = None
+            else:
+                values[field] = int(value) if field in INT_FIELDS else float(value)
+        quote = {}
+        for convert in converts or self.converts:
+            columns = self.quotes[convert]
+            quote[convert] = {}
+            for key in self.quote_keys:
+                if key in columns:
+                    value = columns[key][row]
+                    quote[convert][key] = None if np.isnan(value) else float(value)
+                elif key == "last_updated":
+                    quote[convert][key] = self.meta[row].get("last_updated")
+                else:
+                    quote[convert][key] = None
+        values["quote"] = quote
+        return {key: values.get(key) for key in self.item_keys}
+
+    def ensure_converts(self, converts: list[str]) -> bool:
+        """Calcula localmente (ver fx.py) as moedas de conversão que o snapshot ainda não tem"""
+        from crypto_app import fx
+
+        for convert in converts:
+            if convert in self.quotes:
+                continue
+            if fx.BASE_CURRENCY not in self.quotes:
+                return False
+            rate = fx.usd_rate(convert, self)
+            if rate is None:
+                return False
+            self.quotes[convert] = fx.convert_columns(
+                self.quotes[fx.BASE_CURRENCY], rate, fx.usd_changes(convert, self)
+            )
+        return True
+
+    def can_serve(self, converts: list[str], params: Optional[dict] = None) -> bool:
+        if not self.ensure_converts(converts):
+            return False
+        if params is None:
+            return True
+        if FILTER_CURRENCY not in self.quotes or any(k not in LISTINGS_PARAMS for k in params):
+            return False
+        if len(self) >= settings.MARKET_SNAPSHOT_LIMIT and not self._holds_answer(params):
+            return False
+        # Filtros ou ordenações sobre campos que a listagem não trouxe ficam com a API
+        for param in RANGE_FILTERS:
+            if (f"{param}_min" in params or f"{param}_max" in params) and np.isnan(
+                self._filter_column(param)
+            ).all():
+                return False
+        sort = params.get("sort")
+        if sort in QUOTE_FIELDS and np.isnan(self.quotes[FILTER_CURRENCY][sort]).all():
+            return False
+        return True
+
+    def _holds_answer(self, params: dict) -> bool:
+        # Snapshot parcial: só as MARKET_SNAPSHOT_LIMIT primeiras do ranking. A resposta
+        # só é servida quando não depende das moedas de fora, que têm capitalização menor
+        # que qualquer linha do snapshot.
+        market_cap = self.quotes[FILTER_CURRENCY]["market_cap"]
+        low = params.get("market_cap_min")
+        if low is not None and not np.isnan(market_cap).all() and float(low) > np.nanmin(market_cap):
+            return True
+        # Na ordem do ranking, as primeiras N linhas que passam nos filtros são as mesmas
+        # do universo inteiro
+        if (params.get("sort") or "market_cap") != "market_cap" or (params.get("sort_dir") or "desc") != "desc":
+            return False
+        start = max(int(params.get("start") or 1), 1)
+        return np.count_nonzero(self.mask(params)) >= start - 1 + int(params.get("limit") or 100)
+
+    def listings(self, params: dict) -> dict[str, Any]:
+        converts = _split(params.get("convert")) or [FILTER_CURRENCY]
+        rows = self.select(params)
+        return {
+            "status": self._status(),
+            "data": [self.record(int(row), converts) for row in rows],
+        }
+
+    def quotes_latest(self, symbols: list[str], converts: list[str]) -> dict[str, Any]:
+        data = {}
+        for symbol in symbols:
+            row = self.row(symbol)
+            if row is not None:
+                data[symbol.upper()] = [self.record(row, converts)]
+        return {"status": self._status(), "data": data}
+
+    def _status(self) -> dict[str, Any]:
+        return {
+            "timestamp": datetime.fromtimestamp(self.fetched_at, timezone.utc).isoformat(),
+            "error_code": 0,
+            "error_message": None,
+            "elapsed": 0,
+            "credit_count": 0,
+            "notice": "served from local market snapshot",
+            "total_count": len(self),
+        }
+
+
+def _split(value: Optional[str]) -> list[str]:
+    return [v.strip().upper() for v in (value or "").split(",") if v.strip()]
+
+
+_snapshot: Optional[MarketSnapshot] = None
+_snapshot_lock = threading.Lock()
+_last_attempt = 0.0
+
+
+def refresh_snapshot() -> Optional[MarketSnapshot]:
+    """Baixa a listagem só em USD; as demais moedas são convertidas localmente.
+
+    Cada atualização custa 1 crédito a cada 200 moedas (MARKET_SNAPSHOT_LIMIT);
+    cada moeda extra no convert multiplicaria esse custo.
+
+    A resposta da API é compartilhada entre os nós (coordination.single_flight);
+    histórico de preços e alertas ficam só com o nó líder.
+    """
+    global _snapshot, _last_attempt
+    from crypto_app import coordination
+
+    from crypto_app.jsonstream import iter_data
+
+    def fetch():
+        # Lida em streaming direto para colunas: a resposta inteira nunca fica na memória
+        with http_client().stream(
+            "GET",
+            LISTINGS_URL,
+            headers={
+                "Accepts": "application/json",
+                "X-CMC_PRO_API_KEY": settings.COINMARKETCAP_API_KEY,
+            },
+            params={
+                "start": 1,
+                "limit": settings.MARKET_SNAPSHOT_LIMIT,
+                "convert": FILTER_CURRENCY,
+            },
+        ) as response:
+            response.raise_for_status()
+            return MarketSnapshot.listing_columns(iter_data(response.iter_bytes()), [FILTER_CURRENCY])
+
+    _last_attempt = time.time()
+    try:
+        columns = coordination.single_flight(
+            f"market:columns:{settings.MARKET_SNAPSHOT_LIMIT}", fetch, ttl=settings.MARKET_SNAPSHOT_TTL
+        )
+        snapshot = MarketSnapshot.from_columns(columns)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error("market-snapshot refresh-failed error=%s", e)
+        return _snapshot
+
+    if not snapshot.ensure_converts(settings.MARKET_SNAPSHOT_CONVERT):
+        logger.error("market-snapshot convert-failed converts=%s", ",".join(settings.MARKET_SNAPSHOT_CONVERT))
+    logger.info("market-snapshot refreshed coins=%d", len(snapshot))
+    _snapshot = snapshot
+    if not coordination.is_leader("market", 2 * settings.MARKET_SNAPSHOT_TTL):
+        return snapshot
+    try:
+        from crypto_app.charts import record_samples
+
+        record_samples(snapshot, settings.PRICE_HISTORY_LIMIT)
+    except Exception as e:
+        logger.error("market-snapshot price-history-failed error=%s", e)
+    if settings.ALERTS_ON_REFRESH:
+        try:
+            from crypto_app.alerts import evaluate_snapshot
+
+            evaluate_snapshot(snapshot)
+        except Exception as e:
+            logger.error("market-snapshot alerts-failed error=%s", e)
+    return snapshot
+
+
+def _refresh_in_background():
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is not None and time.time() - snapshot.fetched_at < settings.MARKET_SNAPSHOT_TTL:
+            return
+        refresh_snapshot()
+
+
+def get_snapshot() -> Optional[MarketSnapshot]:
+    """Snapshot atual do mercado, atualizado a cada MARKET_SNAPSHOT_TTL segundos.
+
+    Um snapshot vencido continua sendo servido enquanto a nova listagem é
+    baixada em segundo plano; só o primeiro acesso espera pela API.
+
+    Com MARKET_SHARED_PATH definido, lê o snapshot publicado pelo
+    `manage.py market_refresher`; só baixa por conta própria se o arquivo não
+    existir ou estiver parado há mais de MARKET_SHARED_MAX_AGE segundos.
+    """
+    if settings.MARKET_SHARED_PATH:
+        from crypto_app import shared_snapshot
+
+        shared = shared_snapshot.read(settings.MARKET_SHARED_PATH)
+        if shared_snapshot.is_fresh(shared, settings.MARKET_SHARED_MAX_AGE):
+            return shared
+        logger.warning("market-snapshot shared-file-stale path=%s", settings.MARKET_SHARED_PATH)
+
+    snapshot = _snapshot
+    now = time.time()
+    if snapshot is not None and now - snapshot.fetched_at < settings.MARKET_SNAPSHOT_TTL:
+        return snapshot
+    if now - _last_attempt < settings.MARKET_SNAPSHOT_TTL:
+        # Última tentativa (ou atualização em andamento) é recente; não insiste
+        return snapshot
+    if snapshot is not None:
+        if not _snapshot_lock.locked():
+            threading.Thread(target=_refresh_in_background, daemon=True).start()
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is not None:
+            return _snapshot
+        return refresh_snapshot()
@@ -0,0 +1,46 @@
+"""Contadores simples do processo (acertos de cache, chamadas evitadas, etc.)."""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters: dict[str, float] = defaultdict(float)
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> float:
+    return _counters.get(name, 0)
+
+
+def ratio(hits: str, misses: str) -> float:
+    total = get(hits) + get(misses)
+    return get(hits) / total if total else 0.0
+
+
+def snapshot() -> dict[str, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def record_prompt_cache(label: str, input_tokens: int, cached_tokens: int) -> None:
+    """Tokens de entrada servidos do cache de prompt do provedor vs. processados de novo"""
+    incr(f"prompt_cache.{label}.calls")
+    incr(f"prompt_cache.{label}.cached_tokens", cached_tokens)
+    incr(f"prompt_cache.{label}.uncached_tokens", max(input_tokens - cached_tokens, 0))
+
+
+def prompt_cache_ratios() -> dict[str, float]:
+    labels = {
+        name.split(".")[1] for name in snapshot() if name.startswith("prompt_cache.")
+    }
+    ratios = {
+        label: ratio(f"prompt_cache.{label}.cached_tokens", f"prompt_cache.{label}.uncached_tokens")
+        for label in sorted(labels)
+    }
+    cached = sum(get(f"prompt_cache.{label}.cached_tokens") for label in labels)
+    uncached = sum(get(f"prompt_cache.{label}.uncached_tokens") for label in labels)
+    ratios["total"] = cached / (cached + uncached) if cached + uncached else 0.0
+    return ratios
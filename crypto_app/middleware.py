@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import math
+import random
+import sys
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+
+from crypto_app import admission, metrics
+from crypto_app.clients import count_upstream_calls
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TrafficCaptureMiddleware:
+    """Grava as requisições das views em TRAFFIC_CAPTURE_VIEWS (anonimizadas) em JSONL.
+
+    Desativado quando TRAFFIC_CAPTURE_PATH não está definido. O arquivo serve
+    de entrada para `manage.py replay_traffic`.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_PATH:
+            raise MiddlewareNotUsed
+        from crypto_app.traffic import TrafficRecorder
+
+        self.get_response = get_response
+        self.recorder = TrafficRecorder(settings.TRAFFIC_CAPTURE_PATH)
+
+    def __call__(self, request):
+        started = time.time()
+        t0 = time.perf_counter()
+        with count_upstream_calls() as upstream:
+            response = self.get_response(request)
+        duration = time.perf_counter() - t0
+
+        match = request.resolver_match
+        if match is not None and match.url_name in settings.TRAFFIC_CAPTURE_VIEWS:
+            from crypto_app.traffic import capture_entry
+
+            self.recorder.write(capture_entry(request, response, started, duration, upstream))
+        return response
+
+
+class LedgerMiddleware:
+    """Registra custo e latência das requisições às views em LEDGER_VIEWS (ver ledger.py).
+
+    Fica antes do controle de admissão: as requisições descartadas também
+    entram no livro-razão.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from crypto_app import ledger
+
+        t0 = time.perf_counter()
+        with ledger.recording() as entry:
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - t0) * 1000
+
+        match = request.resolver_match
+        if match is None or match.url_name not in settings.LEDGER_VIEWS:
+            return response
+        try:
+            ledger.save(entry, request, response, duration_ms)
+            if random.random() < settings.LEDGER_PRUNE_PROBABILITY:
+                ledger.prune()
+        except Exception as e:
+            logger.error("ledger save-failed path=%s error=%s", request.path, e)
+        return response
+
+
+class AdmissionControlMiddleware:
+    """Limita a concorrência por grupo de rotas e a taxa por cliente (ver admission.py).
+
+    Requisições descartadas recebem o último resultado em cache para a mesma
+    entrada, quando houver, ou 503/429 com Retry-After.
+
+    Fica depois do CsrfViewMiddleware e do AuthenticationMiddleware: um POST
+    sem token CSRF é recusado antes de gastar tokens ou vaga no grupo, e o
+    bucket pode ser o do usuário.
+    """
+
+    JSON_VIEWS = {"get_chart_data", "news_search"}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        pool = getattr(request, "_admission_pool", None)
+        if pool is not None:
+            pool.release()
+            if pool.name == "expensive":
+                self._store(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = admission.route_pool(request.resolver_match.url_name, request.method)
+        if name is None:
+            return None
+
+        retry_after = admission.get_buckets(name).take(admission.client_key(request))
+        if retry_after:
+            return self._shed(request, name, "rate_limited", retry_after)
+
+        pool = admission.get_pool(name)
+        started = time.monotonic()
+        reason = pool.acquire()
+        if reason is not None:
+            return self._shed(request, name, reason, pool.wait)
+        metrics.incr(f"admission.{name}.admitted")
+        metrics.incr(f"admission.{name}.wait_seconds", time.monotonic() - started)
+        request._admission_pool = pool
+        return None
+
+    @staticmethod
+    def _result_key(request) -> str:
+        items = sorted((k, v) for k, v in request.POST.items() if k != "csrfmiddlewaretoken")
+        items += sorted(request.GET.items())
+        digest = hashlib.sha1(repr((request.resolver_match.url_name, items)).encode()).hexdigest()
+        return f"admission:result:{digest}"
+
+    def _store(self, request, response) -> None:
+        # Páginas com token CSRF são de uma sessão só e não podem ser reaproveitadas
+        if response.status_code != 200 or getattr(response, "streaming", False):
+            return
+        if b"csrfmiddlewaretoken" in response.content:
+            return
+        cache.set(
+            self._result_key(request),
+            (response.content, response["Content-Type"]),
+            settings.ADMISSION_CACHE_SECONDS,
+        )
+
+    def _shed(self, request, name: str, reason: str, retry_after: float):
+        metrics.incr(f"admission.{name}.shed.{reason}")
+        cached = cache.get(self._result_key(request))
+        if cached is not None:
+            metrics.incr(f"admission.{name}.served_cached")
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Admission"] = "cached"
+            return response
+
+        status = 429 if reason == "rate_limited" else 503
+        message = "Muitas requisições no momento. Tente novamente em instantes."
+        url_name = request.resolver_match.url_name
+        if url_name in self.JSON_VIEWS:
+            response = JsonResponse({"success": False, "error": message}, status=status)
+        elif url_name == "dashboard":
+            from crypto_app.forms import CryptoAnalysisForm
+
+            form = CryptoAnalysisForm(request.POST or None)
+            response = render(request, "crypto_app/dashboard.html", {"form": form, "error": message}, status=status)
+        else:
+            response = HttpResponse(message, content_type="text/plain; charset=utf-8", status=status)
+        response["Retry-After"] = str(max(math.ceil(retry_after), 1))
+        return response
+
+
+class ProfilingMiddleware:
+    """Perfil estatístico das requisições amostradas ou pedidas por staff (ver profiling.py).
+
+    Fica depois do AuthenticationMiddleware: o cabeçalho X-Profile só vale
+    para usuários staff. A resposta perfilada leva o id do RequestProfile em
+    X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        from crypto_app import profiling
+
+        with profiling.profile(settings.PROFILE_INTERVAL_MS / 1000, sys._getframe()) as result:
+            response = self.get_response(request)
+        try:
+            profile = self._store(request, response, trigger, result)
+        except Exception as e:
+            logger.error("profiling store-failed path=%s error=%s", request.path, e)
+            return response
+        response["X-Profile-Id"] = str(profile.id)
+        return response
+
+    @staticmethod
+    def _trigger(request):
+        if request.headers.get("X-Profile") and request.user.is_staff:
+            return "requested"
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    @staticmethod
+    def _store(request, response, trigger, result):
+        from crypto_app.models import RequestProfile
+
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            user=request.user if request.user.is_authenticated else None,
+            trigger=trigger,
+            method=request.method,
+            path=request.path[:500],
+            url_name=(match.url_name or "") if match is not None else "",
+            status_code=response.status_code,
+            duration_ms=result["duration_ms"],
+            interval_ms=settings.PROFILE_INTERVAL_MS,
+            samples=result["samples"],
+            stacks=result["stacks"],
+            timeline=result["timeline"],
+        )
+        metrics.incr(f"profiling.{trigger}")
+        logger.info(
+            "profiling stored id=%d path=%s duration-ms=%.0f samples=%d",
+            profile.id, request.path, result["duration_ms"], result["samples"],
+        )
+        # Mantém só os PROFILE_KEEP mais recentes
+        RequestProfile.objects.filter(id__lte=profile.id - settings.PROFILE_KEEP).delete()
+        return profile
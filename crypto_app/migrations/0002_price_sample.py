@@ -0,0 +1,34 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CryptoAnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analysis_summary', models.TextField()),
+                ('raw_data', models.JSONField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('convert', models.CharField(default='BRL', max_length=10)),
+                ('timestamp', models.BigIntegerField()),
+                ('price', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['symbol', 'convert', 'timestamp'], name='crypto_app__symbol_355c42_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_app', '0002_price_sample'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('convert', models.CharField(default='BRL', max_length=10)),
+                ('kind', models.CharField(choices=[('price_above', 'Preço acima de'), ('price_below', 'Preço abaixo de'), ('change_above', 'Variação 24h acima de (%)'), ('change_below', 'Variação 24h abaixo de (%)'), ('risk_above', 'Risco acima de (0-1)')], max_length=20)),
+                ('threshold', models.FloatField(blank=True, null=True)),
+                ('refresh_analysis', models.BooleanField(default=False)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TriggeredAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('triggered_at', models.DateTimeField(auto_now_add=True)),
+                ('value', models.FloatField()),
+                ('snapshot_timestamp', models.BigIntegerField()),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='triggers', to='crypto_app.pricealert')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['active', 'symbol'], name='crypto_app__active_1e7480_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_app', '0004_request_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('route', models.CharField(max_length=100)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('query', models.CharField(blank=True, max_length=255)),
+                ('symbol', models.CharField(blank=True, max_length=50)),
+                ('duration_ms', models.FloatField()),
+                ('upstream_calls', models.PositiveIntegerField(default=0)),
+                ('upstream_ms', models.FloatField(default=0)),
+                ('bytes_in', models.BigIntegerField(default=0)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('cached_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('cmc_credits', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.FloatField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=20)),
+                ('host', models.CharField(max_length=100)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=200)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('start_ms', models.FloatField()),
+                ('duration_ms', models.FloatField()),
+                ('bytes_in', models.BigIntegerField(default=0)),
+                ('model', models.CharField(blank=True, max_length=50)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('cached_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('cmc_credits', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.FloatField(default=0)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calls', to='crypto_app.ledgerrequest')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerrequest',
+            index=models.Index(fields=['route', 'created_at'], name='crypto_app__route_e116e3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerrequest',
+            index=models.Index(fields=['symbol', 'created_at'], name='crypto_app__symbol_527fa2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgercall',
+            index=models.Index(fields=['service'], name='crypto_app__service_d1da90_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class CryptoAnalysis(models.Model):
@@ -21,5 +22,135 @@ class CryptoAnalysisResult(models.Model):
     
     def __str__(self):
         return f"{self.analysis_summary}"
-    
-     
\ No newline at end of file
+
+
+class PriceSample(models.Model):
+    symbol = models.CharField(max_length=20)
+    convert = models.CharField(max_length=10, default='BRL')
+    timestamp = models.BigIntegerField()  # epoch em segundos
+    price = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['symbol', 'convert', 'timestamp'])]
+
+    def __str__(self):
+        return f"{self.symbol}/{self.convert} {self.price} @ {self.timestamp}"
+
+
+class PriceAlert(models.Model):
+    KIND_CHOICES = [
+        ('price_above', 'Preço acima de'),
+        ('price_below', 'Preço abaixo de'),
+        ('change_above', 'Variação 24h acima de (%)'),
+        ('change_below', 'Variação 24h abaixo de (%)'),
+        ('risk_above', 'Risco acima de (0-1)'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='price_alerts')
+    symbol = models.CharField(max_length=20)
+    convert = models.CharField(max_length=10, default='BRL')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    threshold = models.FloatField(null=True, blank=True)  # vazio em risk_above = RISK_THRESHOLD
+    refresh_analysis = models.BooleanField(default=False)  # refaz a análise da moeda ao disparar
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    last_triggered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['active', 'symbol'])]
+
+    def __str__(self):
+        return f"{self.symbol} {self.get_kind_display()} {self.threshold}"
+
+
+class TriggeredAlert(models.Model):
+    alert = models.ForeignKey(PriceAlert, on_delete=models.CASCADE, related_name='triggers')
+    triggered_at = models.DateTimeField(auto_now_add=True)
+    value = models.FloatField()
+    snapshot_timestamp = models.BigIntegerField()  # fetched_at do snapshot avaliado
+
+    def __str__(self):
+        return f"{self.alert} -> {self.value}"
+
+
+class RequestProfile(models.Model):
+    """Perfil estatístico de uma requisição (crypto_app/profiling.py)"""
+    TRIGGER_CHOICES = [
+        ('sampled', 'Amostragem'),
+        ('requested', 'Cabeçalho X-Profile'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    url_name = models.CharField(max_length=100, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    interval_ms = models.FloatField()
+    samples = models.PositiveIntegerField()
+    stacks = models.JSONField()  # pilha "raiz;...;folha" -> amostras
+    timeline = models.JSONField()  # chamadas externas e spans, em ms desde o início
+
+    class Meta:
+        indexes = [models.Index(fields=['url_name', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.duration_ms:.0f}ms"
+
+
+class LedgerRequest(models.Model):
+    """Custo e latência de uma requisição, com os totais das chamadas externas (crypto_app/ledger.py)"""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    route = models.CharField(max_length=100)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    query = models.CharField(max_length=255, blank=True)  # símbolo ou pergunta enviada
+    symbol = models.CharField(max_length=50, blank=True)  # moeda(s) a que o custo é atribuído
+    duration_ms = models.FloatField()
+    upstream_calls = models.PositiveIntegerField(default=0)
+    upstream_ms = models.FloatField(default=0)
+    bytes_in = models.BigIntegerField(default=0)
+    input_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cmc_credits = models.PositiveIntegerField(default=0)
+    cost_usd = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['route', 'created_at']),
+            models.Index(fields=['symbol', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.duration_ms:.0f}ms ${self.cost_usd:.4f}"
+
+
+class LedgerCall(models.Model):
+    """Uma chamada externa (OpenAI, CoinMarketCap, NewsAPI...) feita durante a requisição"""
+    request = models.ForeignKey(LedgerRequest, on_delete=models.CASCADE, related_name='calls')
+    service = models.CharField(max_length=20)
+    host = models.CharField(max_length=100)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=200)
+    status_code = models.PositiveSmallIntegerField()
+    start_ms = models.FloatField()  # desde o início da requisição
+    duration_ms = models.FloatField()
+    bytes_in = models.BigIntegerField(default=0)
+    model = models.CharField(max_length=50, blank=True)
+    input_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cmc_credits = models.PositiveIntegerField(default=0)
+    cost_usd = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['service'])]
+
+    def __str__(self):
+        return f"{self.service} {self.method} {self.path} {self.duration_ms:.0f}ms"
@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+
+from crypto_app.clients import http_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url_hash TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    content TEXT,
+    source TEXT,
+    published_at TEXT,
+    published_ts INTEGER,
+    symbols TEXT,
+    ingested_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS articles_published_ts ON articles (published_ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (
+    title, description, content, symbols,
+    content='articles', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, description, content, symbols)
+    VALUES (new.id, new.title, new.description, new.content, new.symbols);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, description, content, symbols)
+    VALUES ('delete', old.id, old.title, old.description, old.content, old.symbols);
+END;
+"""
+
+COLUMNS = ("url", "title", "description", "source", "published_at", "symbols")
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()
+
+
+def _content_hash(title: str, description: str) -> str:
+    # Mesma notícia republicada por outro veículo costuma repetir título e resumo
+    text = " ".join(re.sub(r"\W+", " ", f"{title} {description}".lower()).split())
+    return _hash(text)
+
+
+def _quote(term: str) -> str:
+    # String do FTS5: aspas internas são dobradas
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _match_expression(query: str) -> str:
+    # Cada palavra entre aspas evita que a sintaxe do FTS5 vaze da pergunta
+    words = re.findall(r"\w+", query)
+    return " OR ".join(_quote(w) for w in words)
+
+
+class NewsIndex:
+    """Índice local de notícias em SQLite FTS5, com deduplicação por URL e conteúdo"""
+
+    def __init__(self, path):
+        self._path = str(path)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, articles: Iterable[dict[str, Any]]) -> int:
+        from crypto_app.agents.intents import find_symbols
+
+        rows = []
+        now = int(time.time())
+        for article in articles:
+            url = article.get("url")
+            title = article.get("title") or ""
+            if not url or not title or title == "[Removed]":
+                continue
+            description = article.get("description") or ""
+            published_at = article.get("publishedAt")
+            published_ts = None
+            if published_at:
+                published_ts = int(datetime.fromisoformat(published_at.replace("Z", "+00:00")).timestamp())
+            rows.append((
+                _hash(url),
+                _content_hash(title, description),
+                url,
+                title,
+                description,
+                article.get("content") or "",
+                (article.get("source") or {}).get("name"),
+                published_at,
+                published_ts,
+                " ".join(find_symbols(f"{title} {description}")),
+                now,
+            ))
+        with self._connection() as conn:
+            # rowcount não conta as linhas que os gatilhos gravam no índice FTS
+            cursor = conn.executemany(
+                """INSERT OR IGNORE INTO articles (url_hash, content_hash, url, title, description,
+                content, source, published_at, published_ts, symbols, ingested_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            return cursor.rowcount
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        symbol: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 10,
+    ) -> list[dict[str, Any]]:
+        """Busca por palavra-chave (ranking BM25), símbolo e data mínima de publicação"""
+        terms = []
+        if query and _match_expression(query):
+            terms.append(f"({_match_expression(query)})")
+        if symbol:
+            terms.append(f"symbols : {_quote(symbol.upper())}")
+
+        where, params = [], []
+        if since is not None:
+            where.append("a.published_ts >= ?")
+            params.append(int(since))
+
+        if terms:
+            sql = f"""SELECT a.* FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+                WHERE articles_fts MATCH ? {''.join(' AND ' + w for w in where)}
+                ORDER BY bm25(articles_fts), a.published_ts DESC LIMIT ?"""
+            params = [" AND ".join(terms), *params, limit]
+        else:
+            sql = f"""SELECT a.* FROM articles a {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY a.published_ts DESC LIMIT ?"""
+            params = [*params, limit]
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return [{column: row[column] for column in COLUMNS} for row in rows]
+
+    def latest_published_ts(self) -> Optional[int]:
+        row = self._connection().execute("SELECT MAX(published_ts) FROM articles").fetchone()
+        return row[0]
+
+
+_index: Optional[NewsIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> NewsIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NewsIndex(settings.NEWS_INDEX_PATH)
+    return _index
+
+
+def ingest_news(pages: int = 1) -> int:
+    """Baixa as notícias mais recentes da NewsAPI para o índice local"""
+    import httpx
+    from crypto_app import coordination
+
+    index = get_index()
+    latest = index.latest_published_ts()
+    params = {
+        "q": settings.NEWS_INGEST_QUERY,
+        "apiKey": settings.NEWS_API_KEY,
+        "language": "en",
+        "sortBy": "publishedAt",
+        "pageSize": 100,
+    }
+    if latest is not None:
+        params["from"] = datetime.fromtimestamp(latest, timezone.utc).isoformat()
+
+    def fetch(page):
+        response = http_client().get(NEWS_API_URL, params={**params, "page": page})
+        response.raise_for_status()
+        return response.json()
+
+    added = 0
+    for page in range(1, pages + 1):
+        # Cada nó tem o seu índice, mas a página é baixada uma vez só para todos;
+        # artigos repetidos são descartados pelo índice
+        try:
+            payload = coordination.single_flight(
+                f"news:{settings.NEWS_INGEST_QUERY}:{page}", lambda: fetch(page), ttl=settings.NEWS_SHARED_TTL
+            )
+        except httpx.HTTPError as e:
+            logger.error("news-ingest page=%d failed error=%s", page, e)
+            break
+        articles = payload.get("articles", [])
+        added += index.add(articles)
+        if len(articles) < params["pageSize"]:
+            break
+    logger.info("news-ingest added=%d", added)
+    return added
+
+
+def search_news(
+    query: Optional[str] = None,
+    symbol: Optional[str] = None,
+    days: Optional[float] = None,
+    limit: int = 5,
+) -> list[dict[str, Any]]:
+    since = time.time() - days * 86400 if days else None
+    try:
+        return get_index().search(query, symbol, since, limit)
+    except sqlite3.OperationalError as e:
+        logger.error("news-search failed query=%r symbol=%r error=%s", query, symbol, e)
+        return []
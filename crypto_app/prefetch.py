@@ -0,0 +1,135 @@
+"""Pré-busca especulativa a partir do campo de símbolo do dashboard.
+
+Enquanto o usuário digita (com debounce no navegador), /dashboard/prefetch/
+resolve o símbolo e deixa a cotação e os metadados no cache compartilhado
+(single_flight). Opcionalmente começa a análise em segundo plano com
+prioridade "batch" (utils.llm_analysis): o POST seguinte chama
+create_analysis, que se junta a ela (espera a que está em andamento ou usa o
+resultado pronto) em vez de começar do zero. A especulação não grava nada:
+o CryptoAnalysis só é criado quando o POST a reivindica, e o resultado não
+reivindicado expira no cache compartilhado.
+
+Cada sessão tem um símbolo "desejado" no cache, válido por
+PREFETCH_ABANDON_SECONDS. A especulação é abandonada (governor.Cancelled,
+sem gastar o orçamento da OpenAI) quando o usuário passa a outro símbolo,
+envia uma pergunta livre ou some sem enviar. Uma chamada já em andamento na
+OpenAI não é interrompida, mas a resposta dela é descartada. No máximo PREFETCH_MAX_SPECULATIONS análises
+especulativas rodam ao mesmo tempo por processo.
+"""
+import logging
+import threading
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from crypto_app import governor, metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_slots = threading.BoundedSemaphore(settings.PREFETCH_MAX_SPECULATIONS)
+
+
+def _session_key(request) -> str:
+    if not request.session.session_key:
+        request.session.save()
+    return f"prefetch:{request.session.session_key}"
+
+
+def resolve_symbol(text: str) -> Optional[str]:
+    """Ticker digitado (mesma regra do dashboard), se for um símbolo conhecido"""
+    from crypto_app.utils import get_known_symbols
+
+    text = text.strip()
+    if not text or len(text) > 6:
+        return None
+    symbol = text.upper()
+    known = get_known_symbols()
+    if known is not None and symbol not in known:
+        return None
+    return symbol
+
+
+def claim(request, symbol: Optional[str]) -> bool:
+    """Registra o envio do formulário; True se havia especulação para o mesmo símbolo.
+
+    Com outro símbolo (ou None, pergunta livre) a especulação da sessão é abandonada.
+    """
+    key = _session_key(request)
+    claimed = symbol is not None and cache.get(key) == symbol
+    if claimed:
+        # Mantém a especulação viva enquanto o POST espera por ela
+        cache.set(key, symbol, settings.PREFETCH_ABANDON_SECONDS)
+        metrics.incr("prefetch.claimed")
+    else:
+        cache.delete(key)
+    return claimed
+
+
+def _metadata(symbol: str) -> None:
+    from crypto_app.agents.coin_market_cap import CoinMarketAgent
+
+    agent = CoinMarketAgent(settings.OPENAI_API_KEY, settings.COINMARKETCAP_API_KEY)
+    agent._call_function("metadata", {"symbol": symbol})
+
+
+def _speculate(key: str, symbol: str, crypto_data: dict[str, Any]) -> None:
+    from django.db import connection
+    from crypto_app.utils import llm_analysis
+
+    def abandoned() -> bool:
+        return cache.get(key) != symbol
+
+    try:
+        with governor.priority("batch"), governor.cancel_when(abandoned):
+            result = llm_analysis(symbol, crypto_data, abandoned=abandoned)
+        metrics.incr("prefetch.speculation_done" if result is not None else "prefetch.speculation_dropped")
+        logger.info("prefetch speculation symbol=%s done=%s", symbol, result is not None)
+    except governor.Paused as e:
+        # Modelo pausado após 429: o POST decide se espera ou responde 503
+        metrics.incr("prefetch.speculation_dropped")
+        logger.info("prefetch speculation-paused symbol=%s error=%s", symbol, e)
+    finally:
+        _slots.release()
+        connection.close()
+
+
+def prefetch(request, text: str, speculate: bool = False) -> dict[str, Any]:
+    """Aquece cotação e metadados do símbolo digitado e, se pedido, especula a análise"""
+    from crypto_app.utils import get_crypto_data
+
+    metrics.incr("prefetch.requests")
+    symbol = resolve_symbol(text)
+    key = _session_key(request)
+    if symbol is None:
+        # Pergunta livre ainda sendo digitada: nada a especular
+        cache.delete(key)
+        return {"symbol": None, "speculating": False}
+
+    crypto_data = get_crypto_data(symbol)
+    if not crypto_data:
+        cache.delete(key)
+        return {"symbol": symbol, "speculating": False}
+    try:
+        _metadata(symbol)
+    except Exception as e:
+        logger.error("prefetch metadata-failed symbol=%s error=%s", symbol, e)
+
+    result = {"symbol": symbol, "name": crypto_data.get("name"), "speculating": False}
+    if not (speculate and settings.PREFETCH_SPECULATE):
+        return result
+    if cache.get(key) == symbol:
+        # Já especulando (ou pronta) para esta sessão e símbolo: o usuário continua nele
+        cache.set(key, symbol, settings.PREFETCH_ABANDON_SECONDS)
+        return {**result, "speculating": True}
+
+    if not _slots.acquire(blocking=False):
+        cache.delete(key)
+        metrics.incr("prefetch.speculation_skipped")
+        return result
+    # O símbolo anterior da sessão deixa de ser o desejado: a especulação dele é abandonada
+    cache.set(key, symbol, settings.PREFETCH_ABANDON_SECONDS)
+    metrics.incr("prefetch.speculation_started")
+    threading.Thread(target=_speculate, args=(key, symbol, crypto_data), daemon=True).start()
+    return {**result, "speculating": True}
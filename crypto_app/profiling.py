@@ -0,0 +1,197 @@
+"""Perfil estatístico de requisições sob demanda.
+
+ProfilingMiddleware liga o perfil em uma fração PROFILE_SAMPLE_RATE das
+requisições ou quando um usuário staff manda o cabeçalho X-Profile. Nas
+demais o custo é um random() e a leitura de um cabeçalho.
+
+Com o perfil ligado, uma thread amostra a pilha da thread da requisição a
+cada PROFILE_INTERVAL_MS (sys._current_frames) e conta as pilhas no formato
+"folded" (raiz;...;folha -> amostras), o mesmo do flamegraph.pl e do
+speedscope. Junto vai a linha do tempo das chamadas externas
+(clients.record_upstream_calls) e dos trechos marcados com span() (rodadas
+do Agent.ask). O resultado é gravado em RequestProfile e desenhado no admin.
+"""
+import logging
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from django.utils.html import escape
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Trechos marcados (span) na requisição perfilada, se houver
+_spans: ContextVar[Optional[list]] = ContextVar("profile_spans", default=None)
+
+FLAME_WIDTH = 1200
+ROW_HEIGHT = 16
+# Retângulos mais estreitos que isso não são desenhados
+MIN_WIDTH = 0.5
+
+
+@contextmanager
+def span(label: str):
+    """Marca um trecho na linha do tempo da requisição perfilada (sem custo fora do perfil)"""
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append({"label": label, "start": started, "end": time.perf_counter()})
+
+
+def frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class Sampler(threading.Thread):
+    """Amostra a pilha de `thread_id` até o frame `root` (exclusive) a cada `interval` segundos"""
+
+    def __init__(self, thread_id: int, root, interval: float):
+        super().__init__(name="crypto-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame is not self.root:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            # A requisição pode ter terminado durante a amostra (pilha do próprio stop)
+            if names and not self._done.is_set():
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> dict[str, int]:
+        self._done.set()
+        self.join()
+        return dict(self.stacks)
+
+
+@contextmanager
+def profile(interval: float, root):
+    """Perfil do bloco, que roda na thread atual abaixo do frame `root`; o dicionário é preenchido na saída"""
+    from crypto_app.clients import record_upstream_calls
+
+    result: dict[str, Any] = {}
+    sampler = Sampler(threading.get_ident(), root, interval)
+    spans: list = []
+    token = _spans.set(spans)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        with record_upstream_calls() as upstream:
+            yield result
+    finally:
+        stacks = sampler.stop()
+        _spans.reset(token)
+        ended = time.perf_counter()
+        timeline = [
+            {"kind": "upstream", "label": f"{c['method']} {c['host']}{c['path']} {c['status']}",
+             "start": c["start"], "end": c["end"]}
+            for c in upstream
+        ] + [{"kind": "span", **s} for s in spans]
+        result.update({
+            "duration_ms": (ended - started) * 1000,
+            "samples": sum(stacks.values()),
+            "stacks": stacks,
+            "timeline": sorted(
+                ({**t, "start": (t["start"] - started) * 1000, "end": (t["end"] - started) * 1000} for t in timeline),
+                key=lambda t: t["start"],
+            ),
+        })
+
+
+def folded(stacks: dict[str, int]) -> str:
+    """Pilhas no formato texto do flamegraph.pl / speedscope"""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items()))
+
+
+def _tree(stacks: dict[str, int]) -> dict[str, Any]:
+    root = {"name": "total", "value": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["value"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"name": name, "value": 0, "children": {}})
+            node["value"] += count
+    return root
+
+
+def _color(name: str) -> str:
+    # Código do projeto em tons quentes; bibliotecas (django, httpx, openai...) em azul
+    shade = zlib.crc32(name.encode()) % 30
+    hue = 20 + shade if name.startswith("crypto_") else 200 + shade
+    return f"hsl({hue},70%,65%)"
+
+
+def flame_svg(stacks: dict[str, int]) -> str:
+    """Flame graph (raiz no topo) em SVG; o texto completo de cada quadro fica no <title>"""
+    root = _tree(stacks)
+    total = root["value"]
+    if not total:
+        return "<p>Nenhuma amostra.</p>"
+    rects, depth = [], 0
+
+    def draw(node, x, level):
+        nonlocal depth
+        width = node["value"] / total * FLAME_WIDTH
+        if width < MIN_WIDTH:
+            return
+        depth = max(depth, level + 1)
+        y = level * ROW_HEIGHT
+        label = escape(node["name"])
+        share = node["value"] / total * 100
+        rects.append(
+            f'<g><title>{label} ({node["value"]} amostras, {share:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{ROW_HEIGHT - 1}" fill="{_color(node["name"])}"/>'
+            + (f'<text x="{x + 3:.1f}" y="{y + 12}" font-size="11">{escape(node["name"][:int(width // 7)])}</text>'
+               if width > 35 else "")
+            + "</g>"
+        )
+        for child in sorted(node["children"].values(), key=lambda c: c["name"]):
+            draw(child, x, level + 1)
+            x += child["value"] / total * FLAME_WIDTH
+
+    draw(root, 0.0, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{depth * ROW_HEIGHT}" '
+        f'font-family="monospace">{"".join(rects)}</svg>'
+    )
+
+
+def timeline_svg(timeline: list[dict[str, Any]], duration_ms: float) -> str:
+    """Uma barra por chamada externa ou trecho marcado, na escala da requisição"""
+    if not timeline:
+        return "<p>Nenhuma chamada externa.</p>"
+    scale = FLAME_WIDTH / max(duration_ms, 1)
+    bars = []
+    for i, item in enumerate(timeline):
+        x = item["start"] * scale
+        width = max((item["end"] - item["start"]) * scale, 1)
+        y = i * ROW_HEIGHT
+        elapsed = item["end"] - item["start"]
+        label = escape(f"{item['label']} {elapsed:.0f}ms")
+        fill = "hsl(200,70%,65%)" if item["kind"] == "upstream" else "hsl(35,80%,65%)"
+        bars.append(
+            f'<g><title>{label} (início {item["start"]:.0f}ms)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{ROW_HEIGHT - 1}" fill="{fill}"/>'
+            f'<text x="{min(x, FLAME_WIDTH - 300) + 3:.1f}" y="{y + 12}" font-size="11">{label}</text></g>'
+        )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{len(timeline) * ROW_HEIGHT}" '
+        f'font-family="monospace">{"".join(bars)}</svg>'
+    )
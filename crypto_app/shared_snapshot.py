@@ -0,0 +1,149 @@
+"""Snapshot do mercado compartilhado entre processos por um arquivo mapeado em memória.
+
+`manage.py market_refresher` é o único processo que baixa a listagem; a cada
+atualização grava o arquivo MARKET_SHARED_PATH (de preferência em /dev/shm) e
+os workers o mapeiam com mmap. As colunas viram arrays NumPy sobre o próprio
+mapeamento (sem cópia), então memória e chamadas à API não crescem com o
+número de workers.
+
+Layout do arquivo (little-endian):
+
+    cabeçalho  HEADER (magia, versão do formato, linhas, colunas, fetched_at,
+               geração, offset/tamanho do blob JSON, offset dos dados)
+    blob JSON  nomes das colunas, metadados por moeda (nome, tags, platform...)
+               e ordem dos campos da resposta da API
+    dados      uma coluna float64 contígua por campo, alinhada em 64 bytes
+
+O arquivo é escrito ao lado e trocado com os.replace, então um leitor nunca vê
+uma escrita pela metade: quem já mapeou a versão anterior continua com ela até
+notar a troca (inode diferente) na próxima leitura.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from crypto_app import metrics
+from crypto_app.market import MarketSnapshot
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CMCSNAP\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIdQQQQ")
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _read_generation(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) == HEADER.size and header[:8] == MAGIC:
+            return HEADER.unpack(header)[5]
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def publish(snapshot: MarketSnapshot, path) -> int:
+    """Grava o snapshot no arquivo compartilhado e retorna a nova geração"""
+    path = str(path)
+    columns = [("coin", field) for field in snapshot.coins]
+    columns += [("quote", convert, field) for convert, quote in snapshot.quotes.items() for field in quote]
+    blob = json.dumps({
+        "columns": columns,
+        "meta": snapshot.meta,
+        "item_keys": snapshot.item_keys,
+        "quote_keys": snapshot.quote_keys,
+    }, ensure_ascii=False, separators=(",", ":")).encode()
+
+    rows = len(snapshot)
+    generation = _read_generation(path) + 1
+    data_offset = _align(HEADER.size + len(blob))
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, rows, len(columns), snapshot.fetched_at,
+        generation, HEADER.size, len(blob), data_offset,
+    )
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(blob)
+        f.write(b"\0" * (data_offset - HEADER.size - len(blob)))
+        for column in columns:
+            if column[0] == "coin":
+                values = snapshot.coins[column[1]]
+            else:
+                values = snapshot.quotes[column[1]][column[2]]
+            f.write(np.ascontiguousarray(values, dtype="<f8").tobytes())
+    os.replace(tmp, path)
+    logger.info("shared-snapshot published generation=%d coins=%d path=%s", generation, rows, path)
+    return generation
+
+
+def _map(path: str) -> Optional[MarketSnapshot]:
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, rows, n_columns, fetched_at, generation, blob_offset, blob_length, data_offset = (
+        HEADER.unpack_from(buffer)
+    )
+    if magic != MAGIC or version != FORMAT_VERSION:
+        logger.error("shared-snapshot unsupported-format path=%s version=%s", path, version)
+        return None
+    blob = json.loads(buffer[blob_offset:blob_offset + blob_length])
+
+    coins, quotes = {}, {}
+    for i, column in enumerate(blob["columns"]):
+        # Visão somente leitura sobre o mapeamento, sem cópia
+        values = np.frombuffer(buffer, dtype="<f8", count=rows, offset=data_offset + i * rows * 8)
+        if column[0] == "coin":
+            coins[column[1]] = values
+        else:
+            quotes.setdefault(column[1], {})[column[2]] = values
+
+    snapshot = MarketSnapshot(coins, quotes, blob["meta"], fetched_at, blob["item_keys"], blob["quote_keys"])
+    snapshot.generation = generation
+    metrics.incr("market_snapshot.shared_maps")
+    return snapshot
+
+
+_mapped: Optional[MarketSnapshot] = None
+_mapped_key: Optional[tuple] = None
+_lock = threading.Lock()
+
+
+def read(path) -> Optional[MarketSnapshot]:
+    """Snapshot publicado pelo refresher; remapeia só quando o arquivo é trocado"""
+    global _mapped, _mapped_key
+    path = str(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns)
+    if key == _mapped_key:
+        return _mapped
+    with _lock:
+        if key != _mapped_key:
+            try:
+                _mapped = _map(path)
+            except (OSError, ValueError, struct.error) as e:
+                logger.error("shared-snapshot map-failed path=%s error=%s", path, e)
+                return _mapped
+            _mapped_key = key
+    return _mapped
+
+
+def is_fresh(snapshot: Optional[MarketSnapshot], max_age: float) -> bool:
+    return snapshot is not None and time.time() - snapshot.fetched_at < max_age
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from crypto_app import fragments
+
+register = template.Library()
+
+
+@register.filter
+def sanitized_summary(analysis):
+    """Resumo de uma CryptoAnalysis já sanitizado (crypto_app/fragments.py).
+
+    As respostas diretas (answer_intent) chegam como dicionário com HTML dos
+    nossos templates e saem como vieram.
+    """
+    if isinstance(analysis, dict):
+        return mark_safe(analysis.get("analysis_summary", ""))
+    return mark_safe(fragments.summary_html(analysis))
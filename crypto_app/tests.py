@@ -1,3 +1,633 @@
-from django.test import TestCase
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from crypto_app import admission, alerts, backtest, coordination, fx, governor, history, shared_snapshot
+from crypto_app.market import MarketSnapshot
+from crypto_app.agents.router import classify
+from crypto_app.fragments import sanitize
+from crypto_app.jsonstream import iter_data, parse
+from crypto_app.models import CryptoAnalysis, PriceAlert, TriggeredAlert
+from crypto_app.news import NewsIndex
+
+
+class NewsIndexSearchTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = NewsIndex(Path(tmp.name) / "news.sqlite3")
+        self.index.add([{
+            "url": "https://example.com/eth",
+            "title": "ETH sobe após atualização da rede",
+            "description": "Ethereum avança",
+            "publishedAt": "2024-05-01T12:00:00Z",
+        }])
+
+    def test_symbol_filter(self):
+        self.assertEqual(len(self.index.search(symbol="eth")), 1)
+        self.assertEqual(self.index.search(symbol="BTC"), [])
+
+    def test_quotes_do_not_break_match_expression(self):
+        for symbol in ('E"TH', '"', '"" OR x'):
+            self.assertEqual(self.index.search(query='rede "atualização', symbol=symbol), [])
+
+
+class AnalysisIndexTests(TestCase):
+    def test_test_database_does_not_write_the_real_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            real = Path(tmp) / "analysis_index.sqlite3"
+            with override_settings(ANALYSIS_INDEX_PATH=real):
+                analysis = CryptoAnalysis.objects.create(
+                    symbol="BTC", name="Bitcoin", recommendation="buy", confidence=0.7,
+                    price_prediction={}, risk_level="low", analysis_summary="<p>Halving reduz a oferta</p>",
+                    raw_data={},
+                )
+                self.assertNotEqual(history.index_path(), str(real))
+                self.assertFalse(real.exists())
+                found = history.get_index().search("halving", ["BTC"])
+        self.assertEqual([row["id"] for row in found], [analysis.id])
+
+
+class AlertClaimTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="alertas")
+        self.alerts = [
+            PriceAlert.objects.create(user=user, symbol="BTC", kind="price_above", threshold=100 + i)
+            for i in range(3)
+        ]
+
+    def test_alert_triggers_once(self):
+        values = {a.id: 500.0 for a in self.alerts}
+        self.assertCountEqual(alerts._claim(values, timezone.now(), 1), values)
+        # Segundo avaliador com o mesmo snapshot: nada mais a disparar
+        self.assertEqual(alerts._claim(values, timezone.now(), 1), [])
+        self.assertEqual(TriggeredAlert.objects.count(), 3)
+        self.assertFalse(PriceAlert.objects.filter(active=True).exists())
+
+    def test_inactive_alerts_are_skipped(self):
+        PriceAlert.objects.filter(id=self.alerts[0].id).update(active=False)
+        claimed = alerts._claim({a.id: 500.0 for a in self.alerts}, timezone.now(), 1)
+        self.assertCountEqual(claimed, [self.alerts[1].id, self.alerts[2].id])
+        self.assertFalse(TriggeredAlert.objects.filter(alert_id=self.alerts[0].id).exists())
+
+
+class LocalBackendTests(SimpleTestCase):
+    def test_expired_keys_are_purged_without_being_read(self):
+        backend = coordination.LocalBackend()
+        for i in range(100):
+            backend.set(f"cmc:listings:{i}", b"x" * 1000, ttl=0.01)
+        backend.set("permanente", b"1")
+        time.sleep(0.02)
+        with mock.patch.object(coordination, "PURGE_SECONDS", 0):
+            backend._next_purge = 0
+            backend.set("nova", b"1", ttl=60)
+        self.assertEqual(sorted(backend._data), ["nova", "permanente"])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_lease_is_renewed_while_computing(self):
+        calls = []
+
+        def compute():
+            calls.append(threading.get_ident())
+            time.sleep(0.5)
+            return "pronto"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                coordination.single_flight("teste:lease", compute, ttl=5, wait=5, lease=0.15)
+            ))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        # O cálculo dura mais que o prazo do lock: sem renovação, outra thread calcularia também
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["pronto"] * 3)
+
+
+class CoordinationCacheClearTests(SimpleTestCase):
+    def test_clear_removes_prefixed_keys(self):
+        from django.conf import settings
+
+        cache = coordination.CoordinationCache("", {"KEY_PREFIX": settings.COORDINATION_PREFIX})
+        cache.set("fragmento", "html", 60)
+        coordination.get_backend().set("outro-app:chave", b"1")
+        cache.clear()
+        self.assertIsNone(cache.get("fragmento"))
+        self.assertEqual(coordination.get_backend().get("outro-app:chave"), b"1")
+
+    def test_redis_delete_prefix_scans_every_page(self):
+        backend = coordination.RedisBackend("redis://localhost:6379/0")
+        replies = iter([
+            [b"7", [b"cr*pto:1:a", b"cr*pto:1:b"]],
+            2,
+            [b"0", [b"cr*pto:lock:c"]],
+            1,
+        ])
+        with mock.patch.object(backend, "execute", side_effect=lambda *args: next(replies)) as execute:
+            self.assertEqual(backend.delete_prefix("cr*pto:"), 3)
+        self.assertEqual(execute.call_args_list[0].args, ("SCAN", b"0", "MATCH", "cr\\*pto:*", "COUNT", 1000))
+        self.assertEqual(execute.call_args_list[2].args[1], b"7")
+
+
+class SanitizeTests(SimpleTestCase):
+    XSS_VECTORS = [
+        '<a href="javascript:alert(1)">x</a>',
+        '<a href=" JaVaScRiPt:alert(1)">x</a>',
+        '<a href="data:text/html;base64,PHNjcmlwdD4=">x</a>',
+        '<img src=x onerror=alert(1)>',
+        '<p onclick="alert(1)">x</p>',
+        '<a href="https://exemplo.com" onmouseover="alert(1)">ok</a>',
+        '<svg><script>alert(1)</script></svg>',
+        '<svg onload=alert(1)>',
+        '<math><mi xlink:href="javascript:alert(1)">x</mi></math>',
+        '<noscript><p title="</noscript><img src=x onerror=alert(1)>"></noscript>',
+        '<scr<script>ipt>alert(1)</script>',
+        '<iframe src="//evil"></iframe>',
+        '<style>@import "//evil"</style>',
+        '<!--<script>alert(1)</script>-->',
+        '<td style="background:url(javascript:alert(1))">x</td>',
+        '<a href="http://x.com/&quot;onmouseover=&quot;alert(1)">y</a>',
+    ]
+
+    def assertInert(self, html):
+        self.assertNotRegex(html, r"(?i)<\s*(script|img|svg|iframe|style|math)")
+        self.assertNotRegex(html, r"(?i)javascript:|data:")
+        # Nenhum atributo de evento ou estilo fora de um valor entre aspas
+        tags = re.findall(r"<[^>]*>", re.sub(r'"[^"]*"', '""', html))
+        self.assertFalse([t for t in tags if re.search(r"(?i)\s(on\w+|style)\s*=", t)], html)
+
+    def test_xss_vectors_are_neutralized(self):
+        for vector in self.XSS_VECTORS:
+            with self.subTest(vector=vector):
+                self.assertInert(sanitize(vector))
+
+    def test_allowed_markup_is_kept(self):
+        self.assertEqual(
+            sanitize('<h2>BTC</h2><p><strong>Alta</strong> de 5%</p><table><tr><td colspan="2">a</td></tr></table>'),
+            '<h2>BTC</h2><p><strong>Alta</strong> de 5%</p><table><tr><td colspan="2">a</td></tr></table>',
+        )
+        self.assertEqual(
+            sanitize('<a href="https://coinmarketcap.com">CMC</a>'),
+            '<a href="https://coinmarketcap.com" rel="noopener nofollow" target="_blank">CMC</a>',
+        )
+
+    def test_unclosed_tags_are_closed(self):
+        self.assertEqual(sanitize("<ul><li>a<li>b"), "<ul><li>a<li>b</li></li></ul>")
+        self.assertEqual(sanitize("<p>texto &lt;script&gt;"), "<p>texto &lt;script&gt;</p>")
+
+
+class JsonStreamTests(SimpleTestCase):
+    PAYLOADS = [
+        {
+            "status": {"credit_count": 1, "elapsed": 12, "error_message": None},
+            "data": [
+                {"id": 1, "name": "Bitcoin", "quote": {"USD": {"price": 67123.4567, "percent_change_24h": -1.5e-3}}},
+                {"id": 1027, "name": "Éther \"clássico\" ☃ 🚀", "tags": ["pow", "é"], "platform": None},
+                {"id": 3, "name": "Zero", "quote": {"USD": {"price": 0.000001234, "volume_24h": 1E+21}}},
+            ],
+        },
+        {"data": [1.5, -2, 3.25e10, 0, 7e-7, True, None], "total": 123.456e-2},
+        {"status": {"error_code": 0}, "data": {"BTC": {"id": 1, "price": 1.0}, "ETH": {"id": 1027}}},
+        {"total": -0.5, "data": [], "fim": 10.0e1},
+    ]
+
+    def chunks(self, body, cuts):
+        bounds = [0, *sorted(cuts), len(body)]
+        return [body[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def assertParses(self, payload, chunks):
+        rest = {}
+        items = list(iter_data(chunks, rest))
+        if isinstance(payload.get("data"), list):
+            self.assertEqual(items, payload["data"])
+            self.assertEqual(rest, {k: v for k, v in payload.items() if k != "data"})
+        else:
+            self.assertEqual(items, [])
+            self.assertEqual(rest, payload)
+        self.assertEqual(parse(chunks), payload)
+
+    def test_every_single_cut(self):
+        for payload in self.PAYLOADS:
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            for cut in range(1, len(body)):
+                with self.subTest(body=body, cut=cut):
+                    self.assertParses(payload, self.chunks(body, [cut]))
+
+    def test_random_cuts(self):
+        rng = random.Random(44)
+        for payload in self.PAYLOADS:
+            for indent in (None, 2):
+                body = json.dumps(payload, ensure_ascii=False, indent=indent).encode()
+                for _ in range(200):
+                    cuts = rng.sample(range(1, len(body)), rng.randint(1, min(20, len(body) - 1)))
+                    self.assertParses(payload, self.chunks(body, cuts))
+
+    def test_one_byte_chunks(self):
+        for payload in self.PAYLOADS:
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.assertParses(payload, [body[i:i + 1] for i in range(len(body))])
+
+    def test_invalid_json_raises(self):
+        for body in (b'{"data": [1 2]}', b'{"data": [1.]}', b'{"a" 1}', b'{"data": [{"id": 1}'):
+            with self.subTest(body=body), self.assertRaises(ValueError):
+                list(iter_data([body[:5], body[5:]]))
+
+
+class BacktestScoreTests(SimpleTestCase):
+    T0 = 1_700_000_000
+    DAY = backtest.DAY
+
+    def test_hand_computed_fixture(self):
+        t0, day = self.T0, self.DAY
+        prices = pd.DataFrame.from_records([
+            ("AAA", t0 - 3600, 100.0), ("AAA", t0 + 30 * day, 120.0), ("AAA", t0 + 90 * day, 150.0),
+            ("AAA", t0 + 180 * day, 80.0), ("AAA", t0 + 365 * day, 200.0),
+            ("BBB", t0, 50.0), ("BBB", t0 + 30 * day + 3600, 40.0), ("BBB", t0 + 90 * day, 55.0),
+            ("CCC", t0, 10.0), ("CCC", t0 + 32 * day, 12.0),
+            # Amostra de entrada a 2 dias da análise: fora da ENTRY_TOLERANCE
+            ("DDD", t0 - 2 * day, 100.0), ("DDD", t0 + 30 * day, 200.0),
+        ], columns=["symbol", "ts", "price"])
+        analyses = pd.DataFrame.from_records([
+            ("AAA", "buy", 0.8, t0, 40.0, -10.0, np.nan),
+            ("BBB", "vender", 0.6, t0, 5.0, np.nan, np.nan),
+            ("CCC", "segurar", 0.3, t0, np.nan, np.nan, np.nan),
+            ("DDD", "comprar", 0.9, t0, 10.0, 10.0, 10.0),
+        ], columns=["symbol", "recommendation", "confidence", "ts", "3_months", "6_months", "1_year"])
+
+        result = backtest.score(analyses, prices, horizon_days=30, hold_band=0.05, bins=10)
+
+        # Retornos em 30 dias: AAA +20% (acerto), BBB -20% (acerto), CCC +20% (erro); DDD fica de fora
+        self.assertEqual((result["analyses"], result["scored"]), (4, 3))
+        self.assertAlmostEqual(result["hit_rate"], 2 / 3)
+        self.assertEqual(result["by_recommendation"], {
+            "vender": {"n": 1, "hit_rate": 1.0},
+            "segurar": {"n": 1, "hit_rate": 0.0},
+            "comprar": {"n": 1, "hit_rate": 1.0},
+        })
+        self.assertAlmostEqual(result["brier"], (0.2 ** 2 + 0.4 ** 2 + 0.3 ** 2) / 3)
+        self.assertAlmostEqual(result["ece"], (0.2 + 0.4 + 0.3) / 3)
+        self.assertEqual([(row["bin"], row["n"]) for row in result["calibration"]],
+                         [("0.3-0.4", 1), ("0.6-0.7", 1), ("0.8-0.9", 1)])
+
+        # 3 meses: AAA previu 40 e realizou 50, BBB previu 5 e realizou 10
+        three = result["predictions"]["3_months"]
+        self.assertEqual(three["n"], 2)
+        self.assertAlmostEqual(three["mae"], 7.5)
+        self.assertAlmostEqual(three["rmse"], np.sqrt((10 ** 2 + 5 ** 2) / 2))
+        self.assertAlmostEqual(three["bias"], -7.5)
+        self.assertEqual(three["direction_accuracy"], 1.0)
+        # 6 meses: só AAA (previu -10, realizou -20)
+        six = result["predictions"]["6_months"]
+        self.assertEqual(six["n"], 1)
+        self.assertAlmostEqual(six["mae"], 10.0)
+        self.assertAlmostEqual(six["bias"], 10.0)
+        self.assertEqual(result["predictions"]["1_year"], {
+            "n": 0, "mae": None, "rmse": None, "bias": None, "direction_accuracy": None,
+        })
+
+
+class AlertIndexTests(SimpleTestCase):
+    def brute_force(self, alerts_, segments, values):
+        expected = set()
+        for alert_id, kind, convert, symbol, threshold in alerts_:
+            source, direction = alerts.KINDS[kind]
+            observed = values[source][segments[(convert, symbol)]]
+            if np.isnan(observed):
+                continue
+            if (observed >= threshold) if direction == "above" else (observed <= threshold):
+                expected.add((alert_id, float(observed)))
+        return expected
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(41)
+        symbols = ["BTC", "ETH", "SOL", "DOGE", "ADA", "XRP"]
+        for _ in range(20):
+            n = int(rng.integers(0, 2000))
+            alerts_ = [
+                (
+                    i + 1,
+                    str(rng.choice(list(alerts.KINDS))),
+                    str(rng.choice(["USD", "BRL"])),
+                    str(rng.choice(symbols)),
+                    # Limiares repetidos exercitam os empates (<= e >=)
+                    float(rng.choice([0.5, 1.0, 10.0])) if rng.random() < 0.2 else float(rng.normal(0, 5)),
+                )
+                for i in range(n)
+            ]
+            ids, kinds, converts, symbols_, thresholds = zip(*alerts_) if alerts_ else ([],) * 5
+            index = alerts.AlertIndex(ids, kinds, converts, symbols_, np.array(thresholds), [False] * n)
+            segments = {pair: i for i, pair in enumerate(index.vocab)}
+            values = {
+                source: np.where(
+                    rng.random(len(index.vocab)) < 0.1,
+                    np.nan,
+                    rng.choice([0.5, 1.0, 10.0], len(index.vocab)) if rng.random() < 0.3
+                    else rng.normal(0, 5, len(index.vocab)),
+                )
+                for source in ("price", "change", "risk")
+            }
+            triggered_ids, triggered_values = index.triggered(values)
+            got = list(zip(triggered_ids.tolist(), triggered_values.tolist()))
+            self.assertEqual(len(got), len(set(got)))
+            self.assertEqual(set(got), self.brute_force(alerts_, segments, values))
+
+
+@override_settings(MARKET_SNAPSHOT_LIMIT=400)
+class MarketSnapshotTests(SimpleTestCase):
+    """Snapshot parcial (400 primeiras) contra a resposta da API sobre o universo inteiro"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(30)
+        cls.universe = []
+        for rank in range(1, 1201):
+            price = rng.uniform(0.01, 1000)
+            market_cap = 1e12 / rank ** 1.2
+            cls.universe.append({
+                "id": rank,
+                "symbol": f"C{rank}",
+                "tags": rng.sample(["defi", "layer-1", "meme"], rng.randint(0, 2))
+                + (["rare"] if rank % 97 == 0 else []),
+                "platform": {"symbol": "ETH"} if rng.random() < 0.3 else None,
+                "cmc_rank": rank,
+                "circulating_supply": market_cap / price,
+                "quote": {"USD": {
+                    "price": price,
+                    "percent_change_24h": rng.uniform(-10, 10),
+                    "market_cap": market_cap,
+                }},
+            })
+        cls.snapshot = MarketSnapshot.from_listings({"data": cls.universe[:400]}, ["USD"])
+
+    def upstream(self, params):
+        # O que o listings_latest devolveria, calculado item a item sobre o universo inteiro
+        items = []
+        for item in self.universe:
+            usd = item["quote"]["USD"]
+            if usd["market_cap"] < params.get("market_cap_min", -np.inf) or usd["price"] > params.get("price_max", np.inf):
+                continue
+            if params.get("tag") and params["tag"] not in item["tags"]:
+                continue
+            if params.get("cryptocurrency_type") == "tokens" and item["platform"] is None:
+                continue
+            items.append(item)
+        sort = params.get("sort", "market_cap")
+        items.sort(key=lambda item: item["quote"]["USD"][sort], reverse=params.get("sort_dir", "desc") == "desc")
+        start = params.get("start", 1) - 1
+        return [item["symbol"] for item in items[start:start + params.get("limit", 100)]]
+
+    def local(self, params):
+        return [item["symbol"] for item in self.snapshot.listings(params)["data"]]
+
+    def test_serves_when_snapshot_holds_the_answer(self):
+        cases = [
+            {"market_cap_min": self.universe[49]["quote"]["USD"]["market_cap"], "sort": "percent_change_24h", "sort_dir": "asc"},
+            {"market_cap_min": 5e9, "tag": "meme", "sort": "price", "limit": 10},
+            {"tag": "defi", "limit": 20},
+            {"cryptocurrency_type": "tokens", "price_max": 100, "start": 3, "limit": 5},
+            {"tag": "rare", "limit": 4},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertTrue(self.snapshot.can_serve(["USD"], params))
+                expected = self.upstream(params)
+                self.assertTrue(expected)
+                self.assertEqual(self.local(params), expected)
+
+    def test_refuses_when_answer_depends_on_missing_coins(self):
+        last = self.universe[399]["quote"]["USD"]["market_cap"]
+        cases = [
+            {"sort": "price"},
+            {"sort_dir": "asc", "limit": 10},
+            {"market_cap_min": last, "sort": "price"},
+            {"tag": "rare", "limit": 5},
+            {"start": 390, "limit": 20},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertFalse(self.snapshot.can_serve(["USD"], params))
+
+
+class SharedSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "market.snap"
+        for name in ("_mapped", "_mapped_key"):
+            patcher = mock.patch.object(shared_snapshot, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def snapshot(self, btc_price=50000.0):
+        data = [
+            {
+                "id": 1, "name": "Bitcoin", "symbol": "BTC", "tags": ["mineable", "pow"], "platform": None,
+                "cmc_rank": 1, "num_market_pairs": 12000, "circulating_supply": 19.8e6, "max_supply": 21e6,
+                "quote": {"USD": {"price": btc_price, "percent_change_24h": 1.5, "market_cap": btc_price * 19.8e6}},
+            },
+            {
+                "id": 2, "name": "Tether USDt", "symbol": "USDT", "tags": [], "cmc_rank": 2,
+                "platform": {"id": 1027, "symbol": "ETH", "token_address": "0xdac1"},
+                "num_market_pairs": None, "circulating_supply": 1.4e11, "max_supply": None,
+                "quote": {"USD": {"price": 1.0, "percent_change_24h": None, "market_cap": 1.4e11}},
+            },
+        ]
+        return MarketSnapshot.from_listings({"data": data}, ["USD"])
+
+    def test_round_trip(self):
+        source = self.snapshot()
+        self.assertEqual(shared_snapshot.publish(source, self.path), 1)
+        mapped = shared_snapshot.read(self.path)
+        self.assertEqual(mapped.generation, 1)
+        self.assertEqual(mapped.fetched_at, source.fetched_at)
+        self.assertEqual(len(mapped), len(source))
+        for row in range(len(source)):
+            self.assertEqual(mapped.record(row), source.record(row))
+        # Sem troca de arquivo, o mesmo mapeamento é reaproveitado
+        self.assertIs(shared_snapshot.read(self.path), mapped)
+
+    def test_second_publish_is_remapped(self):
+        shared_snapshot.publish(self.snapshot(), self.path)
+        first = shared_snapshot.read(self.path)
+        self.assertEqual(shared_snapshot.publish(self.snapshot(btc_price=60000.0), self.path), 2)
+        second = shared_snapshot.read(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.generation, 2)
+        self.assertEqual(second.record(second.row("BTC"))["quote"]["USD"]["price"], 60000.0)
+        # Quem mapeou a versão anterior continua lendo os dados dela
+        self.assertEqual(first.record(first.row("BTC"))["quote"]["USD"]["price"], 50000.0)
+
+    def test_rejects_unknown_format(self):
+        shared_snapshot.publish(self.snapshot(), self.path)
+        valid = self.path.read_bytes()
+        header = list(shared_snapshot.HEADER.unpack_from(valid))
+        for field, value in ((0, b"OTHERSNP"), (1, shared_snapshot.FORMAT_VERSION + 1)):
+            with self.subTest(field=field):
+                header_ = header[:]
+                header_[field] = value
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_bytes(shared_snapshot.HEADER.pack(*header_) + valid[shared_snapshot.HEADER.size:])
+                tmp.replace(self.path)
+                self.assertIsNone(shared_snapshot.read(self.path))
+
+
+class CryptoConvertTests(SimpleTestCase):
+    def setUp(self):
+        def coin(rank, symbol, price, change_24h, change_7d):
+            return {
+                "id": rank, "symbol": symbol, "cmc_rank": rank,
+                "quote": {"USD": {
+                    "price": price, "volume_24h": 1e9, "volume_change_24h": 10.0,
+                    "percent_change_24h": change_24h, "percent_change_7d": change_7d, "percent_change_30d": None,
+                }},
+            }
+
+        self.snapshot = MarketSnapshot.from_listings(
+            {"data": [coin(1, "BTC", 50000.0, 25.0, -20.0), coin(2, "ETH", 2500.0, 50.0, -20.0)]}, ["USD"]
+        )
+        patcher = mock.patch.object(fx, "fiat_rates", return_value={"BRL": 5.0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_crypto_convert_discounts_its_own_change(self):
+        self.assertTrue(self.snapshot.ensure_converts(["BTC", "BRL"]))
+        eth = self.snapshot.record(self.snapshot.row("ETH"), ["BTC", "BRL"])["quote"]
+        # ETH subiu 50% e BTC 25% em USD: em BTC, ETH subiu 20%
+        self.assertAlmostEqual(eth["BTC"]["price"], 0.05)
+        self.assertAlmostEqual(eth["BTC"]["percent_change_24h"], 20.0)
+        self.assertAlmostEqual(eth["BTC"]["percent_change_7d"], 0.0)
+        self.assertAlmostEqual(eth["BTC"]["volume_change_24h"], -12.0)
+        self.assertIsNone(eth["BTC"]["percent_change_30d"])
+        # Moedas fiat mantêm a variação em USD
+        self.assertEqual(eth["BRL"]["percent_change_24h"], 50.0)
+        btc = self.snapshot.record(self.snapshot.row("BTC"), ["BTC"])["quote"]["BTC"]
+        self.assertAlmostEqual(btc["percent_change_24h"], 0.0)
+
+    def test_expand_quotes_matches_snapshot(self):
+        rates = fx.local_rates(["BTC", "BRL"], self.snapshot)
+        payload = {"data": {"ETH": [self.snapshot.record(self.snapshot.row("ETH"), ["USD"])]}}
+        quote = fx.expand_quotes(payload, rates)["data"]["ETH"][0]["quote"]
+        self.assertAlmostEqual(quote["BTC"]["percent_change_24h"], 20.0)
+        self.assertIsNone(quote["BTC"]["percent_change_30d"])
+        self.assertEqual(quote["BRL"]["percent_change_24h"], 50.0)
+        self.assertAlmostEqual(quote["BRL"]["price"], 12500.0)
+
+
+class RouterTests(SimpleTestCase):
+    KNOWN = frozenset({"BTC", "ETH", "SOL"})
+
+    def test_all_caps_words_are_not_symbols(self):
+        query_class, symbols, _ = classify("ME FALE DO BTC E DIGA SE SUBIU HOJE", self.KNOWN)
+        self.assertEqual((query_class, symbols), ("market", ["BTC"]))
+        # Sem a lista de símbolos conhecidos, as palavras contam como moedas
+        self.assertEqual(classify("ME FALE DO BTC E DIGA SE SUBIU HOJE")[0], "research")
+
+    def test_two_known_symbols_go_to_research(self):
+        query_class, symbols, _ = classify("ME FALE DO BTC E DO ETH HOJE", self.KNOWN)
+        self.assertEqual((query_class, sorted(symbols)), ("research", ["BTC", "ETH"]))
+
+
+class AdmissionTests(TestCase):
+    def test_csrf_rejection_does_not_spend_tokens(self):
+        client = Client(enforce_csrf_checks=True)
+        with mock.patch.object(admission, "get_buckets") as get_buckets:
+            response = client.post("/dashboard/", {"symbol": "BTC"})
+        self.assertEqual(response.status_code, 403)
+        get_buckets.assert_not_called()
+
+    def test_client_key(self):
+        factory = RequestFactory()
+        request = factory.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 203.0.113.7")
+        self.assertEqual(admission.client_key(request), "ip:10.0.0.1")
+        with override_settings(ADMISSION_CLIENT_IP_HEADER="HTTP_X_FORWARDED_FOR", ADMISSION_TRUSTED_PROXIES=1):
+            # O primeiro endereço veio do próprio cliente e pode ser forjado
+            self.assertEqual(admission.client_key(request), "ip:203.0.113.7")
+        with override_settings(ADMISSION_CLIENT_IP_HEADER="HTTP_X_FORWARDED_FOR", ADMISSION_TRUSTED_PROXIES=2):
+            self.assertEqual(admission.client_key(request), "ip:6.6.6.6")
+        request.user = User.objects.create(username="limitado")
+        self.assertEqual(admission.client_key(request), f"user:{request.user.pk}")
+
+
+@override_settings(OPENAI_MAX_WAIT={"interactive": 1, "batch": 1})
+class GovernorCooldownTests(SimpleTestCase):
+    def setUp(self):
+        self.model = f"teste-{time.time_ns()}"
+
+    def test_cooldown_longer_than_max_wait_raises(self):
+        governor.pause(self.model, 30)
+        with mock.patch.object(coordination, "take") as take:
+            with self.assertRaises(governor.Paused):
+                governor.acquire(self.model, 100)
+        # Nada é forçado durante a pausa
+        take.assert_not_called()
+
+    def test_short_cooldown_is_waited_out(self):
+        governor.pause(self.model, 0.3)
+        waited = governor.acquire(self.model, 100)
+        self.assertGreaterEqual(waited, 0.25)
+
+    def test_retries_do_not_hammer_a_paused_model(self):
+        from openai import RateLimitError
+
+        request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+        response = httpx.Response(429, headers={"retry-after": "60"}, request=request)
+        call = mock.Mock(side_effect=RateLimitError("429", response=response, body=None))
+        with self.assertRaises(governor.Paused):
+            governor.governed(self.model, 100, call, "teste")
+        self.assertEqual(call.call_count, 1)
+
+
+@override_settings(OPENAI_API_KEY="teste")
+class PausedAnalysisTests(TestCase):
+    def test_ticker_path_answers_503(self):
+        paused = governor.Paused("gpt pausado")
+        with mock.patch("crypto_app.views.get_crypto_data", return_value={"name": "Bitcoin", "symbol": "BTC"}), \
+                mock.patch("crypto_app.utils._structured_completion", side_effect=paused):
+            response = Client().post("/dashboard/", {"symbol": f"P{time.time_ns() % 10000}"})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(CryptoAnalysis.objects.exists())
+
+    def test_structure_report_propagates_paused(self):
+        from crypto_app.utils import structure_report
+
+        with mock.patch("crypto_app.utils._structured_completion", side_effect=governor.Paused("gpt pausado")):
+            with self.assertRaises(governor.Paused):
+                structure_report("<p>relatório</p>")
+
+
+class LedgerReportAdminTests(TestCase):
+    def test_days_out_of_range_does_not_fail(self):
+        client = Client()
+        client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        url = reverse("admin:crypto_app_ledgerrequest_report")
+        with mock.patch("crypto_app.admin.ledger.report", return_value={}) as report:
+            for days in ("nan", "inf", "-inf", "1e9", "-5", "abc"):
+                with self.subTest(days=days):
+                    self.assertEqual(client.get(url, {"days": days}).status_code, 200)
+        self.assertEqual([c.args[0] for c in report.call_args_list], [7, 7, 7, 3650, 0, 7])
+
+    def test_large_window_reaches_the_report(self):
+        client = Client()
+        client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        response = client.get(reverse("admin:crypto_app_ledgerrequest_report"), {"days": "1e9"})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,260 @@
+"""Captura anonimizada de tráfego e upstreams simulados para o replay.
+
+O TrafficCaptureMiddleware grava uma linha JSON por requisição das views
+capturadas; `manage.py replay_traffic` reproduz o arquivo contra um servidor
+local cujos serviços externos (CoinMarketCap, NewsAPI, OpenAI) são trocados
+pelo `stub_transport`, para dimensionar workers sem gastar créditos.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+
+# Dados pessoais que podem aparecer nas perguntas livres do dashboard
+REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b0x[0-9a-fA-F]{16,}\b"), "<endereco>"),
+    (re.compile(r"\b[13bc][a-km-zA-HJ-NP-Z1-9]{25,61}\b"), "<endereco>"),
+    (re.compile(r"\d[\d .-]{7,}\d"), "<numero>"),
+]
+MAX_INPUT_LENGTH = 256
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text[:MAX_INPUT_LENGTH]
+
+
+def client_id(request) -> str:
+    """Identificador estável do cliente sem guardar o IP (HMAC com a SECRET_KEY)"""
+    address = request.META.get("REMOTE_ADDR", "")
+    return hmac.new(settings.SECRET_KEY.encode(), address.encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def capture_entry(request, response, started: float, duration: float, upstream) -> dict[str, Any]:
+    entry = {
+        "ts": round(started, 3),
+        "method": request.method,
+        "path": request.path,
+        "view": request.resolver_match.url_name,
+        "query": {key: request.GET[key] for key in request.GET},
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 1),
+        "upstream": dict(upstream),
+        "client": client_id(request),
+    }
+    if request.method == "POST":
+        # Só o campo da pergunta; token CSRF e cookies nunca são gravados
+        entry["input"] = redact(request.POST.get("symbol", ""))
+    return entry
+
+
+class TrafficRecorder:
+    def __init__(self, path):
+        self._path = str(path)
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock, open(self._path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def load_capture(path) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# --- Upstreams simulados -----------------------------------------------------
+
+STUB_SYMBOLS = ["BTC", "ETH", "USDT", "XRP", "BNB", "SOL", "USDC", "DOGE", "ADA", "TRX", "AVAX", "LINK", "DOT", "LTC"]
+STUB_COINS = 500
+STUB_RATES = {"USD": 1.0, "BRL": 5.4, "EUR": 0.92}
+
+
+def _stub_coin(rank: int, converts: list[str]) -> dict[str, Any]:
+    symbol = STUB_SYMBOLS[rank - 1] if rank <= len(STUB_SYMBOLS) else f"C{rank:04d}"
+    rng = random.Random(rank)
+    price = 60000 / rank ** 1.5
+    supply = rng.uniform(1e6, 1e9)
+    rates = STUB_RATES
+    return {
+        "id": rank,
+        "name": symbol.title(),
+        "symbol": symbol,
+        "slug": symbol.lower(),
+        "num_market_pairs": rng.randint(1, 1000),
+        "date_added": "2020-01-01T00:00:00.000Z",
+        "tags": ["mineable"] if rank % 3 == 0 else [],
+        "max_supply": None,
+        "circulating_supply": supply,
+        "total_supply": supply,
+        "platform": None if rank % 4 else {"id": 1027, "symbol": "ETH"},
+        "cmc_rank": rank,
+        "last_updated": "2026-01-01T00:00:00.000Z",
+        "quote": {
+            convert: {
+                "price": price * rates.get(convert, 1.0),
+                "volume_24h": price * supply * 0.05 * rates.get(convert, 1.0),
+                "volume_change_24h": rng.uniform(-20, 20),
+                "percent_change_1h": rng.uniform(-2, 2),
+                "percent_change_24h": rng.uniform(-10, 10),
+                "percent_change_7d": rng.uniform(-20, 20),
+                "percent_change_30d": rng.uniform(-40, 40),
+                "market_cap": price * supply * rates.get(convert, 1.0),
+                "market_cap_dominance": 0.0,
+                "fully_diluted_market_cap": price * supply * rates.get(convert, 1.0),
+                "last_updated": "2026-01-01T00:00:00.000Z",
+            }
+            for convert in converts
+        },
+    }
+
+
+def _cmc_status() -> dict[str, Any]:
+    return {"timestamp": "2026-01-01T00:00:00.000Z", "error_code": 0, "error_message": None, "credit_count": 1}
+
+
+def _stub_coinmarketcap(request) -> dict[str, Any]:
+    params = request.url.params
+    converts = (params.get("convert") or "USD").split(",")
+    path = request.url.path
+    if path.endswith("/listings/latest"):
+        start = int(params.get("start", 1))
+        limit = min(int(params.get("limit", 100)), STUB_COINS)
+        data = [_stub_coin(rank, converts) for rank in range(start, min(start + limit, STUB_COINS + 1))]
+    elif path.endswith("/quotes/latest"):
+        symbols = (params.get("symbol") or "").split(",")
+        by_symbol = {_stub_coin(rank, [])["symbol"]: rank for rank in range(1, len(STUB_SYMBOLS) + 1)}
+        data = {s: _stub_coin(by_symbol.get(s, 99), converts) for s in symbols if s}
+    elif path.endswith("/map"):
+        data = [
+            {k: v for k, v in _stub_coin(rank, []).items() if k in ("id", "name", "symbol", "slug")}
+            | {"rank": rank, "is_active": 1}
+            for rank in range(1, STUB_COINS + 1)
+        ]
+    else:
+        data = {}
+    return {"status": _cmc_status(), "data": data}
+
+
+def _stub_news() -> dict[str, Any]:
+    articles = [
+        {
+            "source": {"id": None, "name": "Stub News"},
+            "title": f"Mercado cripto: notícia simulada {i}",
+            "description": "Conteúdo gerado pelo replay de tráfego.",
+            "url": f"https://news.invalid/{i}",
+            "publishedAt": "2026-01-01T00:00:00Z",
+            "content": "",
+        }
+        for i in range(10)
+    ]
+    return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+
+def example_for(schema: dict[str, Any], defs: Optional[dict[str, Any]] = None) -> Any:
+    """Valor mínimo válido para um JSON schema (usado nas saídas estruturadas simuladas)"""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_for(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return example_for(schema["anyOf"][0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: example_for(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind in ("number", "integer"):
+        return 0.5 if kind == "number" else 1
+    if kind == "boolean":
+        return False
+    return "stub"
+
+
+def _stub_chat_completion(body: dict[str, Any]) -> dict[str, Any]:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = json.dumps(example_for(response_format["json_schema"]["schema"]))
+    else:
+        content = "Resposta simulada."
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content, "refusal": None},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _stub_response(body: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": "resp-stub",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "stub"),
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [{
+            "type": "message",
+            "id": "msg-stub",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": "<p>Relatório simulado.</p>", "annotations": []}],
+        }],
+        "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+    }
+
+
+def stub_transport(
+    latency: Optional[dict[str, float]] = None,
+    default_latency: float = 0.0,
+    calls: Optional[Counter] = None,
+):
+    """httpx.MockTransport que responde como os serviços externos, com latência configurável por host"""
+    import httpx
+
+    latency = latency or {}
+    lock = threading.Lock()
+    fx_host = httpx.URL(settings.FX_RATES_URL).host
+
+    def handler(request):
+        host = request.url.host
+        if calls is not None:
+            with lock:
+                calls[host] += 1
+        time.sleep(latency.get(host, default_latency))
+        if host == "pro-api.coinmarketcap.com":
+            return httpx.Response(200, json=_stub_coinmarketcap(request))
+        if host == fx_host:
+            return httpx.Response(200, json={"result": "success", "base_code": "USD", "rates": STUB_RATES})
+        if host == "newsapi.org":
+            return httpx.Response(200, json=_stub_news())
+        if host == "api.openai.com":
+            body = json.loads(request.content or b"{}")
+            if request.url.path.endswith("/chat/completions"):
+                return httpx.Response(200, json=_stub_chat_completion(body))
+            return httpx.Response(200, json=_stub_response(body))
+        return httpx.Response(404, json={"error": f"sem stub para {host}"})
+
+    return httpx.MockTransport(handler)
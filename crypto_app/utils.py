@@ -1,13 +1,48 @@
-import requests
 import random
+import math
 import json
-import httpx
+import time
+import hashlib
 from django.conf import settings
-from openai import OpenAI
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.template.loader import render_to_string
 from datetime import datetime, timedelta
 
+from crypto_app.clients import http_client, openai_client
+
+# openai, httpx, pydantic e numpy são importados dentro das funções para não
+# pesar no import das views (manage.py e início dos workers)
+
+
+def get_snapshot():
+    from crypto_app.market import get_snapshot
+
+    return get_snapshot()
+
+
 def get_random_crypto_data():
+    import httpx
+
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.ensure_converts(["BRL"]):
+        # Seleciona direto das colunas do snapshot, entre as 50 primeiras por ranking
+        rows = snapshot.select({"limit": 50})
+        if len(rows):
+            row = int(random.choice(rows))
+            brl = snapshot.quotes["BRL"]
+            max_supply = snapshot.coins["max_supply"][row]
+            return {
+                "name": snapshot.meta[row]["name"],
+                "symbol": snapshot.meta[row]["symbol"],
+                "price": float(brl["price"][row]),
+                "price_change_24h": float(brl["percent_change_24h"][row]),
+                "market_cap": float(brl["market_cap"][row]),
+                "all_time_high": "N/A" if math.isnan(max_supply) else float(max_supply),
+            }
+
     url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
     headers = {
         "Accepts": "application/json",
@@ -20,7 +55,7 @@ def get_random_crypto_data():
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = http_client().get(url, headers=headers, params=params)
         response.raise_for_status()
         data = response.json()
         cryptos = data.get("data", [])
@@ -34,56 +69,107 @@ def get_random_crypto_data():
             "market_cap": random_crypto["quote"]["BRL"]["market_cap"],
             "all_time_high": random_crypto.get("max_supply", "N/A"),  # Alta histórica aproximada
         }
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Erro ao buscar dados da API CoinMarketCap: {e}")
         return None
     
 
-def get_crypto_chart_data(request):
-    symbol = request.GET.get("symbol", "BTC")
-    url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-    headers = {
-        "X-CMC_PRO_API_KEY": settings.COINMARKETCAP_API_KEY,
-    }
-    params = {'symbol': symbol, 'convert': 'BRL'}
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
+def _current_prices(symbols, convert):
+    """Nome e preço atual de cada símbolo: do snapshot ou, para os que faltarem, da API"""
+    import httpx
 
-        # Get the cryptocurrency full name
-        crypto_data = data["data"].get(symbol)
-        if not crypto_data:
-            return JsonResponse({"success": False, "error": "Symbol not found in API response."})
+    found = {}
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.ensure_converts([convert]):
+        for symbol in symbols:
+            row = snapshot.row(symbol)
+            if row is not None:
+                found[symbol] = (snapshot.meta[row]["name"], float(snapshot.quotes[convert]["price"][row]))
 
-        crypto_name = crypto_data.get("name", "Unknown")
+    missing = [s for s in symbols if s not in found]
+    if missing:
+        url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+        headers = {"X-CMC_PRO_API_KEY": settings.COINMARKETCAP_API_KEY}
+        params = {"symbol": ",".join(missing), "convert": convert}
+        try:
+            response = http_client().get(url, headers=headers, params=params)
+            response.raise_for_status()
+            for symbol, crypto_data in response.json().get("data", {}).items():
+                found[symbol] = (crypto_data.get("name", "Unknown"), crypto_data["quote"][convert]["price"])
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar cotações para o gráfico: {e}")
+    return found
 
-        # Generate dynamic dates for the last 30 days
-        today = datetime.now()
-        dates = [(today - timedelta(days=i)).strftime("%d %b") for i in range(30)][::-1]
 
-        # Current price of the cryptocurrency
-        price = data["data"][symbol]["quote"]["BRL"]["price"]
+def get_crypto_chart_data(request):
+    """Séries de preço de um ou mais símbolos em layout colunar.
+
+    Parâmetros: symbols (ou symbol), range (1d/7d/30d/1y/all), resolution
+    (5m/1h/1d) e points (orçamento de pontos, reduzido com LTTB). Responde com
+    ETag/Last-Modified e 304 quando o cliente já tem a versão atual.
+    """
+    from crypto_app.charts import DEFAULT_POINTS, MAX_POINTS, RANGES, RESOLUTIONS, build_series
+
+    symbols = request.GET.get("symbols") or request.GET.get("symbol", "BTC")
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))[:10]
+    range_ = request.GET.get("range", "30d")
+    if range_ not in RANGES:
+        return JsonResponse({"success": False, "error": f"Range inválido: {range_}"}, status=400)
+    resolution = RESOLUTIONS.get(request.GET.get("resolution"), RANGES[range_][1])
+    try:
+        points = min(max(int(request.GET.get("points", DEFAULT_POINTS)), 3), MAX_POINTS)
+    except ValueError:
+        points = DEFAULT_POINTS
+    convert = "BRL"
 
-        # Generate mock data with realistic percentage variations for 30 days
-        historical_prices = []
-        current_price = price
-        for _ in range(30):
-            # Simulate small daily price changes (±5%)
-            daily_change = random.uniform(-0.05, 0.05)
-            current_price = round(current_price * (1 + daily_change), 2)
-            historical_prices.append(current_price)
+    cache_key = f"chart:{','.join(symbols)}:{range_}:{resolution}:{points}:{convert}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        prices = _current_prices(symbols, convert)
+        series = {}
+        for symbol in symbols:
+            name, price = prices.get(symbol, (None, None))
+            if name is None and price is None:
+                continue
+            series[symbol] = {"name": name, **build_series(symbol, price, convert, range_, resolution, points)}
+        if not series:
+            return JsonResponse({"success": False, "error": "Symbol not found in API response."})
 
-        return JsonResponse({
+        body = json.dumps({
             "success": True,
-            "prices": historical_prices[::-1],  # Ensure oldest-to-newest order
-            "dates": dates,  # Use dynamically generated dates
-            "name": crypto_name,
-        })
-    except requests.RequestException as e:
-        return JsonResponse({"success": False, "error": str(e)})
+            "range": range_,
+            "resolution": resolution,
+            "convert": convert,
+            "series": series,
+        }, separators=(",", ":"))
+        last_modified = max((s["t"][-1] for s in series.values() if s["t"]), default=int(time.time()))
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:20]
+        cached = (body, etag, last_modified)
+        cache.set(cache_key, cached, settings.CHART_CACHE_SECONDS)
+
+    body, etag, last_modified = cached
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, max_age=settings.CHART_CACHE_SECONDS)
+    return response
     
+
 def get_crypto_news():
+    import httpx
+    from crypto_app.news import search_news
+
+    # Primeiro o índice local; a NewsAPI só é chamada se ele ainda estiver vazio
+    try:
+        indexed = search_news(limit=5)
+    except Exception as e:
+        print(f"Erro ao consultar o índice de notícias: {e}")
+        indexed = []
+    if indexed:
+        return indexed
+
     url = "https://newsapi.org/v2/everything"
     params = {
         "q": "cryptocurrency",  # Palavras-chave para filtrar notícias
@@ -94,7 +180,7 @@ def get_crypto_news():
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = http_client().get(url, params=params)
         response.raise_for_status()
         data = response.json()
         articles = data.get("articles", [])
@@ -106,12 +192,20 @@ def get_crypto_news():
             }
             for article in articles
         ]
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Erro ao buscar notícias: {e}")
         return []
 
 def get_crypto_data(symbol):
     """Obtém dados da criptomoeda da CoinMarketCap API"""
+    from crypto_app.coordination import single_flight
+
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.ensure_converts(["BRL"]):
+        row = snapshot.row(symbol)
+        if row is not None:
+            return snapshot.record(row, ["BRL"])
+
     url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
     params = {'symbol': symbol, 'convert': 'BRL'}
     headers = {
@@ -119,72 +213,290 @@ def get_crypto_data(symbol):
         'X-CMC_PRO_API_KEY': settings.COINMARKETCAP_API_KEY,
     }
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
+    def fetch():
+        response = http_client().get(url, headers=headers, params=params)
         response.raise_for_status()
         return response.json()['data'][symbol]
+
+    try:
+        # Compartilhada com a pré-busca do dashboard e com os outros nós
+        return single_flight(
+            f"cmc:crypto-data:{symbol}:BRL", fetch, ttl=settings.CMC_SHARED_TTL['quotes_latest']
+        )
     except Exception as e:
         print(f"Error fetching crypto data: {str(e)}")
         return None
 
+def get_known_symbols():
+    """Símbolos ativos no CoinMarketCap (id map), em cache por um dia"""
+    import httpx
+    from crypto_app.jsonstream import iter_data
+
+    symbols = cache.get("cmc:known-symbols")
+    if symbols is not None:
+        return symbols
+
+    url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/map"
+    headers = {
+        "Accepts": "application/json",
+        "X-CMC_PRO_API_KEY": settings.COINMARKETCAP_API_KEY,
+    }
+    try:
+        # O id map completo tem milhares de itens: lido em streaming, só o símbolo fica
+        with http_client().stream("GET", url, headers=headers, params={"listing_status": "active"}) as response:
+            response.raise_for_status()
+            symbols = frozenset(item["symbol"] for item in iter_data(response.iter_bytes()))
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"Erro ao buscar o id map do CoinMarketCap: {e}")
+        return None
+
+    cache.set("cmc:known-symbols", symbols, 60 * 60 * 24)
+    return symbols
+
+
+def _first_by_rank(entries):
+    # Na v2 um símbolo pode corresponder a várias moedas; fica a de melhor ranking
+    if isinstance(entries, dict):
+        return entries
+    ranked = [e for e in entries if e.get("cmc_rank")]
+    return min(ranked, key=lambda e: e["cmc_rank"]) if ranked else (entries[0] if entries else None)
+
+
+def answer_intent(intent):
+    """Responde consultas diretas (cotação, listagem, metadados) com dados do CoinMarketCap
+    e um template HTML, sem passar pelo loop de agentes. Retorna None para cair no orquestrador.
+    """
+    from crypto_app.agents.coin_market_cap import CoinMarketAgent
+
+    agent = CoinMarketAgent(
+        settings.OPENAI_API_KEY, settings.COINMARKETCAP_API_KEY, snapshot=get_snapshot
+    )
+    symbols = ",".join(intent.symbols)
+    try:
+        if intent.kind == "quote":
+            data = agent._call_function(
+                "quotes_latest", {"symbol": symbols, "convert": intent.convert}
+            ).get("data", {})
+            coins = [_first_by_rank(data[s]) for s in intent.symbols if data.get(s)]
+            coins = [c for c in coins if c]
+            if not coins:
+                return None
+            return render_to_string("crypto_app/quote.html", {
+                "coins": [(c, c["quote"][intent.convert]) for c in coins],
+                "convert": intent.convert,
+            })
+
+        if intent.kind == "metadata":
+            data = agent._call_function("metadata", {"symbol": symbols}).get("data", {})
+            coins = [_first_by_rank(data[s]) for s in intent.symbols if data.get(s)]
+            coins = [c for c in coins if c]
+            if not coins:
+                return None
+            return render_to_string("crypto_app/metadata.html", {"coins": coins})
+
+        coins = agent._call_function("listings_latest", {
+            "start": 1,
+            "limit": intent.limit,
+            "convert": intent.convert,
+            "sort": intent.sort,
+            "sort_dir": intent.sort_dir,
+        }).get("data", [])
+        if not coins:
+            return None
+        return render_to_string("crypto_app/listing.html", {
+            "coins": [(c, c["quote"][intent.convert]) for c in coins],
+            "convert": intent.convert,
+            "intent": intent,
+        })
+    except Exception as e:
+        print(f"Erro na resposta direta ({intent.kind}): {e}")
+        return None
+
+def _structured_completion(client, messages, result_model, model="gpt-4o-mini"):
+    """Chamada com saída estruturada (JSON schema estrito) validada pelo modelo pydantic.
+
+    Se a validação falhar, faz uma única tentativa de reparo enviando os erros
+    de volta ao modelo, em vez de repetir a análise inteira.
+    """
+    from pydantic import ValidationError
+    from crypto_app import governor, metrics
+    from crypto_app.agents.prompts import REPAIR_PROMPT
+
+    # Prompt de sistema e esquema vêm antes dos dados variáveis e não mudam entre
+    # chamadas, então o prefixo é reaproveitado pelo cache de prompt do provedor
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": result_model.__name__,
+            "strict": True,
+            "schema": result_model.model_json_schema(),
+        },
+    }
+    messages = list(messages)
+    for attempt in range(2):
+        response = governor.governed(
+            model,
+            governor.estimate_tokens(messages, response_format),
+            lambda: client.chat.completions.create(
+                model=model,
+                response_format=response_format,
+                messages=messages,
+                temperature=0.3,
+                extra_body={"prompt_cache_key": f"{result_model.__name__}:{model}"},
+            ),
+            result_model.__name__,
+        )
+        if response.usage is not None:
+            details = response.usage.prompt_tokens_details
+            metrics.record_prompt_cache(
+                result_model.__name__,
+                response.usage.prompt_tokens,
+                (details.cached_tokens if details else 0) or 0,
+            )
+        message = response.choices[0].message
+        if message.refusal:
+            print(f"A API recusou a análise: {message.refusal}")
+            return None
+        try:
+            return result_model.model_validate_json(message.content)
+        except ValidationError as e:
+            print(f"Resposta fora do esquema (tentativa {attempt + 1}): {e.error_count()} erro(s)")
+            messages.append({"role": "assistant", "content": message.content})
+            messages.append({"role": "user", "content": REPAIR_PROMPT.format(errors=e)})
+    return None
+
+
 def analyze_with_llm(crypto_data):
-    """Versão completamente robusta da análise com LLM"""
+    """Análise dos dados da criptomoeda com saída estruturada e validada.
+
+    governor.Paused é propagado: a view responde 503 em vez de um erro genérico.
+    """
+    from crypto_app import governor
+    from crypto_app.agents.prompts import ANALYSIS_PROMPT, QuotesLatestResult
+
     try:
-        # Configuração simplificada do cliente
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-        # Prompt mais estruturado para garantir resposta JSON válida
-        prompt = f"""
-        ANALISE ESTES DADOS DE CRIPTOMOEDA E RETORNE UM JSON:
-
-        Dados:
-        {json.dumps(crypto_data, indent=2)}
-
-        ESTRUTURA REQUERIDA:
-        {{
-            "recommendation": "(comprar/segurar/vender)",
-            "confidence": (0.0-1.0),
-            "price_prediction": {{
-                "3_months": "(X%)",
-                "6_months": "(X%)",
-                "1_year": "(X%)"
-            }},
-            "risk_level": "(baixo/médio/alto)",
-            "analysis_summary": "(análise detalhada em português)"
-        }}
-        """
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Modelo mais recente com melhor suporte a JSON
-            response_format={"type": "json_object"},  # Força resposta em JSON
-            messages=[
-                {"role": "system", "content": "Você é um analista financeiro. Retorne APENAS o JSON solicitado."},
-                {"role": "user", "content": prompt}
+        client = openai_client(settings.OPENAI_API_KEY)
+        if not isinstance(crypto_data, str):
+            crypto_data = json.dumps(crypto_data, indent=2)
+
+        result = _structured_completion(
+            client,
+            [
+                {"role": "system", "content": ANALYSIS_PROMPT},
+                {"role": "user", "content": crypto_data},
             ],
-            temperature=0.3  # Menos criatividade para respostas mais consistentes
+            QuotesLatestResult,
+            model=settings.OPENAI_MODEL_CHEAP,
         )
+        if result is None:
+            return None
 
-        if response.choices:
-            content = response.choices[0].message.content
-            # Limpeza básica da resposta
-            content = content.strip().replace('```json', '').replace('```', '')
-            return json.loads(content)
-        
-        return None
+        analysis = result.model_dump()
+        analysis["price_prediction"] = result.price_prediction.as_percentages()
+        return analysis
 
-    except json.JSONDecodeError:
-        print("A API retornou uma resposta não-JSON válida")
-        return {
-            "recommendation": "hold",
-            "confidence": 0.5,
-            "price_prediction": {
-                "3_months": "0%",
-                "6_months": "0%",
-                "1_year": "0%"
-            },
-            "risk_level": "medium",
-            "analysis_summary": "Erro na análise. Por favor, tente novamente."
-        }
+    except governor.Paused:
+        raise
     except Exception as e:
         print(f"Erro na análise: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def shared_analysis(key, build):
+    """CryptoAnalysis criada por `build` uma vez só entre todos os nós.
+
+    Pedidos iguais feitos ao mesmo tempo (mesma `key`) esperam a análise em
+    andamento e recebem o mesmo registro, em vez de chamar o LLM de novo.
+    """
+    from crypto_app.coordination import single_flight
+    from crypto_app.models import CryptoAnalysis
+
+    built = {}
+
+    def compute():
+        analysis = build()
+        if analysis is None:
+            return None
+        built[analysis.id] = analysis
+        return analysis.id
+
+    analysis_id = single_flight(
+        f"analysis:{key}", compute, ttl=settings.ANALYSIS_SHARED_SECONDS, wait=settings.ANALYSIS_SHARED_WAIT
+    )
+    if analysis_id is None:
+        return None
+    return built.get(analysis_id) or CryptoAnalysis.objects.filter(id=analysis_id).first()
+
+
+def llm_analysis(symbol, crypto_data, abandoned=None):
+    """Resultado do LLM para a moeda, ainda não gravado, compartilhado por símbolo.
+
+    A pré-busca especula por aqui com `abandoned`: se a especulação foi
+    abandonada enquanto o LLM respondia, o resultado é descartado. O POST que
+    a reivindica se junta a ela (ou usa o resultado pronto) em create_analysis,
+    o único que grava o CryptoAnalysis.
+    """
+    from crypto_app.coordination import single_flight
+
+    def compute():
+        analysis = analyze_with_llm(json.dumps(crypto_data, indent=2))
+        if not analysis or (abandoned is not None and abandoned()):
+            return None
+        return {"analysis": analysis, "crypto_data": crypto_data}
+
+    return single_flight(
+        f"analysis:llm:{symbol}", compute, ttl=settings.ANALYSIS_SHARED_SECONDS, wait=settings.ANALYSIS_SHARED_WAIT
+    )
+
+
+def create_analysis(symbol, crypto_data):
+    """Analisa os dados da moeda com o LLM e grava o CryptoAnalysis (ou None se falhar)"""
+    from crypto_app.models import CryptoAnalysis
+
+    def build():
+        result = llm_analysis(symbol, crypto_data)
+        if result is None:
+            return None
+        analysis, crypto_data_used = result["analysis"], result["crypto_data"]
+        return CryptoAnalysis.objects.create(
+            symbol=symbol,
+            name=crypto_data_used['name'],
+            recommendation=analysis['recommendation'],
+            confidence=analysis['confidence'],
+            price_prediction=analysis['price_prediction'],
+            risk_level=analysis['risk_level'],
+            analysis_summary=analysis['analysis_summary'],
+            raw_data=crypto_data_used,
+        )
+
+    return shared_analysis(f"symbol:{symbol}", build)
+
+
+def structure_report(report_html):
+    """Extrai recomendação, risco e previsões de um relatório HTML do orquestrador"""
+    from crypto_app import governor
+    from crypto_app.agents.prompts import REPORT_PROMPT, ReportResult
+
+    try:
+        client = openai_client(settings.OPENAI_API_KEY)
+        result = _structured_completion(
+            client,
+            [
+                {"role": "system", "content": REPORT_PROMPT},
+                {"role": "user", "content": report_html},
+            ],
+            ReportResult,
+            model=settings.OPENAI_MODEL_CHEAP,
+        )
+        if result is None:
+            return None
+
+        report = result.model_dump()
+        report["price_prediction"] = result.price_prediction.as_percentages()
+        return report
+
+    except governor.Paused:
+        raise
+    except Exception as e:
+        print(f"Erro ao estruturar relatório: {str(e)}")
+        return None
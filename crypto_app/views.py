@@ -1,11 +1,23 @@
 from django.shortcuts import render, redirect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 
-from crypto_app.agents.orchestrator import Orchestrator
 from django.conf import settings
-from .forms import CryptoAnalysisForm
-from .models import CryptoAnalysis
-from .utils import get_crypto_chart_data, get_crypto_data, analyze_with_llm, get_crypto_news, get_random_crypto_data
+from django.core.cache import cache
+from . import admission, fragments, governor, history, ledger, metrics, prefetch
+from .forms import CryptoAnalysisForm, PriceAlertForm
+from .history import recall_analyses
+from .models import CryptoAnalysis, PriceAlert, TriggeredAlert
+from .news import search_news
+from .utils import get_crypto_chart_data, get_crypto_data, create_analysis, get_crypto_news, get_random_crypto_data, shared_analysis, structure_report, get_known_symbols, answer_intent, get_snapshot
+import hashlib
 import json
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
 
 """
 def index(request):
@@ -69,6 +81,9 @@ def dashboard(request):
 
             if len(symbol) <= 6: #maioria das moedas possuem entre 3 a 6 caracteres de identificação
                 symbol = form.cleaned_data['symbol'].upper()
+                ledger.tag(symbol)
+                # Se a pré-busca já especulou este símbolo, create_analysis se junta a ela
+                prefetch.claim(request, symbol)
             
                 # Obtém dados da API
                 crypto_data = get_crypto_data(symbol)
@@ -78,45 +93,85 @@ def dashboard(request):
                         'error': 'Não foi possível obter dados para esta criptomoeda.'
                     })
             
-                # Analisa com LLM
-                analysis = analyze_with_llm(json.dumps(crypto_data, indent=2))
-                if not analysis:
+                # Analisa com LLM e salva no banco de dados (uma vez só para pedidos simultâneos)
+                try:
+                    crypto_analysis = create_analysis(symbol, crypto_data)
+                except governor.Paused:
+                    return render(request, 'crypto_app/dashboard.html', {
+                        'form': form,
+                        'error': 'O serviço de análise está sobrecarregado. Tente novamente em instantes.'
+                    }, status=503)
+                if crypto_analysis is None:
                     return render(request, 'crypto_app/index.html', {
                         'form': form,
                         'error': 'Erro ao analisar os dados.'
                 })
             
-                # Salva no banco de dados
-                crypto_analysis = CryptoAnalysis(
-                    symbol=symbol,
-                    name=crypto_data['name'],
-                    recommendation=analysis['recommendation'],
-                    confidence=analysis['confidence'],
-                    price_prediction=analysis['price_prediction'],
-                    risk_level=analysis['risk_level'],
-                    analysis_summary=analysis['analysis_summary'],
-                    raw_data=crypto_data
-                )
-                crypto_analysis.save()
-            
                 return render(request, 'crypto_app/analysis.html', {
                     'analysis': crypto_analysis
                 })
             else:
-                agent = Orchestrator(settings.OPENAI_API_KEY, settings.COINMARKETCAP_API_KEY, "gpt-4o-mini")
-                all_reponses, last_response = agent.ask(symbol)
-
-                crypto_analysis = CryptoAnalysis( 
-                    symbol=symbol,
-                    name="crypto_data['name']",
-                    recommendation="analysis['recommendation']",
-                    confidence=1,
-                    price_prediction="analysis['price_prediction']",
-                    risk_level="analysis['risk_level']",
-                    analysis_summary=last_response.output_text,
-                    raw_data=last_response.output_text
+                prefetch.claim(request, None)
+                # Importados aqui: openai e os esquemas das ferramentas só são
+                # carregados quando uma pergunta livre precisa dos agentes
+                from crypto_app.agents.orchestrator import Orchestrator
+                from crypto_app.agents.router import route_for, route_query
+
+                route = route_query(
+                    symbol,
+                    settings.OPENAI_MODEL_CHEAP,
+                    settings.OPENAI_MODEL_STRONG,
+                    known_symbols=get_known_symbols(),
                 )
-                crypto_analysis.save()
+                ledger.tag(",".join(route.symbols))
+
+                if route.query_class == "lookup":
+                    # Cotação/listagem/metadados: resposta direta por template, sem LLM
+                    summary = answer_intent(route.intent)
+                    if summary:
+                        return render(request, 'crypto_app/results.html', {
+                            'analysis': {'analysis_summary': summary}
+                        })
+                    route = route_for("market", route.symbols, settings.OPENAI_MODEL_CHEAP, settings.OPENAI_MODEL_STRONG)
+
+                def build():
+                    agent = Orchestrator(
+                        settings.OPENAI_API_KEY,
+                        settings.COINMARKETCAP_API_KEY,
+                        route.model,
+                        tools=route.tools,
+                        max_rounds=route.max_rounds,
+                        sub_agent_model=settings.OPENAI_MODEL_CHEAP,
+                        snapshot=get_snapshot,
+                        cache=cache,
+                        news_search=search_news,
+                        recall=recall_analyses,
+                    )
+                    all_reponses, last_response = agent.ask(symbol)
+
+                    # Extrai os campos estruturados do relatório produzido pelos agentes
+                    report = structure_report(last_response.output_text) or {}
+
+                    return CryptoAnalysis.objects.create(
+                        symbol=report.get('symbol', symbol),
+                        name=report.get('name', ''),
+                        recommendation=report.get('recommendation', ''),
+                        confidence=report.get('confidence', 0),
+                        price_prediction=report.get('price_prediction', {}),
+                        risk_level=report.get('risk_level', ''),
+                        analysis_summary=last_response.output_text,
+                        raw_data=last_response.output_text
+                    )
+
+                # A mesma pergunta feita ao mesmo tempo em outro worker/nó espera esta análise
+                question = hashlib.sha1(' '.join(symbol.lower().split()).encode()).hexdigest()
+                try:
+                    crypto_analysis = shared_analysis(f"question:{question}", build)
+                except governor.Paused:
+                    return render(request, 'crypto_app/dashboard.html', {
+                        'form': form,
+                        'error': 'O serviço de análise está sobrecarregado. Tente novamente em instantes.'
+                    }, status=503)
 
                 return render(request, 'crypto_app/results.html', {
                     'analysis': crypto_analysis
@@ -124,4 +179,93 @@ def dashboard(request):
     else:
         form = CryptoAnalysisForm()
     
-    return render(request, 'crypto_app/dashboard.html', {'form': form})
\ No newline at end of file
+    return render(request, 'crypto_app/dashboard.html', {'form': form})
+
+def analysis_detail(request, analysis_id):
+    """Link permanente de uma análise gravada, servido do cache de fragmentos com ETag"""
+    import gzip
+
+    page = fragments.page(analysis_id)
+    if page is None:
+        raise Http404("Análise não encontrada.")
+    etag, body = page
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(body, content_type="text/html; charset=utf-8")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type="text/html; charset=utf-8")
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept-Encoding"])
+    # Sempre revalida: uma análise mais nova da moeda muda a página
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def prefetch_view(request):
+    """Pré-busca do símbolo digitado no dashboard (chamada com debounce pelo navegador)"""
+    if request.method != 'POST':
+        return JsonResponse({"success": False, "error": "Use POST."}, status=405)
+    result = prefetch.prefetch(
+        request,
+        request.POST.get('symbol', ''),
+        speculate=request.POST.get('speculate') == '1',
+    )
+    ledger.tag(result["symbol"] or "")
+    return JsonResponse({"success": True, **result})
+
+
+@staff_member_required
+def metrics_view(request):
+    counters = metrics.snapshot()
+    return JsonResponse({
+        "counters": counters,
+        "ratios": {
+            "web_search.cache_hit": metrics.ratio("web_search.cache_hit", "web_search.cache_miss"),
+        },
+        "prompt_cache_hit": metrics.prompt_cache_ratios(),
+        "admission": admission.pool_stats(),
+        "openai_governor": governor.stats(),
+        "retrieval": history.stats(),
+    })
+
+
+def news_search(request):
+    try:
+        days = float(request.GET["days"]) if request.GET.get("days") else None
+        limit = min(int(request.GET.get("limit", 10)), 50)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Parâmetros inválidos."}, status=400)
+    try:
+        articles = search_news(
+            request.GET.get("q"),
+            request.GET.get("symbol"),
+            days,
+            limit,
+        )
+    except sqlite3.Error as e:
+        logger.error("news-search index-unavailable error=%s", e)
+        return JsonResponse({"success": False, "error": "Índice de notícias indisponível."}, status=503)
+    return JsonResponse({"success": True, "articles": articles})
+
+
+@login_required
+def alerts(request):
+    """Lista (GET) ou cadastra (POST) os alertas de preço do usuário"""
+    if request.method == 'POST':
+        form = PriceAlertForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"success": False, "errors": form.errors}, status=400)
+        alert = form.save(commit=False)
+        alert.user = request.user
+        alert.save()
+        return JsonResponse({"success": True, "id": alert.id}, status=201)
+
+    fields = ('id', 'symbol', 'convert', 'kind', 'threshold', 'refresh_analysis', 'active', 'last_triggered_at')
+    triggers = TriggeredAlert.objects.filter(alert__user=request.user).order_by('-triggered_at')[:50]
+    return JsonResponse({
+        "success": True,
+        "alerts": list(PriceAlert.objects.filter(user=request.user).values(*fields)),
+        "triggered": list(triggers.values('alert_id', 'alert__symbol', 'alert__kind', 'value', 'triggered_at')),
+    })
@@ -0,0 +1,59 @@
+import logging
+import time
+
+from django.conf import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def warmup():
+    """Aquece o processo antes da primeira requisição.
+
+    Importa os módulos pesados dos agentes, abre as conexões do pool HTTP e
+    carrega o id map e o snapshot de mercado em cache. Cada etapa é
+    independente: uma falha só é registrada no log.
+    """
+    steps = [
+        ("imports", _import_agents),
+        ("http-pool", _prime_http_pool),
+        ("id-map", _prime_id_map),
+        ("market-snapshot", _prime_snapshot),
+    ]
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.error("warmup step=%s failed error=%s", name, e)
+            continue
+        logger.info("warmup step=%s elapsed-ms=%.1f", name, (time.perf_counter() - start) * 1000)
+
+
+def _import_agents():
+    from crypto_app.agents import orchestrator, router  # noqa: F401
+    from crypto_app.clients import openai_client
+
+    openai_client(settings.OPENAI_API_KEY)
+
+
+def _prime_http_pool():
+    from crypto_app.clients import http_client
+
+    # Endpoint de informações da chave: não consome créditos
+    http_client().get(
+        "https://pro-api.coinmarketcap.com/v1/key/info",
+        headers={"X-CMC_PRO_API_KEY": settings.COINMARKETCAP_API_KEY},
+    )
+
+
+def _prime_id_map():
+    from crypto_app.utils import get_known_symbols
+
+    get_known_symbols()
+
+
+def _prime_snapshot():
+    from crypto_app.market import get_snapshot
+
+    get_snapshot()
@@ -23,7 +23,137 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 NEWS_API_KEY = os.getenv('NEWS_API_KEY')
 
 # Configurações do modelo
-RISK_THRESHOLD = 0.7 
+RISK_THRESHOLD = 0.7  # risco (0-1) padrão dos alertas risk_above
+OPENAI_MODEL_CHEAP = os.getenv('OPENAI_MODEL_CHEAP', 'gpt-4o-mini')
+OPENAI_MODEL_STRONG = os.getenv('OPENAI_MODEL_STRONG', 'gpt-4o')
+
+# Snapshot local do mercado (listings_latest) usado pelas views e pelo CoinMarketAgent.
+# O CoinMarketCap cobra 1 crédito a cada 200 moedas da listagem: 400 moedas a cada
+# 300 s são 2 créditos por atualização, cerca de 576 por dia (5000 moedas seriam
+# 25 por atualização, ~7200 por dia). Moedas fora do ranking caem no quotes_latest
+# (1 crédito, em cache) e listagens filtradas, na API.
+MARKET_SNAPSHOT_LIMIT = int(os.getenv('MARKET_SNAPSHOT_LIMIT', '400'))
+MARKET_SNAPSHOT_CONVERT = ['USD', 'BRL']  # baixado em USD; as demais calculadas com fx.py
+MARKET_SNAPSHOT_TTL = 300  # segundos
+# Snapshot compartilhado entre workers: publicado por manage.py market_refresher
+# em um arquivo mapeado em memória (ex.: /dev/shm/crypto_market.snap)
+MARKET_SHARED_PATH = os.getenv('MARKET_SHARED_PATH')
+MARKET_SHARED_MAX_AGE = 3 * MARKET_SNAPSHOT_TTL
+# Câmbio fiat (unidades por 1 USD) usado na conversão local das cotações
+FX_RATES_URL = os.getenv('FX_RATES_URL', 'https://open.er-api.com/v6/latest/USD')
+FX_RATES_TTL = 60 * 60
+# Moedas (por ranking) cujo preço é gravado no histórico local a cada atualização
+PRICE_HISTORY_LIMIT = 100
+CHART_CACHE_SECONDS = 60
+
+# Alertas avaliados a cada atualização do snapshot; no máximo ALERT_REFRESH_LIMIT
+# moedas têm a análise refeita por rodada
+ALERTS_ON_REFRESH = True
+ALERT_REFRESH_LIMIT = 5
+
+# Índice local de notícias (SQLite FTS5), alimentado por manage.py ingest_news
+NEWS_INDEX_PATH = BASE_DIR / 'news_index.sqlite3'
+NEWS_INGEST_QUERY = 'cryptocurrency OR bitcoin OR ethereum'
+
+# Índice das análises anteriores (SQLite FTS5) consultado pelo orquestrador;
+# reconstruído por manage.py index_analyses
+ANALYSIS_INDEX_PATH = BASE_DIR / 'analysis_index.sqlite3'
+ANALYSIS_RECALL_DAYS = 7
+ANALYSIS_RECALL_LIMIT = 3
+
+# Captura anonimizada de tráfego para manage.py replay_traffic (desligada sem caminho)
+TRAFFIC_CAPTURE_PATH = os.getenv('TRAFFIC_CAPTURE_PATH')
+TRAFFIC_CAPTURE_VIEWS = ('index', 'dashboard', 'get_chart_data')
+
+# Perfil estatístico de requisições (crypto_app/profiling.py): fração amostrada
+# ao acaso, além das pedidas por staff com o cabeçalho X-Profile
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = 5
+PROFILE_KEEP = 500
+
+# Livro-razão de custo e latência por requisição (crypto_app/ledger.py)
+LEDGER_VIEWS = (
+    'index', 'dashboard', 'get_chart_data', 'news_search', 'prefetch', 'analysis_detail', 'alerts',
+)
+LEDGER_RETENTION_DAYS = 30
+# Fração das requisições que também apagam as entradas vencidas
+LEDGER_PRUNE_PROBABILITY = 0.001
+# Preços em USD por milhão de tokens e por crédito do CoinMarketCap, para a estimativa de custo
+OPENAI_PRICES = {
+    'gpt-4o-mini': {'input': 0.15, 'cached_input': 0.075, 'output': 0.60},
+    'gpt-4o': {'input': 2.50, 'cached_input': 1.25, 'output': 10.00},
+}
+OPENAI_PRICES_DEFAULT = {'input': 2.50, 'cached_input': 1.25, 'output': 10.00}
+CMC_CREDIT_USD = float(os.getenv('CMC_CREDIT_USD', '0.0003'))
+
+# Controle de admissão (por processo): concorrência e fila de cada grupo de
+# rotas, e token bucket por cliente (requisições por segundo, rajada)
+ADMISSION_POOLS = {
+    'cheap': {'concurrency': 16, 'queue': 64, 'wait': 2.0},
+    'expensive': {'concurrency': 4, 'queue': 8, 'wait': 10.0},
+}
+ADMISSION_RATES = {'cheap': (5.0, 30), 'expensive': (0.2, 3)}
+# url_name (ou url_name:MÉTODO) -> grupo; rotas fora daqui não passam pelo controle
+ADMISSION_ROUTES = {
+    'index': 'cheap',
+    'get_chart_data': 'cheap',
+    'news_search': 'cheap',
+    'dashboard': 'cheap',
+    'dashboard:POST': 'expensive',
+    'prefetch': 'cheap',
+    'analysis_detail': 'cheap',
+}
+# Por quanto tempo uma análise pode ser servida a quem foi descartado na mesma pergunta
+ADMISSION_CACHE_SECONDS = 300
+# Token bucket por usuário autenticado, senão por IP. Atrás de proxy reverso, o IP
+# vem deste cabeçalho (ex.: HTTP_X_FORWARDED_FOR ou HTTP_X_REAL_IP), contando os
+# proxies confiáveis a partir da direita; sem cabeçalho, REMOTE_ADDR
+ADMISSION_CLIENT_IP_HEADER = os.getenv('ADMISSION_CLIENT_IP_HEADER')
+ADMISSION_TRUSTED_PROXIES = int(os.getenv('ADMISSION_TRUSTED_PROXIES', '1'))
+
+# Coordenação entre nós (protocolo Redis): cache de respostas do CoinMarketCap,
+# NewsAPI e análises, locks single-flight e eleição de líder. Sem URL, tudo
+# fica em memória no próprio processo.
+COORDINATION_URL = os.getenv('COORDINATION_URL')
+COORDINATION_PREFIX = os.getenv('COORDINATION_PREFIX', 'crypto')
+# Validade (segundos) das respostas do CoinMarketCap compartilhadas, por função
+CMC_SHARED_TTL = {
+    'listings_latest': 60,
+    'quotes_latest': 60,
+    'categories': 300,
+    'category': 300,
+    'coinmarketcap_id_map': 60 * 60 * 24,
+    'metadata': 60 * 60 * 24,
+}
+NEWS_SHARED_TTL = 300
+# Perguntas iguais feitas ao mesmo tempo (em qualquer nó) geram uma análise só
+ANALYSIS_SHARED_SECONDS = 60
+# Quanto os pedidos iguais esperam pela análise em andamento antes de fazer a sua
+# (uma consulta orquestrada passa de um minuto)
+ANALYSIS_SHARED_WAIT = 300
+# Fragmentos HTML das análises (sanitizados e com gzip), invalidados por símbolo
+FRAGMENT_CACHE_SECONDS = 60 * 60 * 24
+
+# Pré-busca do dashboard (crypto_app/prefetch.py): análise especulativa com
+# prioridade "batch", abandonada se o usuário não enviar o símbolo a tempo
+PREFETCH_SPECULATE = os.getenv('PREFETCH_SPECULATE', '1') == '1'
+PREFETCH_MAX_SPECULATIONS = 2
+PREFETCH_ABANDON_SECONDS = 30
+
+# Limites da conta na OpenAI por modelo (requisições e tokens por minuto),
+# aplicados a todos os processos/nós juntos por crypto_app/governor.py
+OPENAI_LIMITS = {
+    'gpt-4o-mini': {'rpm': 500, 'tpm': 200_000},
+    'gpt-4o': {'rpm': 500, 'tpm': 30_000},
+}
+OPENAI_LIMITS_DEFAULT = {'rpm': 500, 'tpm': 30_000}
+# Fração do orçamento que chamadas em segundo plano ("batch") não podem usar
+OPENAI_BATCH_RESERVE = 0.25
+# Espera máxima na fila por prioridade (segundos); depois disso a chamada segue
+OPENAI_MAX_WAIT = {'interactive': 30, 'batch': 300}
+
+# Aquecimento opcional na inicialização (imports, pool HTTP, id map, snapshot)
+CRYPTO_WARMUP = os.getenv('CRYPTO_WARMUP', '0') == '1'
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -50,11 +180,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crypto_app.middleware.TrafficCaptureMiddleware',
+    'crypto_app.middleware.LedgerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crypto_app.middleware.AdmissionControlMiddleware',
+    'crypto_app.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +225,17 @@ DATABASES = {
 }
 
 
+# Com COORDINATION_URL o cache do Django (gráficos, buscas na web, admissão)
+# também passa a ser compartilhado entre os nós
+if COORDINATION_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'crypto_app.coordination.CoordinationCache',
+            'KEY_PREFIX': COORDINATION_PREFIX,
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -6,5 +6,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index, name='index'),
     path('dashboard/', views.dashboard, name='dashboard'), 
+    path('dashboard/prefetch/', views.prefetch_view, name='prefetch'),
     path('get-chart-data/', views.get_chart_data, name='get_chart_data'),
+    path('news/search/', views.news_search, name='news_search'),
+    path('alerts/', views.alerts, name='alerts'),
+    path('analysis/<int:analysis_id>/', views.analysis_detail, name='analysis_detail'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file